@@ -4,16 +4,35 @@ import numpy as np
 import pandas as pd
 import os
 import math
+import re
 import pickle
 import sqlalchemy
-from sqlalchemy.orm import sessionmaker
-from scipy import optimize
-from scipy.stats import sem
+from scipy import sparse
 import subprocess
+import time
+import tempfile
+import contextlib
+import hashlib
+import inspect
+import itertools
+import json
+import signal
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import pyarrow
+import pyarrow.feather
 
 import pkg_resources
 PACKAGE_PATH = pkg_resources.resource_filename('SLKB', '/')
 
+try:
+    SLKB_VERSION = pkg_resources.get_distribution('SLKB').version
+except pkg_resources.DistributionNotFound:
+    # not installed, identify the version by its source
+    with open(__file__, 'rb') as handle:
+        SLKB_VERSION = 'source-' + hashlib.sha1(handle.read()).hexdigest()
+
 def load_demo_data():
     '''
     A demo data is available for loading. Additional details can be found in the [pipeline](pipeline.md).
@@ -27,22 +46,126 @@ def load_demo_data():
     * demo_data. A list of 3 items: sequence file, counts, fle, and score file.
     '''
     # load up the demo data and return
-    data_loc = os.path.join(PACKAGE_PATH, 'files', 'demo_data.pickle')
-    with open(data_loc, 'rb') as handle:
-        toy_data = pickle.load(handle)
+    toy_data = load_result(os.path.join(PACKAGE_PATH, 'files', 'demo_data'))
     return(toy_data)
     
     
-def check_repeated_constructs(x, index_loc):
+def parse_replicate_counts(replicate_counts):
+    '''
+    Helper function, parses a column of ';' joined replicate counts into a 2D float array in one pass. Rows with fewer replicates are padded with NaN.
+    '''
+    replicate_counts = pd.Series(replicate_counts).astype(str)
+    if replicate_counts.shape[0] == 0:
+        return(np.empty((0, 0)))
+
+    # number of replicates in each row
+    lengths = replicate_counts.str.count(';').values + 1
+    flat_counts = np.array(';'.join(replicate_counts).split(';'), dtype = np.float64)
+
+    if (lengths == lengths[0]).all():
+        return(flat_counts.reshape(len(lengths), lengths[0]))
+
+    # scatter ragged rows into a NaN padded array
+    offsets = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    counts = np.full((len(lengths), lengths.max()), np.nan)
+    counts[np.repeat(np.arange(len(lengths)), lengths), np.arange(len(flat_counts)) - offsets] = flat_counts
+
+    return(counts)
+
+def join_replicate_counts(counts):
+    '''
+    Helper function, joins a 2D array of replicate counts back into ';' joined strings, leaving out NaN padding.
+    '''
+    counts = np.asarray(counts, dtype = np.float64)
+    n_rows, n_cols = counts.shape
+    if n_cols == 0:
+        return(np.full(n_rows, '', dtype = object))
+
+    # counts repeat heavily, so only the distinct values are formatted; NaN padding factorizes to -1 and maps to ''
+    codes, uniques = pd.factorize(counts.ravel(order = 'F'))
+    formatted = np.append(';' + uniques.astype(str).astype(object), '')
+
+    # concatenate the ';' prefixed columns and drop the leading separator
+    joined = formatted[codes].reshape(n_cols, n_rows).sum(axis = 0)
+    joined = pd.Series(joined, dtype = object).str[1:].values.astype(object)
+
+    return(joined)
+
+def check_repeated_constructs(counts, index_loc):
     '''
     Helper function, Returns location of counts with respect to study conditions/replicate names.
     '''
-    if len(x) < max(index_loc):
-        sub = index_loc[index_loc < len(x)]
-        return(x[sub])
-    else:
-        return(x[index_loc])
-    
+    return(counts[:, index_loc[index_loc < counts.shape[1]]])
+
+def sort_pair_labels(labels_1, labels_2):
+    '''
+    Helper function, orients pairs of labels (genes or guides) so that the first label is the smaller one. Labels are factorized to sorted integer codes, and the orientation is set via array min/max of the codes.
+
+    Returns the sorted first labels, sorted second labels, and a boolean array marking the swapped pairs.
+    '''
+    labels_1 = np.asarray(labels_1, dtype = object)
+    labels_2 = np.asarray(labels_2, dtype = object)
+
+    # sorted codes, so the code order matches the label order
+    codes, uniques = pd.factorize(np.concatenate((labels_1, labels_2)), sort = True)
+    uniques = np.asarray(uniques, dtype = object)
+    codes_1, codes_2 = codes[:len(labels_1)], codes[len(labels_1):]
+
+    return(uniques[np.minimum(codes_1, codes_2)], uniques[np.maximum(codes_1, codes_2)], codes_1 > codes_2)
+
+def join_pair_labels(labels_1, labels_2, sep = '|'):
+    '''
+    Helper function, joins pairs of labels into pair keys (e.g. A|B). Only the unique pairs are joined as strings; the rest is integer code work.
+    '''
+    labels_1 = np.asarray(labels_1, dtype = object)
+    labels_2 = np.asarray(labels_2, dtype = object)
+
+    codes, uniques = pd.factorize(np.concatenate((labels_1, labels_2)))
+    uniques = list(uniques)
+
+    # one integer code per pair
+    pair_codes, pair_uniques = pd.factorize(codes[:len(labels_1)].astype(np.int64) * len(uniques) + codes[len(labels_1):])
+    pair_labels = np.array([uniques[i // len(uniques)] + sep + uniques[i % len(uniques)] for i in pair_uniques], dtype = object)
+
+    return(pair_labels[pair_codes])
+
+def split_pair_labels(pair_labels, sep = '|'):
+    '''
+    Helper function, splits pair keys (e.g. A|B) back into the first and second labels. Only the unique pair keys are split.
+    '''
+    codes, uniques = pd.factorize(np.asarray(pair_labels, dtype = object))
+    split_labels = [i.split(sep) for i in uniques]
+
+    labels_1 = np.array([i[0] for i in split_labels], dtype = object)
+    labels_2 = np.array([i[1] for i in split_labels], dtype = object)
+
+    return(labels_1[codes], labels_2[codes])
+
+def sort_pair_keys(labels_1, labels_2, sep = '|'):
+    '''
+    Helper function, returns the canonical (sorted) pair keys of pairs of labels, and a boolean array marking the swapped pairs.
+    '''
+    sorted_1, sorted_2, swapped = sort_pair_labels(labels_1, labels_2)
+
+    return(join_pair_labels(sorted_1, sorted_2, sep = sep), swapped)
+
+# secondary indexes of the SLKB schema, (table, columns)
+SLKB_INDEXES = [('cdko_experiment_design', ['study_origin']),
+                ('cdko_sgrna_counts', ['gene_pair_id']),
+                ('cdko_sgrna_counts', ['guide_1_id']),
+                ('cdko_sgrna_counts', ['guide_2_id']),
+                ('cdko_sgrna_counts', ['study_origin', 'cell_line_origin']),
+                ('cdko_original_sl_results', ['gene_pair_id']),
+                ('cdko_original_sl_results', ['study_origin', 'cell_line_origin']),
+                ('horlbeck_score', ['gene_pair_id']),
+                ('median_b_score', ['gene_pair_id']),
+                ('median_nb_score', ['gene_pair_id']),
+                ('gemini_score', ['gene_pair_id']),
+                ('gemini_native_score', ['gene_pair_id']),
+                ('mageck_score', ['gene_pair_id']),
+                ('sgrna_derived_b_score', ['gene_pair_id']),
+                ('sgrna_derived_nb_score', ['gene_pair_id'])]
+
 def create_SLKB(engine = 'sqlite:///SLKB_sqlite3', db_type = 'sqlite3'):
     '''
     Creates a sqlite3 or mysql database, using SLKB schema.
@@ -73,6 +196,49 @@ def create_SLKB(engine = 'sqlite:///SLKB_sqlite3', db_type = 'sqlite3'):
         for com in command.split(';'):
             transaction.execute(sqlalchemy.text(com)) 
 
+    # add the secondary indexes
+    create_SLKB_indexes(engine, db_type = db_type)
+
+def create_SLKB_indexes(engine, db_type = 'sqlite3'):
+    '''
+    Adds the secondary indexes (gene_pair_id, study_origin, cell_line_origin) to the SLKB tables. Indexes that already exist are skipped, so it can be used to update databases created with an earlier schema.
+
+    **Params**:
+
+    * engine: sqlalchemy engine of the database.
+    * db_type: Type of database, currently available in mysql and sqlite3. (Default: sqlite3)
+
+    **Returns**:
+
+    * None.
+    '''
+    inspector = sqlalchemy.inspect(engine)
+    available_tables = set(inspector.get_table_names())
+
+    # collect the missing indexes first, reflection needs its own connection
+    commands = []
+    for table, columns in SLKB_INDEXES:
+        if table not in available_tables:
+            continue
+
+        # skip if an index already starts with the columns
+        available_indexes = [i['column_names'][:len(columns)] for i in inspector.get_indexes(table)]
+        if columns in available_indexes:
+            continue
+
+        index_name = '_'.join(['ix', table] + columns)
+        if db_type == 'mysql':
+            # text columns need a key length in mysql
+            index_columns = [i if i.endswith('_id') else i + '(64)' for i in columns]
+        else:
+            index_columns = columns
+
+        commands.append((index_name, 'CREATE INDEX ' + index_name + ' ON ' + table + ' (' + ', '.join(index_columns) + ')'))
+
+    with engine.begin() as transaction:
+        for index_name, command in commands:
+            print('Adding index: ' + index_name)
+            transaction.execute(sqlalchemy.text(command))
 
 def extract_SLKB_webapp(location = os.getcwd()):
     '''
@@ -93,6 +259,34 @@ def extract_SLKB_webapp(location = os.getcwd()):
 
 ###### Data Preperation Functions
 
+def is_control_label(labels, study_controls):
+    '''
+    Helper function, marks the labels that are study controls, using hashed set membership.
+    '''
+    study_controls = set(study_controls) if study_controls is not None else set()
+
+    return(pd.Series(labels, dtype = object).astype(str).isin(study_controls).values)
+
+def match_control_labels(labels, study_controls, can_control_be_substring = True):
+    '''
+    Helper function, marks the labels that are contained in a study control. If can_control_be_substring, the labels containing a study control are marked as well, using a single compiled pattern of all controls. Each unique label is checked once.
+    '''
+    codes, uniques = pd.factorize(pd.Series(labels, dtype = object).astype(str))
+    if (study_controls is None) or (len(study_controls) == 0):
+        return(np.zeros(len(codes), dtype = bool))
+
+    # all substrings of the controls, so containment becomes a set lookup
+    control_substrings = {''}
+    for curr_control in study_controls:
+        control_substrings.update(curr_control[i:j] for i in range(len(curr_control)) for j in range(i + 1, len(curr_control) + 1))
+    matched = uniques.isin(control_substrings)
+
+    if can_control_be_substring:
+        control_pattern = re.compile('|'.join(re.escape(i) for i in study_controls))
+        matched = matched | np.array([control_pattern.search(i) is not None for i in uniques], dtype = bool)
+
+    return(np.asarray(matched)[codes])
+
 def create_placeholder_scores(curr_counts, sequence_ref):
     # we should add genes to the KB that can later be modified following scoring
     
@@ -105,7 +299,7 @@ def create_placeholder_scores(curr_counts, sequence_ref):
     curr_counts = curr_counts[~idx]
 
     # add sorted genes so they can be removed
-    curr_counts['sorted_genes'] = ['|'.join(sorted([curr_counts['gene_1'].iloc[i], curr_counts['gene_2'].iloc[i]])) for i in range(curr_counts.shape[0])]
+    curr_counts['sorted_genes'] = sort_pair_keys(curr_counts['gene_1'].values, curr_counts['gene_2'].values)[0]
     curr_counts.drop_duplicates(subset = ['sorted_genes', 'cell_line_origin'], keep = 'first', inplace = True)
 
     # drop the same genes as well
@@ -122,6 +316,172 @@ def create_placeholder_scores(curr_counts, sequence_ref):
     
     return(curr_GI)
 
+def prepare_score_ref(score_ref, study_controls = None, can_control_be_substring = True):
+    '''
+    Helper function, normalizes the scores table, removes the controls and same gene pairs, and labels SL or not.
+    '''
+    # fill NA
+    score_ref = score_ref.fillna(0)
+    
+    for col in ['gene_1', 'gene_2', 'cell_line_origin']:
+        score_ref[col] = [i.upper() for i in score_ref[col]]
+    
+    score_ref["gene_pair"] = sort_pair_keys(score_ref['gene_1'].values, score_ref['gene_2'].values, sep = '_')[0]
+
+    # remove same ones
+    score_ref = score_ref.loc[~(score_ref["gene_1"].values == score_ref["gene_2"].values)]
+
+    # remove controls from SL scores
+    if study_controls is not None:
+        control_idx = match_control_labels(score_ref["gene_1"].values, study_controls, can_control_be_substring) | match_control_labels(score_ref["gene_2"].values, study_controls, can_control_be_substring)
+
+        print('Controls within SL score that are removed: ')
+        print(control_idx.sum())
+        print('---')
+
+        score_ref = score_ref.loc[~control_idx]
+        
+    if score_ref.shape[0] == 0:
+        score_ref['SL_or_not'] = 'Not SL'
+        return(score_ref)
+
+    if (score_ref['statistical_score_cutoff'].iloc[0] != 0) and (score_ref['SL_score_cutoff'].iloc[0] != 0):
+        print('Both GI and Stat cutoffs are present...')
+        score_ref['SL_or_not'] = (score_ref['SL_score'] <= (score_ref['SL_score_cutoff'].iloc[0])) & (score_ref['statistical_score'] <= (score_ref['statistical_score_cutoff'].iloc[0]))
+    elif score_ref['SL_score_cutoff'].iloc[0] != 0:
+        print('Only GI cutoff is present...')
+        score_ref['SL_or_not'] = score_ref['SL_score'] <= score_ref['SL_score_cutoff'].iloc[0]
+    elif score_ref['statistical_score'].iloc[0] != 0:
+        print('Only Stat cutoff is present...')
+        score_ref['SL_or_not'] = score_ref['statistical_score'] <= score_ref['statistical_score_cutoff'].iloc[0]
+    else:
+        print('No scores/stats cutoffs are available, possibly generated. Setting all to be NOT SL')
+        score_ref['SL_or_not'] = [False] * score_ref.shape[0]
+        
+    score_ref.loc[score_ref['SL_or_not'], 'SL_or_not'] = 'SL'
+    score_ref.loc[score_ref['SL_or_not'] != 'SL', 'SL_or_not'] = 'Not SL'
+
+    return(score_ref)
+
+def prepare_counts_ref(counts_ref, study_controls = None, study_conditions = None):
+    '''
+    Helper function, normalizes the counts table, labels the target types, separates the T0 and TEnd replicate counts, and adds the gene pair orientation.
+    '''
+    for col in ['guide_1', 'guide_2', 'gene_1', 'gene_2', 'cell_line_origin']:
+        counts_ref[col] = [i.upper() for i in counts_ref[col]]
+
+
+    # label whether single, double, or control
+    gene_1_control = is_control_label(counts_ref["gene_1"].values, study_controls)
+    gene_2_control = is_control_label(counts_ref["gene_2"].values, study_controls)
+
+    sgRNA_true_pair_idx = (~gene_1_control) & (~gene_2_control) & (counts_ref["gene_1"].astype(str).values != counts_ref["gene_2"].astype(str).values)
+    print(' '.join(["Number of double pairs:", str(sgRNA_true_pair_idx.sum())]))
+
+    sgRNA_control_pair_idx = gene_1_control & gene_2_control
+    print(' '.join(["Number of controls:", str(sgRNA_control_pair_idx.sum())]))
+
+    sgRNA_single_gene_idx = ~(sgRNA_true_pair_idx | sgRNA_control_pair_idx)
+    print(' '.join(["Number of singles:", str(sgRNA_single_gene_idx.sum())]))
+
+    counts_ref['target_type'] = np.select([sgRNA_true_pair_idx, sgRNA_control_pair_idx], ['Dual', 'Control'], 'Single')
+
+
+    if 'Type' in counts_ref.columns:
+        counts_ref = counts_ref.drop(columns = ['Type'])
+    if 'Sequencing' in counts_ref.columns:
+        counts_ref = counts_ref.drop(columns = ['Sequencing'])
+
+
+    ## seperate the replicate counts across T0 and TEnd
+    counts_ref['T0_counts'] = ""
+    counts_ref['T0_replicate_names'] = ""
+    counts_ref['TEnd_counts'] = ""
+    counts_ref['TEnd_replicate_names'] = ""
+
+    if isinstance(study_conditions, dict):
+        # for different cell_line_origins within a study
+
+        for cell_line_origin in study_conditions:
+            curr_conditions = study_conditions[cell_line_origin]
+
+            # access the cell_line_origin counts
+            access_level = counts_ref.loc[counts_ref['cell_line_origin'] == cell_line_origin].copy()
+
+            ## get all conditions
+            condition = access_level['study_conditions'].value_counts().index.tolist()
+            condition = condition[0].split(';')
+
+            # time point T_0
+            t_0_index = np.array([i for i in range(len(condition)) if condition[i] in curr_conditions[0]])
+            # time point T_end
+            t_end_index = np.array([i for i in range(len(condition)) if condition[i] in curr_conditions[1]])
+
+            # get counts
+            replicate_sep = parse_replicate_counts(access_level["count_replicates"])
+
+            # get time point 
+            t_0_comb = join_replicate_counts(check_repeated_constructs(replicate_sep, t_0_index))
+            t_end_comb = join_replicate_counts(check_repeated_constructs(replicate_sep, t_end_index))
+
+            access_level['T0_counts'] = t_0_comb
+            access_level['T0_replicate_names'] = ';'.join(curr_conditions[0])
+            access_level['TEnd_counts'] = t_end_comb
+            access_level['TEnd_replicate_names'] = ';'.join(curr_conditions[1])
+
+            counts_ref.loc[counts_ref['cell_line_origin'] == cell_line_origin] = access_level
+    else:
+        # for only one cell_line_origin
+        curr_conditions = study_conditions
+
+        ## get all conditions
+        condition = counts_ref['study_conditions'].value_counts().index.tolist()
+        condition = condition[0].split(';')
+
+        # time point T_0
+        t_0_index = np.array([i for i in range(len(condition)) if condition[i] in curr_conditions[0]])
+        # time point T_end
+        t_end_index = np.array([i for i in range(len(condition)) if condition[i] in curr_conditions[1]])
+
+        # get counts
+        replicate_sep = parse_replicate_counts(counts_ref["count_replicates"])
+
+        # get time point 
+        t_0_comb = join_replicate_counts(check_repeated_constructs(replicate_sep, t_0_index))
+        t_end_comb = join_replicate_counts(check_repeated_constructs(replicate_sep, t_end_index))
+
+        counts_ref['T0_counts'] = t_0_comb
+        counts_ref['T0_replicate_names'] = ';'.join(curr_conditions[0])
+        counts_ref['TEnd_counts'] = t_end_comb
+        counts_ref['TEnd_replicate_names'] = ';'.join(curr_conditions[1])
+
+
+    # proceed to add the orientation
+
+    sorted_orientations, swapped_orientations = sort_pair_keys(counts_ref["gene_1"].values, counts_ref["gene_2"].values)
+
+    counts_ref['gene_pair'] = sorted_orientations
+    counts_ref['gene_pair_orientation'] = np.where(swapped_orientations, 'B_A', 'A_B')
+
+    return(counts_ref)
+
+def prepare_sequence_ref(sequence_ref, study_controls = None, study_origin = None):
+    '''
+    Helper function, normalizes the sequence table and sets the control targets.
+    '''
+    for col in ['sgRNA_guide_name', 'sgRNA_guide_seq', 'sgRNA_target_name']:
+        sequence_ref[col] = [i.upper() for i in sequence_ref[col]]
+
+    # set the target names to control
+    control_idx = is_control_label(sequence_ref['sgRNA_target_name'].values, study_controls) | is_control_label(sequence_ref['sgRNA_guide_name'].values, study_controls)
+    sequence_ref.loc[control_idx, 'sgRNA_target_name'] = 'CONTROL'    
+    # add study origin as well
+    sequence_ref['study_origin'] = study_origin
+
+    sequence_ref.reset_index(drop=True, inplace = True)
+
+    return(sequence_ref)
+
 def prepare_study_for_export(sequence_ref, counts_ref, score_ref, study_controls = None, study_conditions = None, can_control_be_substring = True, remove_unrelated_counts = False):
     '''
         
@@ -186,178 +546,15 @@ def prepare_study_for_export(sequence_ref, counts_ref, score_ref, study_controls
     
     ################################# first, handle the scores ref
     print('Score reference...')
-    
-    # fill NA
-    score_ref = score_ref.fillna(0)
-    
-    for col in ['gene_1', 'gene_2', 'cell_line_origin']:
-        score_ref[col] = [i.upper() for i in score_ref[col]]
-    
-    genes_A = score_ref['gene_1'].values
-    genes_B = score_ref['gene_2'].values
-    sorted_genes = []
-    for i in range(score_ref.shape[0]):
-        sorted_genes.append('_'.join(sorted([genes_A[i], genes_B[i]])))
-    score_ref["gene_pair"] = sorted_genes
-
-    # remove same ones
-    score_ref = score_ref.loc[~(score_ref["gene_1"].values == score_ref["gene_2"].values)]
-
-    # remove controls from SL scores
-    if study_controls is not None:
-        control_idx = np.array([False] * score_ref.shape[0])
-
-        for curr_control in study_controls:
-            
-            if can_control_be_substring:
-                control_idx = control_idx | np.array([True if curr_control in i else False for i in score_ref["gene_1"]]) | np.array([True if curr_control in i else False for i in score_ref["gene_2"]])
-                
-            control_idx = control_idx | np.array([True if i in curr_control else False for i in score_ref["gene_1"]]) | np.array([True if i in curr_control else False for i in score_ref["gene_2"]])
-
-        print('Controls within SL score that are removed: ')
-        print(control_idx.sum())
-        print('---')
-
-        score_ref = score_ref.loc[~control_idx]
-        
-    if (score_ref['statistical_score_cutoff'].iloc[0] != 0) and (score_ref['SL_score_cutoff'].iloc[0] != 0):
-        print('Both GI and Stat cutoffs are present...')
-        score_ref['SL_or_not'] = (score_ref['SL_score'] <= (score_ref['SL_score_cutoff'].iloc[0])) & (score_ref['statistical_score'] <= (score_ref['statistical_score_cutoff'].iloc[0]))
-    elif score_ref['SL_score_cutoff'].iloc[0] != 0:
-        print('Only GI cutoff is present...')
-        score_ref['SL_or_not'] = score_ref['SL_score'] <= score_ref['SL_score_cutoff'].iloc[0]
-    elif score_ref['statistical_score'].iloc[0] != 0:
-        print('Only Stat cutoff is present...')
-        score_ref['SL_or_not'] = score_ref['statistical_score'] <= score_ref['statistical_score_cutoff'].iloc[0]
-    else:
-        print('No scores/stats cutoffs are available, possibly generated. Setting all to be NOT SL')
-        score_ref['SL_or_not'] = [False] * score_ref.shape[0]
-        
-    score_ref.loc[score_ref['SL_or_not'], 'SL_or_not'] = 'SL'
-    score_ref.loc[score_ref['SL_or_not'] != 'SL', 'SL_or_not'] = 'Not SL'
+    score_ref = prepare_score_ref(score_ref, study_controls, can_control_be_substring)
     
     ################################# score ref - DONE
     
     print('Counts reference...')
     
     if counts_ref is not None:
+        counts_ref = prepare_counts_ref(counts_ref, study_controls, study_conditions)
 
-        for col in ['guide_1', 'guide_2', 'gene_1', 'gene_2', 'cell_line_origin']:
-            counts_ref[col] = [i.upper() for i in counts_ref[col]]
-
-
-        # label whether single, double, or control
-        sgRNA_true_pair_index = np.array([i for i in range(counts_ref.shape[0]) if (str(counts_ref["gene_1"].iloc[i]) not in study_controls) and (str(counts_ref["gene_2"].iloc[i]) not in study_controls) and (str(counts_ref["gene_1"].iloc[i]) != str(counts_ref["gene_2"].iloc[i]))])
-        print(' '.join(["Number of double pairs:", str(len(sgRNA_true_pair_index))]))
-
-        sgRNA_control_pair_index = np.array([i for i in range(counts_ref.shape[0]) if (str(counts_ref["gene_1"].iloc[i]) in study_controls) and (str(counts_ref["gene_2"].iloc[i]) in study_controls)])
-        print(' '.join(["Number of controls:", str(len(sgRNA_control_pair_index))]))
-
-        sgRNA_single_gene_index = np.array(sorted(list(set(range(counts_ref.shape[0])).difference(set(np.concatenate((sgRNA_true_pair_index, sgRNA_control_pair_index)))))))
-        print(' '.join(["Number of singles:", str(len(sgRNA_single_gene_index))]))
-
-        if (len(sgRNA_single_gene_index) + len(sgRNA_control_pair_index) + len(sgRNA_true_pair_index)) != counts_ref.shape[0]:
-            print('Missing annotation')
-            print(counts_ref.shape[0] - (len(sgRNA_single_gene_index) + len(sgRNA_control_pair_index) + len(sgRNA_true_pair_index)))
-
-        counts_ref['target_type'] = 'N/A'
-        counts_ref['target_type'].iloc[sgRNA_true_pair_index] = 'Dual'
-        counts_ref['target_type'].iloc[sgRNA_control_pair_index] = 'Control'
-        counts_ref['target_type'].iloc[sgRNA_single_gene_index] = 'Single'
-
-
-        if 'Type' in counts_ref.columns:
-            counts_ref = counts_ref.drop(columns = ['Type'])
-        if 'Sequencing' in counts_ref.columns:
-            counts_ref = counts_ref.drop(columns = ['Sequencing'])
-
-
-        ## seperate the replicate counts across T0 and TEnd
-        counts_ref['T0_counts'] = ""
-        counts_ref['T0_replicate_names'] = ""
-        counts_ref['TEnd_counts'] = ""
-        counts_ref['TEnd_replicate_names'] = ""
-
-        if isinstance(study_conditions, dict):
-            # for different cell_line_origins within a study
-
-            for cell_line_origin in study_conditions:
-                curr_conditions = study_conditions[cell_line_origin]
-
-                # access the cell_line_origin counts
-                access_level = counts_ref.loc[counts_ref['cell_line_origin'] == cell_line_origin].copy()
-
-                ## get all conditions
-                condition = access_level['study_conditions'].value_counts().index.tolist()
-                condition = condition[0].split(';')
-
-                # time point T_0
-                t_0_index = np.array([i for i in range(len(condition)) if condition[i] in curr_conditions[0]])
-                # time point T_end
-                t_end_index = np.array([i for i in range(len(condition)) if condition[i] in curr_conditions[1]])
-
-                # get counts
-                replicate_sep =  access_level["count_replicates"].apply(    
-                    lambda x: np.array(x.split(";"), dtype = np.float64)
-                )
-
-                # get time point 
-                t_0_comb = replicate_sep.apply(
-                    lambda x: check_repeated_constructs(x, t_0_index)
-                ).apply(lambda x: ';'.join(x.astype(np.str_)))
-
-                t_end_comb = replicate_sep.apply(
-                    lambda x: check_repeated_constructs(x, t_end_index)#np.median(x[t_end_index])
-                ).apply(lambda x: ';'.join(x.astype(np.str_)))
-
-                access_level['T0_counts'] = t_0_comb
-                access_level['T0_replicate_names'] = ';'.join(curr_conditions[0])
-                access_level['TEnd_counts'] = t_end_comb
-                access_level['TEnd_replicate_names'] = ';'.join(curr_conditions[1])
-
-                counts_ref.loc[counts_ref['cell_line_origin'] == cell_line_origin] = access_level
-        else:
-            # for only one cell_line_origin
-            curr_conditions = study_conditions
-
-            ## get all conditions
-            condition = counts_ref['study_conditions'].value_counts().index.tolist()
-            condition = condition[0].split(';')
-
-            # time point T_0
-            t_0_index = np.array([i for i in range(len(condition)) if condition[i] in curr_conditions[0]])
-            # time point T_end
-            t_end_index = np.array([i for i in range(len(condition)) if condition[i] in curr_conditions[1]])
-
-            # get counts
-            replicate_sep =  counts_ref["count_replicates"].apply(    
-                lambda x: np.array(x.split(";"), dtype = np.float64)
-            )
-
-            # get time point 
-            t_0_comb = replicate_sep.apply(
-                lambda x: check_repeated_constructs(x, t_0_index)
-            ).apply(lambda x: ';'.join(x.astype(np.str_)))
-
-            t_end_comb = replicate_sep.apply(
-                lambda x: check_repeated_constructs(x, t_end_index)#np.median(x[t_end_index])
-            ).apply(lambda x: ';'.join(x.astype(np.str_)))
-
-            counts_ref['T0_counts'] = t_0_comb
-            counts_ref['T0_replicate_names'] = ';'.join(curr_conditions[0])
-            counts_ref['TEnd_counts'] = t_end_comb
-            counts_ref['TEnd_replicate_names'] = ';'.join(curr_conditions[1])
-
-
-        # proceed to add the orientation
-
-        unsorted_orientations = np.array(['|'.join([counts_ref["gene_1"].iloc[i], counts_ref["gene_2"].iloc[i]]) for i in range(counts_ref.shape[0])])
-        sorted_orientations = np.array(['|'.join(sorted([counts_ref["gene_1"].iloc[i], counts_ref["gene_2"].iloc[i]])) for i in range(counts_ref.shape[0])])
-
-        counts_ref['gene_pair'] = sorted_orientations
-        counts_ref['gene_pair_orientation'] = 'A_B'
-        counts_ref['gene_pair_orientation'].loc[sorted_orientations != unsorted_orientations] = 'B_A'
-        
         counts_ref_list = []
         # applied for HORLBECK
         if remove_unrelated_counts:
@@ -390,16 +587,7 @@ def prepare_study_for_export(sequence_ref, counts_ref, score_ref, study_controls
     
     print('Sequence reference...')
     if sequence_ref is not None:
-        for col in ['sgRNA_guide_name', 'sgRNA_guide_seq', 'sgRNA_target_name']:
-            sequence_ref[col] = [i.upper() for i in sequence_ref[col]]
-            
-        # set the target names to control
-        control_idx = np.array([True if str(sequence_ref['sgRNA_target_name'].iloc[i]) in study_controls else False for i in range(sequence_ref.shape[0])]) | np.array([True if str(sequence_ref['sgRNA_guide_name'].iloc[i]) in study_controls else False for i in range(sequence_ref.shape[0])])
-        sequence_ref.loc[control_idx, 'sgRNA_target_name'] = 'CONTROL'    
-        # add study origin as well
-        sequence_ref['study_origin'] = [counts_ref['study_origin'].iloc[0]] * sequence_ref.shape[0]
-        
-        sequence_ref.reset_index(drop=True, inplace = True)
+        sequence_ref = prepare_sequence_ref(sequence_ref, study_controls, counts_ref['study_origin'].iloc[0])
     
     ################################# sequence ref - DONE
     
@@ -409,7 +597,137 @@ def prepare_study_for_export(sequence_ref, counts_ref, score_ref, study_controls
             'score_ref': score_ref})
 
 
-def insert_study_to_db(engine_link, db_inserts):
+# tables and columns that hold the IDs shared across tables
+GENE_PAIR_ID_SOURCES = [('cdko_sgrna_counts', 'gene_pair_id'), ('cdko_original_sl_results', 'gene_pair_id')]
+
+# ID counters of the study inserts, with the tables and columns the counters are started after
+STUDY_ID_COUNTERS = {'cdko_experiment_design.sgRNA_id': [('cdko_experiment_design', 'sgRNA_id')],
+                     'cdko_sgrna_counts.sgRNA_pair_id': [('cdko_sgrna_counts', 'sgRNA_pair_id')],
+                     'cdko_original_sl_results.id': [('cdko_original_sl_results', 'id')],
+                     'gene_pair_id': GENE_PAIR_ID_SOURCES}
+
+def create_id_allocation_table(engine_link, id_counters = None):
+    '''
+    Helper function, creates the ID allocation table (slkb_id_allocation) for databases created with an earlier schema, and starts the given ID counters (Default: the counters of the study inserts) after the largest IDs of their tables. Counters that are already started are left as they are, so concurrent loaders can start the same counter.
+    '''
+    if id_counters is None:
+        id_counters = STUDY_ID_COUNTERS
+
+    insert_command = 'INSERT IGNORE' if engine_link.dialect.name == 'mysql' else 'INSERT OR IGNORE'
+
+    with engine_link.begin() as transaction:
+        transaction.execute(sqlalchemy.text('CREATE TABLE IF NOT EXISTS slkb_id_allocation (id_name VARCHAR(64) NOT NULL, next_id BIGINT NOT NULL, PRIMARY KEY (id_name))'))
+
+    # in their own transaction, so that the insert transactions only update the counters
+    with engine_link.begin() as transaction:
+        for id_name, id_sources in id_counters.items():
+            max_query = ' UNION ALL '.join(['SELECT MAX(' + column + ') AS max_id FROM ' + table for table, column in id_sources])
+            transaction.execute(sqlalchemy.text(insert_command + ' INTO slkb_id_allocation (id_name, next_id) SELECT :id_name, COALESCE(MAX(max_id), -1) + 1 FROM (' + max_query + ') AS id_sources'), {'id_name': id_name})
+
+def allocate_ids(transaction, id_name, n_ids):
+    '''
+    Helper function, reserves a block of n_ids consecutive IDs and returns the first one. The counter of each ID (e.g. cdko_sgrna_counts.sgRNA_pair_id) is kept in slkb_id_allocation, and has to be started with create_id_allocation_table.
+
+    The block is reserved within the ongoing transaction; the insert functions pass their write transaction, so that the IDs are committed or rolled back together with the records, and a concurrent loader waits on the counter until the transaction ends.
+    '''
+    params = {'id_name': id_name, 'n_ids': int(n_ids)}
+
+    # the update locks the counter until the end of the transaction
+    updated = transaction.execute(sqlalchemy.text('UPDATE slkb_id_allocation SET next_id = next_id + :n_ids WHERE id_name = :id_name'), params)
+    if updated.rowcount == 0:
+        raise ValueError('ID counter ' + id_name + ' is not started, see create_id_allocation_table.')
+
+    next_id = transaction.execute(sqlalchemy.text('SELECT next_id FROM slkb_id_allocation WHERE id_name = :id_name'), params).scalar()
+
+    return(int(next_id) - int(n_ids))
+
+@contextlib.contextmanager
+def begin_insert_transaction(engine_link, bulk_insert = False):
+    '''
+    Helper function, starts the transaction for inserting records. In bulk insert mode, sqlite3 databases are switched to WAL journaling and synchronous writes are turned off during the transaction.
+    '''
+    if (not bulk_insert) or (engine_link.dialect.name != 'sqlite'):
+        with engine_link.begin() as transaction:
+            yield transaction
+        return
+
+    with engine_link.connect() as connection:
+        synchronous = connection.exec_driver_sql('PRAGMA synchronous').scalar()
+        connection.exec_driver_sql('PRAGMA journal_mode=WAL')
+        connection.exec_driver_sql('PRAGMA synchronous=OFF')
+        connection.commit()
+
+        try:
+            with connection.begin():
+                yield connection
+        finally:
+            # set back for the following transactions
+            connection.exec_driver_sql('PRAGMA synchronous=' + str(synchronous))
+            connection.commit()
+
+# experimental, load the bulk inserts of mysql from temporary files (LOAD DATA LOCAL INFILE), not yet verified against a server
+MYSQL_LOAD_DATA = False
+
+def write_table_to_db(curr_table, table_name, transaction, bulk_insert = False):
+    '''
+    Helper function, appends a table to the database. In bulk insert mode, sqlite3 uses batched executemany, and other databases use multi-row inserts. With MYSQL_LOAD_DATA set, mysql loads the records from a temporary file (LOAD DATA LOCAL INFILE) instead.
+    '''
+    if not bulk_insert:
+        curr_table.to_sql(name = table_name, con = transaction, if_exists = 'append', index = False)
+        return
+
+    if (transaction.dialect.name == 'mysql') and MYSQL_LOAD_DATA:
+        file_loc = None
+        try:
+            with tempfile.NamedTemporaryFile('w', suffix = '.csv', delete = False) as fp:
+                file_loc = fp.name
+                curr_table.to_csv(fp, index = False, header = False, na_rep = '\\N', lineterminator = '\n')
+
+            # in a savepoint, so that the transaction can continue if the server does not allow local files
+            with transaction.begin_nested():
+                transaction.execute(sqlalchemy.text('LOAD DATA LOCAL INFILE \'' + file_loc.replace('\\', '/') + '\' INTO TABLE ' + table_name +
+                                                    ' FIELDS TERMINATED BY \',\' OPTIONALLY ENCLOSED BY \'"\' LINES TERMINATED BY \'\\n\'' +
+                                                    ' (' + ', '.join(curr_table.columns) + ')'))
+            return
+        except sqlalchemy.exc.DBAPIError:
+            print('LOAD DATA LOCAL INFILE is not available, using multi-row inserts...')
+        finally:
+            if file_loc is not None:
+                os.remove(file_loc)
+
+        curr_table.to_sql(name = table_name, con = transaction, if_exists = 'append', index = False, method = 'multi', chunksize = max(1, 20000 // curr_table.shape[1]))
+    elif transaction.dialect.name == 'sqlite':
+        # batched executemany on the driver, with native python values
+        records = list(map(tuple, curr_table.astype(object).where(curr_table.notna(), None).values.tolist()))
+        command = 'INSERT INTO ' + table_name + ' (' + ', '.join('"' + i + '"' for i in curr_table.columns) + ') VALUES (' + ', '.join(['?'] * curr_table.shape[1]) + ')'
+        for i in range(0, len(records), 100000):
+            transaction.exec_driver_sql(command, records[i:i+100000])
+    else:
+        curr_table.to_sql(name = table_name, con = transaction, if_exists = 'append', index = False, method = 'multi', chunksize = max(1, 20000 // curr_table.shape[1]))
+
+def strip_table_strings(curr_table):
+    '''
+    Helper function, strips the whitespace around the string values of a table.
+    '''
+    return(curr_table.applymap(lambda x: x.strip() if isinstance(x, str) else x, na_action='ignore'))
+
+def create_replicate_counts(counts_insert):
+    '''
+    Helper function, converts the ';' joined T0 and TEnd counts into a long numeric table (sgRNA_pair_id, timepoint, replicate_index, replicate_count).
+    '''
+    replicate_counts = []
+    for timepoint in ['T0', 'TEnd']:
+        curr_counts = parse_replicate_counts(counts_insert[timepoint + '_counts'])
+        row_loc, replicate_loc = np.nonzero(~np.isnan(curr_counts))
+
+        replicate_counts.append(pd.DataFrame({'sgRNA_pair_id': counts_insert['sgRNA_pair_id'].values[row_loc],
+                                              'timepoint': timepoint,
+                                              'replicate_index': replicate_loc,
+                                              'replicate_count': curr_counts[row_loc, replicate_loc]}))
+
+    return(pd.concat(replicate_counts, axis = 0, ignore_index = True))
+
+def insert_study_to_db(engine_link, db_inserts, bulk_insert = False):
     '''
     Inserts the counts to the designated DB.
 
@@ -417,6 +735,7 @@ def insert_study_to_db(engine_link, db_inserts):
 
     * SLKB_engine: SQLAlchemy engine link
     * db_inserts: Processed data, obtained via ```prepare_study_for_export```
+    * bulk_insert: Use the bulk loading mode of the database, for large studies (Default: False)
 
     **Returns**:
 
@@ -427,168 +746,782 @@ def insert_study_to_db(engine_link, db_inserts):
     db_metadata = sqlalchemy.MetaData()
     db_metadata.reflect(bind=engine_link)
 
-    # access the tables
-    sequence_table = db_metadata.tables['cdko_experiment_design']
-    counts_table = db_metadata.tables['cdko_sgrna_counts']
-    scores_table = db_metadata.tables['cdko_original_sl_results']
+    # proceed to add the IDs to each table and reindex
+    if db_inserts['sequence_ref'] is not None:
+        sequence_insert = db_inserts['sequence_ref'].reset_index(drop=True)
+    else:
+        sequence_insert = None
+
+    if db_inserts['counts_ref'] is not None:
+        counts_insert = db_inserts['counts_ref'].reset_index(drop=True)
+    else:
+        counts_insert = None
+    score_insert = db_inserts['score_ref'].reset_index(drop=True)
+
+    # proceed to insert to the database
+    create_id_allocation_table(engine_link)
+
+    # start the transaction, the IDs are reserved within it so that they are committed or rolled back with the records
+    with begin_insert_transaction(engine_link, bulk_insert = bulk_insert) as transaction:
+        print('Beginning transaction...')
+
+        # reserve the IDs of the new records
+        if sequence_insert is not None:
+            sequence_insert.index += allocate_ids(transaction, 'cdko_experiment_design.sgRNA_id', sequence_insert.shape[0])
+        if counts_insert is not None:
+            counts_insert.index += allocate_ids(transaction, 'cdko_sgrna_counts.sgRNA_pair_id', counts_insert.shape[0])
+        score_insert.index += allocate_ids(transaction, 'cdko_original_sl_results.id', score_insert.shape[0])
+
+        # set IDs
+        if sequence_insert is not None:
+            sequence_insert['sgRNA_id'] = sequence_insert.index
+        if counts_insert is not None:
+            counts_insert['sgRNA_pair_id'] = counts_insert.index
+        score_insert['id'] = score_insert.index
+        if counts_insert is None:
+            # in the case of studies that doesn't have counts
+            score_insert['gene_pair_id'] = np.arange(score_insert.shape[0]) + allocate_ids(transaction, 'gene_pair_id', score_insert.shape[0])
+    
+        # update the gene pairs
+        print('Updating gene pairs with seperator |...')
+        if counts_insert is not None:
+            counts_insert['gene_pair'] = sort_pair_keys(counts_insert["gene_1"].values, counts_insert["gene_2"].values)[0]
+        score_insert['gene_pair'] = sort_pair_keys(score_insert["gene_1"].values, score_insert["gene_2"].values)[0]
+
+        if (sequence_insert is not None) or (counts_insert is not None):
+            for_merging = sequence_insert.copy()
+            for_merging['ref_id'] = for_merging.index
+
+            # # add the foreign keys
+            counts_insert['FK_guide_1_id'] = counts_insert.merge(for_merging, how = 'left', left_on = 'guide_1', right_on = 'sgRNA_guide_name')['ref_id'].values
+            counts_insert['FK_guide_2_id'] = counts_insert.merge(for_merging, how = 'left', left_on = 'guide_2', right_on = 'sgRNA_guide_name')['ref_id'].values
+
+        if counts_insert is not None:
+            for_merging = score_insert.copy()
+
+            # in the case of multiple cell lines
+            for_merging['gene_pair+cell_line+study_origin'] = for_merging['gene_pair'] + '+' + for_merging['cell_line_origin'] + '+' + for_merging['study_origin']
+            counts_insert['gene_pair+cell_line+study_origin'] = counts_insert['gene_pair'] + '+' + counts_insert['cell_line_origin'] + '+' + counts_insert['study_origin']
+
+            # set the gene pair id
+            #counts_insert['gene_pair_id_all'] = np.NaN
+            # dual have the gene pair id
+            #counts_insert.loc[counts_insert['target_type'] == 'Dual', 'gene_pair_id_all'] = counts_insert.loc[counts_insert['target_type'] == 'Dual'].groupby(['gene_pair+cell_line+study_origin']).ngroup() + (available_gene_pairs + 1)
+            gene_pair_groups = counts_insert.groupby(['gene_pair+cell_line+study_origin']).ngroup()
+            counts_insert['gene_pair_id_all'] = gene_pair_groups + allocate_ids(transaction, 'gene_pair_id', gene_pair_groups.max() + 1 if counts_insert.shape[0] > 0 else 0)
+
+            score_insert['gene_pair_id'] = for_merging.merge(counts_insert.drop_duplicates(subset = 'gene_pair+cell_line+study_origin'), how = 'left', left_on = 'gene_pair+cell_line+study_origin', right_on = 'gene_pair+cell_line+study_origin')['gene_pair_id_all'].values
+
+        ## check if there is any NA in the references
+        if (sequence_insert is not None) or (counts_insert is not None):
+            for col in ['FK_guide_1_id', 'FK_guide_2_id']:
+                if counts_insert[col].isna().sum() > 0:
+                    print('NA in foreign keys: ' + col)
+        else:
+            print('No counts and sequences together')
+
+        print('Final QC...')
+        # Final quality control
+        if sequence_insert is not None:
+            sequence_insert = strip_table_strings(sequence_insert)
+        if counts_insert is not None:
+            counts_insert = strip_table_strings(counts_insert)
+        score_insert = strip_table_strings(score_insert)
+
+        # insert only the columns we need, starting with the sequence
+
+        if sequence_insert is not None:
+            sequence_insert = sequence_insert.loc[:,['sgRNA_guide_name', 'sgRNA_guide_seq', 'sgRNA_target_name', 'study_origin', 'sgRNA_id']]
+            write_table_to_db(sequence_insert, 'cdko_experiment_design', transaction, bulk_insert = bulk_insert)
+
+            print('Done sequence')
+
+        # insert CDKO counts
+        if counts_insert is not None:
+            counts_insert = counts_insert.loc[:,['sgRNA_pair_id', 'FK_guide_1_id', 'FK_guide_2_id', 'gene_pair_id_all', 'gene_pair_orientation', 'T0_counts', 'T0_replicate_names', 'TEnd_counts', 'TEnd_replicate_names', 'target_type', 'study_origin', 'cell_line_origin']]
+
+            counts_insert = counts_insert.rename(columns = {'FK_guide_1_id': 'guide_1_id',
+                                                                   'FK_guide_2_id': 'guide_2_id',
+                                                                   'gene_pair_id_all': 'gene_pair_id'})
+
+            write_table_to_db(counts_insert, 'cdko_sgrna_counts', transaction, bulk_insert = bulk_insert)
+
+            print('Done counts')
+
+            # numeric replicate counts, if the database has the table
+            if 'cdko_sgrna_replicate_counts' in db_metadata.tables:
+                replicate_insert = create_replicate_counts(counts_insert)
+                write_table_to_db(replicate_insert, 'cdko_sgrna_replicate_counts', transaction, bulk_insert = bulk_insert)
+
+                print('Done replicate counts')
+
+        # finally, insert scores
+        score_insert = score_insert.loc[:, ['gene_1', 'gene_2', 'study_origin', 'cell_line_origin', 'SL_score', 'SL_score_cutoff', 'statistical_score', 'statistical_score_cutoff', 'gene_pair', 'SL_or_not', 'gene_pair_id', 'id']]
+        write_table_to_db(score_insert, 'cdko_original_sl_results', transaction, bulk_insert = bulk_insert)
+
+        print('Done score')
+
+        print('Successfully inserted!')
+
+        print('Added Record stats...')
+        if sequence_insert is not None:
+            print(' '.join(['Sequence insert:', str(sequence_insert.shape[0])]))
+        if counts_insert is not None:
+            print(' '.join(['Counts insert:', str(counts_insert.shape[0])]))
+            if 'cdko_sgrna_replicate_counts' in db_metadata.tables:
+                print(' '.join(['Replicate counts insert:', str(replicate_insert.shape[0])]))
+        print(' '.join(['Score insert:', str(score_insert.shape[0])]))
+
+    print('Done!')
+
+# text columns of the study files, kept as strings while reading
+SEQUENCE_FILE_DTYPES = {'sgRNA_guide_name': str, 'sgRNA_guide_seq': str, 'sgRNA_target_name': str}
+COUNTS_FILE_DTYPES = {'guide_1': str, 'guide_2': str, 'gene_1': str, 'gene_2': str, 'count_replicates': str, 'cell_line_origin': str, 'study_origin': str, 'study_conditions': str}
+SCORE_FILE_DTYPES = {'gene_1': str, 'gene_2': str, 'study_origin': str, 'cell_line_origin': str}
+
+def read_study_file(file_loc, dtypes, chunksize = 100000, sep = ','):
+    '''
+    Helper function, reads a study file in chunks. Text columns are read as is (no NA conversion), and the remaining columns as numbers.
+    '''
+    def check_columns(curr_chunk):
+        if len(set(dtypes).difference(curr_chunk.columns)) > 0:
+            raise ValueError('Missing columns in ' + str(file_loc) + ': ' + ', '.join(sorted(set(dtypes).difference(curr_chunk.columns))))
+        return(curr_chunk)
+
+    reader = pd.read_csv(file_loc, sep = sep, chunksize = chunksize, dtype = dtypes, keep_default_na = False,
+                         na_values = {col: ['', 'NA', 'NaN', 'nan', 'NULL'] for col in ['SL_score', 'SL_score_cutoff', 'statistical_score', 'statistical_score_cutoff']})
+
+    return(check_columns(curr_chunk) for curr_chunk in reader)
+
+def stream_study_to_db(engine_link, sequence_file, counts_file, score_file = None, study_controls = None, study_conditions = None, can_control_be_substring = True, chunksize = 100000, sep = ',', bulk_insert = False):
+    '''
+    Reads the sequence, counts, and score files of a study in chunks, prepares each chunk in the same way as ```prepare_study_for_export```, and inserts it to the designated DB within a single transaction. Only one chunk of a file is held in memory at a time, along with the guide and gene pair IDs of the study.
+
+    **Params**:
+
+    * engine_link: SQLAlchemy engine link
+    * sequence_file: Location of the sequence file, adhering to the sequence table template.
+    * counts_file: Location of the counts file, adhering to the counts table template.
+    * score_file: Location of the scores file, adhering to the scores table template. If None, placeholder scores are generated from the counts. (Default: None)
+    * study_controls: A list of control targets of the sgRNAs (default: None).
+    * study_conditions: A list of two lists; first list contains the replicate names of initial time point, and second list contains the same for final time point (default: None).
+    * can_control_be_substring: Can the controls be a substring of gene targets (in case of possible name conventions: default: True)
+    * chunksize: Number of rows to read from the files at a time. (Default: 100000)
+    * sep: Delimiter of the files. (Default: ',')
+    * bulk_insert: Use the bulk loading mode of the database, for large studies (Default: False)
+
+    **Returns**:
+
+    * None
+    '''
+    if study_controls is not None:
+        study_controls = [i.upper() for i in study_controls]
+
+    # the study origin of the sequences is taken from the counts
+    counts_reader = read_study_file(counts_file, COUNTS_FILE_DTYPES, chunksize = chunksize, sep = sep)
+    first_counts = next(counts_reader, None)
+    if (first_counts is None) or (first_counts.shape[0] == 0):
+        print('No counts found. Returning...')
+        return
+    study_origin = first_counts['study_origin'].iloc[0]
+
+    db_metadata = sqlalchemy.MetaData()
+    db_metadata.reflect(bind=engine_link)
+    create_id_allocation_table(engine_link)
+
+    # IDs are reserved chunk by chunk within the transaction
+    with begin_insert_transaction(engine_link, bulk_insert = bulk_insert) as transaction:
+        print('Beginning transaction...')
+
+        record_stats = {'Sequence insert': 0, 'Counts insert': 0, 'Replicate counts insert': 0, 'Score insert': 0}
 
-    # then, start the session
-    engine_session = sessionmaker(bind=engine_link)
-    curr_session = engine_session()
+        def write_score_chunk(score_chunk):
+            # scores are matched to the gene pair IDs of the counts
+            score_chunk = prepare_score_ref(score_chunk.reset_index(drop = True), study_controls, can_control_be_substring)
+            if score_chunk.shape[0] == 0:
+                return
+            score_chunk['id'] = np.arange(score_chunk.shape[0]) + allocate_ids(transaction, 'cdko_original_sl_results.id', score_chunk.shape[0])
+
+            score_chunk['gene_pair'] = sort_pair_keys(score_chunk['gene_1'].values, score_chunk['gene_2'].values)[0]
+            score_chunk['gene_pair_id'] = (score_chunk['gene_pair'] + '+' + score_chunk['cell_line_origin'] + '+' + score_chunk['study_origin']).map(gene_pair_ids)
+
+            score_chunk = strip_table_strings(score_chunk).loc[:, ['gene_1', 'gene_2', 'study_origin', 'cell_line_origin', 'SL_score', 'SL_score_cutoff', 'statistical_score', 'statistical_score_cutoff', 'gene_pair', 'SL_or_not', 'gene_pair_id', 'id']]
+            write_table_to_db(score_chunk, 'cdko_original_sl_results', transaction, bulk_insert = bulk_insert)
+            record_stats['Score insert'] += score_chunk.shape[0]
+
+        # insert sequence, keep the IDs of the guides for the counts
+        guide_ids = {}
+        control_guides = []
+        if sequence_file is not None:
+            for sequence_chunk in read_study_file(sequence_file, SEQUENCE_FILE_DTYPES, chunksize = chunksize, sep = sep):
+                control_guides.extend(sequence_chunk.loc[sequence_chunk['sgRNA_target_name'] == 'control', 'sgRNA_guide_name'].tolist())
+
+                sequence_chunk = prepare_sequence_ref(sequence_chunk.reset_index(drop = True), study_controls, study_origin)
+                sequence_chunk['sgRNA_id'] = np.arange(sequence_chunk.shape[0]) + allocate_ids(transaction, 'cdko_experiment_design.sgRNA_id', sequence_chunk.shape[0])
+                for guide_name, guide_id in zip(sequence_chunk['sgRNA_guide_name'], sequence_chunk['sgRNA_id']):
+                    guide_ids.setdefault(guide_name, guide_id)
+
+                sequence_chunk = strip_table_strings(sequence_chunk).loc[:,['sgRNA_guide_name', 'sgRNA_guide_seq', 'sgRNA_target_name', 'study_origin', 'sgRNA_id']]
+                write_table_to_db(sequence_chunk, 'cdko_experiment_design', transaction, bulk_insert = bulk_insert)
+                record_stats['Sequence insert'] += sequence_chunk.shape[0]
+
+            print('Done sequence')
+
+        # insert CDKO counts, keep the IDs of the gene pairs for the scores
+        gene_pair_ids = {}
+        # gene pairs and cell lines that already have a placeholder score
+        placeholder_keys = set()
+        if score_file is None:
+            print('There are no scores, but there are counts...Generating Placeholder...')
+
+        for counts_chunk in itertools.chain([first_counts], counts_reader):
+            counts_chunk = counts_chunk.reset_index(drop = True)
+            placeholder_scores = None
+            if score_file is None:
+                placeholder_scores = create_placeholder_scores(counts_chunk.copy(), pd.DataFrame({'sgRNA_target_name': 'control', 'sgRNA_guide_name': control_guides}))
+                placeholder_key = pd.Series(sort_pair_keys(placeholder_scores['gene_1'].values, placeholder_scores['gene_2'].values)[0]) + '+' + placeholder_scores['cell_line_origin'].values
+                new_placeholders = (~placeholder_key.isin(placeholder_keys)).values
+                placeholder_scores = placeholder_scores.loc[new_placeholders]
+                placeholder_keys.update(placeholder_key[new_placeholders])
+
+            counts_chunk = prepare_counts_ref(counts_chunk, study_controls, study_conditions)
+            counts_chunk['sgRNA_pair_id'] = np.arange(counts_chunk.shape[0]) + allocate_ids(transaction, 'cdko_sgrna_counts.sgRNA_pair_id', counts_chunk.shape[0])
+
+            counts_chunk['FK_guide_1_id'] = counts_chunk['guide_1'].map(guide_ids)
+            counts_chunk['FK_guide_2_id'] = counts_chunk['guide_2'].map(guide_ids)
+            for col in ['FK_guide_1_id', 'FK_guide_2_id']:
+                if counts_chunk[col].isna().sum() > 0:
+                    print('NA in foreign keys: ' + col)
+
+            # new gene pairs get the next IDs
+            gene_pair_key = counts_chunk['gene_pair'] + '+' + counts_chunk['cell_line_origin'] + '+' + counts_chunk['study_origin']
+            new_gene_pairs = sorted(set(gene_pair_key).difference(gene_pair_ids))
+            new_gene_pair_id = allocate_ids(transaction, 'gene_pair_id', len(new_gene_pairs))
+            gene_pair_ids.update(zip(new_gene_pairs, range(new_gene_pair_id, new_gene_pair_id + len(new_gene_pairs))))
+            counts_chunk['gene_pair_id_all'] = gene_pair_key.map(gene_pair_ids)
+
+            counts_chunk = strip_table_strings(counts_chunk).loc[:,['sgRNA_pair_id', 'FK_guide_1_id', 'FK_guide_2_id', 'gene_pair_id_all', 'gene_pair_orientation', 'T0_counts', 'T0_replicate_names', 'TEnd_counts', 'TEnd_replicate_names', 'target_type', 'study_origin', 'cell_line_origin']]
+            counts_chunk = counts_chunk.rename(columns = {'FK_guide_1_id': 'guide_1_id',
+                                                          'FK_guide_2_id': 'guide_2_id',
+                                                          'gene_pair_id_all': 'gene_pair_id'})
+            write_table_to_db(counts_chunk, 'cdko_sgrna_counts', transaction, bulk_insert = bulk_insert)
+            record_stats['Counts insert'] += counts_chunk.shape[0]
+
+            # numeric replicate counts, if the database has the table
+            if 'cdko_sgrna_replicate_counts' in db_metadata.tables:
+                replicate_insert = create_replicate_counts(counts_chunk)
+                write_table_to_db(replicate_insert, 'cdko_sgrna_replicate_counts', transaction, bulk_insert = bulk_insert)
+                record_stats['Replicate counts insert'] += replicate_insert.shape[0]
+
+            # placeholder scores of the new gene pairs are inserted with their chunk
+            if placeholder_scores is not None:
+                write_score_chunk(placeholder_scores)
+
+        print('Done counts')
+
+        # finally, insert scores
+        if score_file is not None:
+            for score_chunk in read_study_file(score_file, SCORE_FILE_DTYPES, chunksize = chunksize, sep = sep):
+                write_score_chunk(score_chunk)
+
+        print('Done score')
+
+        print('Successfully inserted!')
+
+        print('Added Record stats...')
+        for record_type in record_stats:
+            print(' '.join([record_type + ':', str(record_stats[record_type])]))
+
+    print('Done!')
+
+###### Result Cache Functions
+
+# cache files and result directories are named by their cache key, cache files of earlier formats have an extension
+CACHE_FILE_PATTERN = re.compile(r'_[0-9a-f]{40}(\.[A-Za-z]+)?$')
+
+# a result is a directory with a Feather file for each table, and the table of contents
+RESULT_TABLE_EXTENSION = '.feather'
+RESULT_CONTENTS = 'contents.json'
+
+# size limit (in bytes) of each cache directory (store_loc/save_dir), least recently used files are removed beyond it
+CACHE_SIZE = 5 * 1024**3
+
+# running size estimates (in bytes) of the cache directories, a cache directory is only walked and evicted when its estimate is beyond CACHE_SIZE
+CACHE_SIZE_ESTIMATES = {}
+
+# most recently preprocessed counts, kept in memory
+PREPROCESSED_COUNTS = {}
+PREPROCESSED_COUNTS_SIZE = 4
+
+# count annotations used by the scores
+COUNT_ANNOTATIONS = ['sgRNA_guide_name_g1', 'sgRNA_guide_name_g2', 'sgRNA_target_name_g1', 'sgRNA_target_name_g2', 'target_type', 'sgRNA_pair', 'gene_pair']
+
+def hash_columns(columns):
+    '''
+    Helper function, hashes a list of string or numeric arrays.
+    '''
+    fingerprint = hashlib.sha1()
+    for values in columns:
+        values = np.asarray(values)
+        if values.dtype == object:
+            fingerprint.update('\x1f'.join(map(str, values.ravel())).encode())
+        else:
+            fingerprint.update(str(values.dtype).encode())
+            fingerprint.update(np.ascontiguousarray(values).tobytes())
+        fingerprint.update(b'\x1e')
+
+    return(fingerprint.hexdigest())
+
+def hash_files(file_locs):
+    '''
+    Helper function, hashes the contents of a list of files.
+    '''
+    fingerprint = hashlib.sha1()
+    for file_loc in file_locs:
+        with open(file_loc, 'rb') as handle:
+            for block in iter(lambda: handle.read(1 << 20), b''):
+                fingerprint.update(block)
+        fingerprint.update(b'\x1e')
+
+    return(fingerprint.hexdigest())
+
+def fingerprint_counts(curr_counts, replicate_counts = None):
+    '''
+    Helper function, hashes the counts and guide annotations of a study and cell line, to match them with their cached preprocessing and scores.
+    '''
+    columns = [curr_counts.index.values] + [curr_counts[i].values for i in COUNT_ANNOTATIONS[:5]]
+    if replicate_counts is not None:
+        columns += [np.array(list(i.columns), dtype = object) for i in replicate_counts]
+        columns += [i.reindex(curr_counts.index).values for i in replicate_counts]
+    else:
+        columns += [curr_counts[i].values for i in ['T0_counts', 'TEnd_counts', 'T0_replicate_names', 'TEnd_replicate_names']]
+
+    return(hash_columns(columns))
+
+def get_cache_key(name, fingerprint, parameters = None):
+    '''
+    Helper function, creates the cache key of a result from the hash of its input, its parameters and the package version.
+    '''
+    parameters = sorted((parameters if parameters is not None else {}).items())
+
+    return(hashlib.sha1(repr((name, fingerprint, parameters, SLKB_VERSION)).encode()).hexdigest())
+
+def get_score_cache_key(name, curr_counts, parameters, replicate_counts = None, preprocessed_counts = None):
+    '''
+    Helper function, creates the cache key of a score from its counts and parameters. Preprocessed counts carry the hash of their counts, and add their preprocessing parameters.
+    '''
+    fingerprint = None
+    if preprocessed_counts is not None:
+        fingerprint = preprocessed_counts.get('fingerprint')
+        parameters = dict(parameters, preprocessing = preprocessed_counts['parameters'])
+    if fingerprint is None:
+        fingerprint = fingerprint_counts(curr_counts, replicate_counts = replicate_counts)
+
+    return(get_cache_key(name, fingerprint, parameters))
+
+def get_cache_file(save_loc, name, key, extension = ''):
+    '''
+    Helper function, location of the cache file of a result. Results are directories, without an extension.
+    '''
+    return(os.path.join(save_loc, name + '_' + key + extension))
+
+def save_result(file_loc, result, compression = 'uncompressed'):
+    '''
+    Helper function, writes a result (a dictionary of tables) to a directory, each table as a Feather file along with the table of contents. Other entries (None or parameters) are kept in the table of contents. Uncompressed tables are memory-mapped when loaded; compressed tables (i.e. 'zstd' or 'lz4') are smaller, but are decompressed when loaded.
+    '''
+    os.makedirs(file_loc, exist_ok = True)
+
+    contents = {}
+    for name, value in result.items():
+        if not isinstance(value, pd.DataFrame):
+            contents[name] = {'value': value}
+            continue
+
+        contents[name] = {'file': name + RESULT_TABLE_EXTENSION}
+        pyarrow.feather.write_feather(pyarrow.Table.from_pandas(value, preserve_index = True), os.path.join(file_loc, contents[name]['file']), compression = compression)
+
+    with open(os.path.join(file_loc, RESULT_CONTENTS), 'w') as handle:
+        json.dump(contents, handle)
+
+def load_result(file_loc, tables = None, columns = None):
+    '''
+    Loads a result, i.e. a cached score, preprocessed counts or the demo data. A result is a directory with a Feather file for each table, which are memory-mapped, so only the requested tables and columns are read from disk.
+
+    **Params**:
+
+    * file_loc: String: Location of the result directory.
+    * tables: Optional list of the names of the tables to load, all tables are loaded if not supplied. (Default: None)
+    * columns: Optional list of the names of the columns to load from each table, all columns are loaded if not supplied. Table indexes are always loaded. (Default: None)
+
+    **Returns**:
+
+    * result: A dictionary of the loaded tables.
+    '''
+    with open(os.path.join(file_loc, RESULT_CONTENTS)) as handle:
+        contents = json.load(handle)
+
+    result = {}
+    for name, entry in contents.items():
+        if tables is not None and name not in tables:
+            continue
+        if 'value' in entry:
+            result[name] = entry['value']
+            continue
+
+        table = pyarrow.feather.read_table(os.path.join(file_loc, entry['file']), memory_map = True)
+        if columns is not None:
+            index_columns = [i for i in table.schema.pandas_metadata['index_columns'] if isinstance(i, str)]
+            table = table.select([i for i in table.column_names if i in columns or i in index_columns])
+        result[name] = table.to_pandas()
+
+    return(result)
+
+def load_from_cache(file_loc, load_function = load_result):
+    '''
+    Helper function, loads a cache file and marks it as recently used. Returns None if the file is not cached (not computed yet, or evicted).
+    '''
+    try:
+        result = load_function(file_loc)
+        os.utime(file_loc)
+    except FileNotFoundError:
+        return(None)
+
+    return(result)
+
+def write_cache_file(file_loc, result):
+    '''
+    Helper function, writes a result to the cache atomically, to a temporary directory first that is then moved in place, so that concurrent runs never load a partially written result.
+    '''
+    os.makedirs(os.path.dirname(file_loc), exist_ok = True)
+    temp_loc = file_loc + '.' + os.urandom(8).hex() + '.tmp'
+    save_result(temp_loc, result)
+
+    try:
+        os.rename(temp_loc, file_loc)
+    except OSError:
+        # replace the earlier result, runs loading it in the meantime find it not cached
+        old_loc = file_loc + '.' + os.urandom(8).hex() + '.tmp'
+        try:
+            os.rename(file_loc, old_loc)
+            os.rename(temp_loc, file_loc)
+        except OSError:
+            # written by another run at the same time
+            pass
+        shutil.rmtree(old_loc, ignore_errors = True)
+        shutil.rmtree(temp_loc, ignore_errors = True)
+
+def get_cache_file_size(file_loc):
+    '''
+    Helper function, size of a cache file, or of the files of a result directory, in bytes.
+    '''
+    if os.path.isdir(file_loc):
+        return(sum([os.stat(os.path.join(file_loc, i)).st_size for i in os.listdir(file_loc)]))
+    return(os.stat(file_loc).st_size)
+
+def save_to_cache(file_loc, result, cache_dir):
+    '''
+    Helper function, writes a cache file, then evicts the cache directory down to its size limit once its size estimate is beyond it.
+    '''
+    write_cache_file(file_loc, result)
+
+    # the cache directory is walked on its first write, then its size is kept up to date with the written results
+    cache_dir = os.path.abspath(cache_dir)
+    if cache_dir in CACHE_SIZE_ESTIMATES:
+        try:
+            CACHE_SIZE_ESTIMATES[cache_dir] += get_cache_file_size(file_loc)
+        except FileNotFoundError:
+            # already evicted by another process
+            pass
+
+    if CACHE_SIZE_ESTIMATES.get(cache_dir, np.inf) > CACHE_SIZE:
+        evict_cache(cache_dir, keep = file_loc)
+
+def evict_cache(cache_dir, cache_size = None, keep = None):
+    '''
+    Removes the least recently used cache files and result directories of a cache directory (store_loc/save_dir of a scoring method) until it fits the cache size (Default: CACHE_SIZE). Files other than cache files are kept. Returns the size of the remaining cache files, in bytes.
+    '''
+    cache_size = CACHE_SIZE if cache_size is None else cache_size
+
+    cache_files = []
+    for root, dirs, files in os.walk(cache_dir):
+        for dir_name in list(dirs):
+            if CACHE_FILE_PATTERN.search(dir_name) is None:
+                continue
+            # a result directory is removed as a whole
+            dirs.remove(dir_name)
+            try:
+                dir_loc = os.path.join(root, dir_name)
+                cache_files.append((os.stat(dir_loc).st_mtime, get_cache_file_size(dir_loc), dir_loc))
+            except FileNotFoundError:
+                continue
+
+        for file_name in files:
+            if CACHE_FILE_PATTERN.search(file_name) is None:
+                continue
+            try:
+                file_stat = os.stat(os.path.join(root, file_name))
+            except FileNotFoundError:
+                continue
+            cache_files.append((file_stat.st_mtime, file_stat.st_size, os.path.join(root, file_name)))
+
+    total_size = sum([i[1] for i in cache_files])
+    for _, file_size, file_loc in sorted(cache_files):
+        if total_size <= cache_size:
+            break
+        if file_loc == keep:
+            continue
+        try:
+            if os.path.isdir(file_loc):
+                shutil.rmtree(file_loc)
+            else:
+                os.remove(file_loc)
+        except FileNotFoundError:
+            # already removed by another process
+            pass
+        total_size -= file_size
+
+    CACHE_SIZE_ESTIMATES[os.path.abspath(cache_dir)] = total_size
+
+    return(total_size)
+
+def migrate_result_cache(cache_dir, keep_originals = False):
+    '''
+    Converts the cache files of a cache directory (store_loc/save_dir of a scoring method) written in earlier formats to result directories: pickled scores and preprocessed counts, GI matrices (.npz), and MAGeCK (.txt) and GEMINI (.csv) outputs. Converted files keep their cache keys, so they are loaded by subsequent runs of the same SLKB version.
+
+    **Params**:
+
+    * cache_dir: String: Cache directory to convert, i.e. store_loc/save_dir.
+    * keep_originals: Boolean. Keep the converted files instead of removing them. (Default: False)
+
+    **Returns**:
+
+    * migrated: List of the locations of the converted cache files.
+    '''
+    migrated = []
+    for root, _, files in os.walk(cache_dir):
+        for file_name in files:
+            match = CACHE_FILE_PATTERN.search(file_name)
+            if match is None or match.group(1) is None:
+                continue
+            file_loc = os.path.join(root, file_name)
+            extension = os.path.splitext(file_name)[1]
+
+            try:
+                if extension == '.p':
+                    with open(file_loc, 'rb') as handle:
+                        result = pickle.load(handle)
+                elif extension == '.npz':
+                    with np.load(file_loc) as saved:
+                        n_guides = len(saved['guides'])
+                        result = get_gi_matrix_tables(sparse.coo_matrix((saved['data'], (saved['row'], saved['col'])), shape = (n_guides, n_guides)), saved['guides'])
+                elif extension == '.txt':
+                    result = {file_name[:match.start()]: pd.read_csv(file_loc, index_col = 0, sep = "\t")}
+                elif extension == '.csv':
+                    result = {file_name[:match.start()]: pd.read_csv(file_loc, index_col = 0)}
+                else:
+                    continue
+
+                migrated_loc = file_loc[:-len(extension)]
+                write_cache_file(migrated_loc, result)
+            except (TypeError, ValueError, pyarrow.ArrowException) as e:
+                print('Could not migrate ' + file_loc + ': ' + str(e))
+                continue
+
+            # keep the order of eviction
+            file_stat = os.stat(file_loc)
+            os.utime(migrated_loc, (file_stat.st_atime, file_stat.st_mtime))
+            if not keep_originals:
+                os.remove(file_loc)
+            migrated.append(migrated_loc)
+
+    print('Migrated ' + str(len(migrated)) + ' cache files!')
+
+    return(migrated)
+
+###### External Job Functions
+
+# executables of the external scoring tools, can be set to their full paths (or to stand-ins for testing)
+MAGECK_EXECUTABLE = 'mageck'
+RSCRIPT_EXECUTABLE = 'Rscript'
+
+# R script of GEMINI, scores a single study and cell line, or a manifest of them in one R session
+GEMINI_SCRIPT = os.path.join(PACKAGE_PATH, 'files', 'GEMINI.R')
+
+def run_external_job(file_loc, log_loc, name = None, cwd = None, timeout = None, manifest_loc = None):
+    '''
+    Runs the command script of an external scoring tool (MAGeCK or GEMINI) as a managed job. The output of the job is streamed to its log file rather than kept in memory, and the job, with all processes it started, is stopped once it exceeds its timeout (on posix; elsewhere only the process of the script). Any non-zero exit code is a failure. Completed jobs are recorded in the manifest, one JSON record per line.
+
+    **Params**:
+
+    * file_loc: String: Location of the command script.
+    * log_loc: String: Location of the log file, for the standard output and error of the job.
+    * name: Optional string, name of the job in the manifest. (Default: None)
+    * cwd: Optional string, working directory of the job. (Default: None, current working directory)
+    * timeout: Optional time limit of the job, in seconds. (Default: None, no limit)
+    * manifest_loc: Optional string, location of the manifest to record the job to. (Default: None)
+
+    **Returns**:
+
+    * job: A dictionary of the job record: name, script, log, status (finished, failed or timeout), return code, start time and wall time.
+    '''
+    start_time = time.time()
+    with open(log_loc, 'wb') as log:
+        # on posix, in a new session, so that the processes started by the script can be stopped with it
+        process = subprocess.Popen([file_loc], stdout = log, stderr = subprocess.STDOUT, cwd = cwd, start_new_session = os.name == 'posix')
+        try:
+            returncode = process.wait(timeout = timeout)
+            status = 'finished' if returncode == 0 else 'failed'
+        except subprocess.TimeoutExpired:
+            stop_external_job(process)
+            returncode = process.wait()
+            status = 'timeout'
+        except BaseException:
+            stop_external_job(process)
+            process.wait()
+            raise
+
+    job = {'name': name,
+           'script': file_loc,
+           'log': log_loc,
+           'status': status,
+           'returncode': returncode,
+           'start_time': start_time,
+           'wall_time': time.time() - start_time}
+
+    if manifest_loc is not None:
+        # a single write per record, so that concurrent jobs can share the manifest
+        with open(manifest_loc, 'a') as handle:
+            handle.write(json.dumps(job) + '\n')
+
+    return(job)
+
+def stop_external_job(process):
+    '''
+    Helper function, kills an external job. On posix, the whole process group of the job is killed, elsewhere only the process of its script.
+    '''
+    if os.name == 'posix':
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            # already exited
+            pass
+    else:
+        process.kill()
+
+def report_failed_job(job, tool):
+    '''
+    Helper function, reports a failed external job, and returns the lines of its log.
+    '''
+    print('Error in ' + tool + '!!! Job ' + job['status'] + ' with exit code ' + str(job['returncode']) + ', see the log at: ' + job['log'])
+    with open(job['log'], errors = 'replace') as handle:
+        return(handle.read().splitlines())
 
-    # get number of records in each table
-    sequence_records_num = curr_session.query(sequence_table).count()
-    counts_records_num = curr_session.query(counts_table).count()
-    scores_records_num = curr_session.query(scores_table).count()
+###### Score Analysis Functions
 
-    # get available gene pairs
-    available_gene_pairs = curr_session.query(sqlalchemy.func.max(counts_table.c.gene_pair_id)).first()[0]
+# column types of the joined_counts view
+JOINED_COUNTS_DTYPES = {'gene_pair_id': np.int64,
+                        'T0_counts': str,
+                        'T0_replicate_names': str,
+                        'TEnd_counts': str,
+                        'TEnd_replicate_names': str,
+                        'target_type': str,
+                        'study_origin': str,
+                        'cell_line_origin': str}
+
+def load_counts_by_study(engine_link, studies = None, cell_lines = None, chunksize = 100000):
+    '''
+    Loads the counts (joined_counts) one study and cell line at a time, so that only one partition is held in memory. Each partition is read in chunks from the database.
 
-    # for the first instance
-    if available_gene_pairs is None:
-        available_gene_pairs = -1
+    **Params**:
 
-    # in the case of studies that doesn't have counts, but were added
-    temp = curr_session.query(sqlalchemy.func.max(scores_table.c.gene_pair_id)).first()[0]
+    * engine_link: SQLAlchemy connection for the database.
+    * studies: Optional list of studies to load. (Default: None, all studies)
+    * cell_lines: Optional list of cell lines to load. (Default: None, all cell lines)
+    * chunksize: Number of rows to read from the database at a time. (Default: 100000)
 
-    if temp is not None:
-        available_gene_pairs = max(available_gene_pairs, temp)
+    **Returns**:
 
-    # proceed to add the IDs to each table and reindex
-    if db_inserts['sequence_ref'] is not None:
-        sequence_insert = db_inserts['sequence_ref'].reset_index(drop=True)
-    else:
-        sequence_insert = None
+    * A generator of (curr_study, curr_cl, curr_counts) tuples, where curr_counts is indexed by sgRNA_pair_id and can be passed to the scoring functions.
+    '''
+    # get the available partitions
+    with engine_link.connect() as connection:
+        partitions = pd.read_sql_query(con = connection, sql = sqlalchemy.text('SELECT DISTINCT study_origin, cell_line_origin FROM cdko_sgrna_counts'))
 
-    if db_inserts['counts_ref'] is not None:
-        counts_insert = db_inserts['counts_ref'].reset_index(drop=True)
-    else:
-        counts_insert = None
-    score_insert = db_inserts['score_ref'].reset_index(drop=True)
+    if studies is not None:
+        partitions = partitions.loc[partitions['study_origin'].isin([str(i) for i in studies])]
+    if cell_lines is not None:
+        partitions = partitions.loc[partitions['cell_line_origin'].isin([str(i) for i in cell_lines])]
 
-    # add the current number of records for proper insertion
-    if sequence_insert is not None:
-        sequence_insert.index += sequence_records_num
-    if counts_insert is not None:
-        counts_insert.index += counts_records_num
-    score_insert.index += scores_records_num
-
-    # set IDs
-    if sequence_insert is not None:
-        sequence_insert['sgRNA_id'] = sequence_insert.index
-    if counts_insert is not None:
-        counts_insert['sgRNA_pair_id'] = counts_insert.index
-    score_insert['id'] = score_insert.index
-    score_insert['gene_pair_id'] = score_insert['id'].copy()
-    
-    # update the gene pairs
-    print('Updating gene pairs with seperator |...')
-    if counts_insert is not None:
-        counts_insert['gene_pair'] = np.array(['|'.join(sorted([counts_insert["gene_1"].iloc[i], counts_insert["gene_2"].iloc[i]])) for i in range(counts_insert.shape[0])])
-    score_insert['gene_pair'] = np.array(['|'.join(sorted([score_insert["gene_1"].iloc[i], score_insert["gene_2"].iloc[i]])) for i in range(score_insert.shape[0])])
-
-    if (sequence_insert is not None) or (counts_insert is not None):
-        for_merging = sequence_insert.copy()
-        for_merging['ref_id'] = for_merging.index
-
-        # # add the foreign keys
-        counts_insert['FK_guide_1_id'] = counts_insert.merge(for_merging, how = 'left', left_on = 'guide_1', right_on = 'sgRNA_guide_name')['ref_id'].values
-        counts_insert['FK_guide_2_id'] = counts_insert.merge(for_merging, how = 'left', left_on = 'guide_2', right_on = 'sgRNA_guide_name')['ref_id'].values
-
-    if counts_insert is not None:
-        for_merging = score_insert.copy()
-
-        # in the case of multiple cell lines
-        for_merging['gene_pair+cell_line+study_origin'] = for_merging['gene_pair'] + '+' + for_merging['cell_line_origin'] + '+' + for_merging['study_origin']
-        counts_insert['gene_pair+cell_line+study_origin'] = counts_insert['gene_pair'] + '+' + counts_insert['cell_line_origin'] + '+' + counts_insert['study_origin']
-
-        # set the gene pair id
-        #counts_insert['gene_pair_id_all'] = np.NaN
-        # dual have the gene pair id
-        #counts_insert.loc[counts_insert['target_type'] == 'Dual', 'gene_pair_id_all'] = counts_insert.loc[counts_insert['target_type'] == 'Dual'].groupby(['gene_pair+cell_line+study_origin']).ngroup() + (available_gene_pairs + 1)
-        counts_insert['gene_pair_id_all'] = counts_insert.groupby(['gene_pair+cell_line+study_origin']).ngroup() + (available_gene_pairs + 1)
-
-        score_insert['gene_pair_id'] = for_merging.merge(counts_insert.drop_duplicates(subset = 'gene_pair+cell_line+study_origin'), how = 'left', left_on = 'gene_pair+cell_line+study_origin', right_on = 'gene_pair+cell_line+study_origin')['gene_pair_id_all'].values
-
-    ## check if there is any NA in the references
-    if (sequence_insert is not None) or (counts_insert is not None):
-        for col in ['FK_guide_1_id', 'FK_guide_2_id']:
-            if counts_insert[col].isna().sum() > 0:
-                print('NA in foreign keys: ' + col)
-    else:
-        print('No counts and sequences together')
+    query = sqlalchemy.text('SELECT * FROM joined_counts WHERE study_origin = :curr_study AND cell_line_origin = :curr_cl')
 
-    print('Final QC...')
-    # Final quality control
-    if sequence_insert is not None:
-        sequence_insert = sequence_insert.applymap(lambda x: x.strip() if isinstance(x, str) else x, na_action='ignore')
-    if counts_insert is not None:
-        counts_insert = counts_insert.applymap(lambda x: x.strip() if isinstance(x, str) else x, na_action='ignore')
-    score_insert = score_insert.applymap(lambda x: x.strip() if isinstance(x, str) else x, na_action='ignore')
+    for curr_study, curr_cl in partitions.sort_values(['study_origin', 'cell_line_origin']).itertuples(index = False):
+        print('Loading counts for: ' + curr_study + ', ' + curr_cl)
 
-    # proceed to insert to the database
+        with engine_link.connect().execution_options(stream_results = True) as connection:
+            chunks = pd.read_sql_query(con = connection, sql = query, params = {'curr_study': curr_study, 'curr_cl': curr_cl},
+                                       index_col = 'sgRNA_pair_id', dtype = JOINED_COUNTS_DTYPES, chunksize = chunksize)
+            curr_counts = pd.concat(list(chunks), axis = 0)
 
-    # start the transaction, # insert only the columns we need
-    with engine_link.begin() as transaction:
-        # insert sequence
-        print('Beginning transaction...')
+        yield((curr_study, curr_cl, curr_counts))
 
-        if sequence_insert is not None:
-            sequence_insert = sequence_insert.loc[:,['sgRNA_guide_name', 'sgRNA_guide_seq', 'sgRNA_target_name', 'study_origin', 'sgRNA_id']]
-            sequence_insert.to_sql(name = 'cdko_experiment_design', con = transaction, if_exists = 'append', index = False, index_label = 'sgRNA_id')
+def get_replicate_counts(curr_counts, engine_link):
+    '''
+    Loads the T0 and TEnd counts of the given counts from the numeric replicate counts table, skipping the parsing of the ';' joined counts.
 
-            print('Done sequence')
+    **Params**:
 
-        # insert CDKO counts
-        if counts_insert is not None:
-            counts_insert = counts_insert.loc[:,['sgRNA_pair_id', 'FK_guide_1_id', 'FK_guide_2_id', 'gene_pair_id_all', 'gene_pair_orientation', 'T0_counts', 'T0_replicate_names', 'TEnd_counts', 'TEnd_replicate_names', 'target_type', 'study_origin', 'cell_line_origin']]
+    * curr_counts: Counts to load the replicate counts for, indexed by sgRNA_pair_id (as read from joined_counts).
+    * engine_link: SQLAlchemy connection for the database.
 
-            counts_insert = counts_insert.rename(columns = {'FK_guide_1_id': 'guide_1_id',
-                                                                   'FK_guide_2_id': 'guide_2_id',
-                                                                   'gene_pair_id_all': 'gene_pair_id'})
+    **Returns**:
 
-            counts_insert.to_sql(name = 'cdko_sgrna_counts', con = transaction, if_exists = 'append', index = False, index_label = 'sgRNA_pair_id')
+    * replicate_counts: A tuple of two pandas dataframes, T0 counts and TEnd counts, that can be passed to the scoring functions.
+    '''
+    pair_ids = curr_counts['sgRNA_pair_id'].values if 'sgRNA_pair_id' in curr_counts.columns else curr_counts.index.values
 
-            print('Done counts')
+    query = sqlalchemy.text('SELECT r.sgRNA_pair_id, r.timepoint, r.replicate_index, r.replicate_count FROM cdko_sgrna_replicate_counts r '
+                            'INNER JOIN cdko_sgrna_counts c ON r.sgRNA_pair_id = c.sgRNA_pair_id '
+                            'WHERE c.study_origin IN :studies AND c.cell_line_origin IN :cell_lines')
+    query = query.bindparams(sqlalchemy.bindparam('studies', expanding = True), sqlalchemy.bindparam('cell_lines', expanding = True))
 
-        # finally, insert scores
-        score_insert = score_insert.loc[:, ['gene_1', 'gene_2', 'study_origin', 'cell_line_origin', 'SL_score', 'SL_score_cutoff', 'statistical_score', 'statistical_score_cutoff', 'gene_pair', 'SL_or_not', 'gene_pair_id', 'id']]
-        score_insert.to_sql(name = 'cdko_original_sl_results', con = transaction, if_exists = 'append', index = False, index_label = 'id')
+    with engine_link.connect() as connection:
+        res = pd.read_sql_query(con = connection, sql = query,
+                                params = {'studies': [str(i) for i in set(curr_counts['study_origin'])],
+                                          'cell_lines': [str(i) for i in set(curr_counts['cell_line_origin'])]})
 
-        print('Done score')
+    replicate_counts = []
+    for timepoint in ['T0', 'TEnd']:
+        replicate_names = curr_counts[timepoint + '_replicate_names'].iloc[0].split(';')
+        curr_res = res.loc[(res['timepoint'] == timepoint) & (res['replicate_index'] < len(replicate_names))]
 
-        print('Successfully inserted!')
+        # place the counts according to the order of the given counts
+        row_loc = pd.Index(pair_ids).get_indexer(curr_res['sgRNA_pair_id'])
+        available = row_loc != -1
 
-        print('Added Record stats...')
-        if sequence_insert is not None:
-            print(' '.join(['Sequence insert:', str(sequence_insert.shape[0])]))
-        if counts_insert is not None:
-            print(' '.join(['Counts insert:', str(counts_insert.shape[0])]))
-        print(' '.join(['Score insert:', str(score_insert.shape[0])]))
+        counts = np.full((len(pair_ids), len(replicate_names)), np.nan)
+        counts[row_loc[available], curr_res['replicate_index'].values[available]] = curr_res['replicate_count'].values[available]
 
-    print('Done!')
+        replicate_counts.append(pd.DataFrame(data = counts, index = curr_counts.index, columns = replicate_names))
 
-###### Score Analysis Functions
+    return(tuple(replicate_counts))
 
-def get_raw_counts(curr_counts):
+def get_raw_counts(curr_counts, replicate_counts = None):
     '''
     Helper function, gets the raw counts based on the T0 and TEnd annotations of the sample names
     '''
     print('Getting raw counts...')
-    # get counts
-    T0_counts = curr_counts['T0_counts'].apply(    
-        lambda x: np.array(x.split(";"), dtype = np.float64)
-    )
-
-    T0_counts = pd.DataFrame(data = T0_counts.tolist(),
-                   index = T0_counts.index, columns = curr_counts['T0_replicate_names'].iloc[0].split(';'))
 
-    TEnd_counts = curr_counts['TEnd_counts'].apply(    
-        lambda x: np.array(x.split(";"), dtype = np.float64)
-    )
+    if replicate_counts is not None:
+        # already numeric, from get_replicate_counts
+        T0_counts = replicate_counts[0].reindex(curr_counts.index)
+        TEnd_counts = replicate_counts[1].reindex(curr_counts.index)
+    else:
+        # get counts
+        T0_counts = pd.DataFrame(data = parse_replicate_counts(curr_counts['T0_counts']),
+                       index = curr_counts.index, columns = curr_counts['T0_replicate_names'].iloc[0].split(';'))
 
-    TEnd_counts = pd.DataFrame(data = TEnd_counts.tolist(),
-                   index = TEnd_counts.index, columns = curr_counts['TEnd_replicate_names'].iloc[0].split(';'))
+        TEnd_counts = pd.DataFrame(data = parse_replicate_counts(curr_counts['TEnd_counts']),
+                       index = curr_counts.index, columns = curr_counts['TEnd_replicate_names'].iloc[0].split(';'))
     
     # make sure no columns are filled with NAs completely (in case of additional annotations)
     NA_replicate = T0_counts.isna().sum()
@@ -645,49 +1578,312 @@ def normalize_counts(curr_counts, set_normalization = 1e6):
     return(curr_counts)
 
 
+def preprocess_counts(curr_counts, full_normalization = False, filtering_counts = 35, pseudocount = 10, replicate_counts = None):
+    '''
+    Preprocesses the counts of a study and cell line for the Median, sgRNA-Derived and Horlbeck scores. Parses the raw counts and sorts the gene pairs and guides, then filters (at T0), pseudocounts and normalizes the counts.
+
+    **Params**:
+
+    * curr_counts: Counts to preprocess.
+    * full_normalization: Whether to normalize counts across the whole sample or according to target type (Default: False)
+    * filtering_counts: sgRNAs with T0 counts less than this value are filtered. (Default: 35)
+    * pseudocount: Pseudocount added after filtering. (Default: 10)
+    * replicate_counts: Optional tuple of T0 and TEnd counts, obtained via ```get_replicate_counts```. Counts are parsed from curr_counts if not supplied. (Default: None)
+
+    **Returns**:
+
+    * preprocessed_counts: A dictionary of the count annotations with sorted gene and guide pairs ('counts'), the raw T0 and TEnd counts ('T0_counts', 'TEnd_counts'), and the filtered and normalized T0 and TEnd counts ('T0_normalized', 'TEnd_normalized'). Can be passed to the scoring functions.
+    '''
+    print('Preprocessing counts...')
+
+    T0_counts, TEnd_counts = get_raw_counts(curr_counts, replicate_counts = replicate_counts)
+    curr_counts = curr_counts.loc[:, COUNT_ANNOTATIONS[:5]].copy()
+
+    # add sorted targets
+    sorted_gene_pairs, sorted_gene_guides = sort_pairs_and_guides(curr_counts)
+    curr_counts['sgRNA_pair'] = sorted_gene_guides
+    curr_counts['gene_pair'] = sorted_gene_pairs
+
+    # filter counts, only at T0
+    t_0_comb = filter_counts(T0_counts.copy(), filtering_counts = filtering_counts)
+    print(' '.join(['Filtered a total of', str(TEnd_counts.shape[0] - t_0_comb.shape[0]), "out of", str(TEnd_counts.shape[0]), "sgRNAs."]))
+    print("\n---\n")
+
+    # add pseudocount after filtering
+    t_0_comb = t_0_comb + pseudocount
+    t_end_comb = TEnd_counts + pseudocount
+
+    # some sgRNAs were filtered out
+    overlapping_sgRNAs = sorted(list(set(t_0_comb.index).intersection(set(t_end_comb.index))))
+
+    t_0_comb = t_0_comb.loc[overlapping_sgRNAs,:]
+    t_end_comb = t_end_comb.loc[overlapping_sgRNAs,:]
+    target_types = curr_counts.loc[overlapping_sgRNAs, 'target_type']
+
+    # normalize to the median of the all time points
+    if full_normalization:
+        print('Full normalization...')
+        normalization_value = np.median(pd.concat([t_0_comb, t_end_comb], axis = 1).sum(axis = 0))
+
+        t_0_comb = normalize_counts(t_0_comb, set_normalization = normalization_value)
+        t_end_comb = normalize_counts(t_end_comb, set_normalization = normalization_value)
+
+    else:
+        print('Not full normalization...')
+        for subset in set(target_types):
+            idx = target_types.index[target_types == subset]
+
+            # normalize to the median of the all time points
+            normalization_value = np.median(pd.concat([t_0_comb.loc[idx,:], t_end_comb.loc[idx,:]], axis = 1).sum(axis = 0))
+
+            t_0_comb.loc[idx,:] = normalize_counts(t_0_comb.loc[idx,:], set_normalization = normalization_value)
+            t_end_comb.loc[idx,:] = normalize_counts(t_end_comb.loc[idx,:], set_normalization = normalization_value)
+
+    return({'counts': curr_counts,
+            'T0_counts': T0_counts,
+            'TEnd_counts': TEnd_counts,
+            'T0_normalized': t_0_comb,
+            'TEnd_normalized': t_end_comb,
+            'parameters': {'full_normalization': full_normalization, 'filtering_counts': filtering_counts, 'pseudocount': pseudocount}})
+
+def get_preprocessed_counts(curr_counts, curr_study, curr_cl, full_normalization = False, replicate_counts = None, store_loc = os.getcwd(), save_dir = 'PREPROCESSING_Files'):
+    '''
+    Obtains the preprocessed counts of a study and cell line (see ```preprocess_counts```), preprocessing them only once. Preprocessed counts are cached in memory and at the store location, keyed by the hash of the counts, the parameters and the package version, so changed counts are preprocessed again.
+
+    **Params**:
+
+    * curr_counts: Counts to preprocess.
+    * curr_study: String, name of study to preprocess data for.
+    * curr_cl: String, name of cell line to preprocess data for.
+    * full_normalization: Whether to normalize counts across the whole sample or according to target type (Default: False)
+    * replicate_counts: Optional tuple of T0 and TEnd counts, obtained via ```get_replicate_counts```. Counts are parsed from curr_counts if not supplied. (Default: None)
+    * store_loc: String: Directory to store the preprocessed counts to. (Default: current working directory)
+    * save_dir: String: Folder name to store the preprocessed counts to. (Default: 'PREPROCESSING_Files')
+
+    **Returns**:
+
+    * preprocessed_counts: A dictionary of preprocessed counts, see ```preprocess_counts```. Shared between the scores, must not be modified.
+    '''
+    fingerprint = fingerprint_counts(curr_counts, replicate_counts = replicate_counts)
+    key = get_cache_key('preprocessed_counts', fingerprint, {'full_normalization': full_normalization})
+
+    if key in PREPROCESSED_COUNTS:
+        print('Loading preprocessed counts from memory!')
+        preprocessed_counts = PREPROCESSED_COUNTS.pop(key)
+    else:
+        file_loc = get_cache_file(os.path.join(store_loc, save_dir, curr_study, curr_cl), 'preprocessed_counts', key)
+
+        preprocessed_counts = load_from_cache(file_loc)
+        if preprocessed_counts is not None:
+            print('Loading preprocessed counts!')
+        else:
+            preprocessed_counts = preprocess_counts(curr_counts, full_normalization = full_normalization, replicate_counts = replicate_counts)
+            preprocessed_counts['fingerprint'] = fingerprint
+
+            save_to_cache(file_loc, preprocessed_counts, os.path.join(store_loc, save_dir))
+
+    # keep the most recently used ones
+    PREPROCESSED_COUNTS[key] = preprocessed_counts
+    while len(PREPROCESSED_COUNTS) > PREPROCESSED_COUNTS_SIZE:
+        PREPROCESSED_COUNTS.pop(next(iter(PREPROCESSED_COUNTS)))
+
+    return(preprocessed_counts)
+
+def sort_groups(values, codes, n_groups):
+    '''
+    Helper function, sorts values by their group codes and then by value, NaN last. Values are sorted first and then stably by their codes, which is a radix sort for up to 65536 groups.
+    '''
+    order = np.argsort(values)
+    order = order[np.argsort(codes[order].astype(np.min_scalar_type(max(n_groups - 1, 0))), kind = 'stable')]
+
+    return(values[order])
+
+def group_statistics(values, groups, statistics = ['median']):
+    '''
+    Helper function, computes statistics of the values of each group in one vectorized pass (sorted group codes and bincount reductions), instead of calling a function per group. Groups are sorted, and rows with missing groups are left out, as in groupby.
+
+    Available statistics follow the per group calls they replace: median and sem (ddof = 1) propagate NaN, nanmedian, mean and var (population variance) skip NaN, and size counts all values.
+
+    Values can be a single column or a 2D matrix (i.e. replicates as columns), in which case the groups are coded once and every column is reduced in the same pass.
+
+    Returns a dataframe indexed by the groups, with one column per statistic. For 2D values, each statistic holds a dataframe with the value columns.
+    '''
+    if not isinstance(groups, list):
+        groups = [groups]
+    names = [getattr(i, 'name', None) for i in groups]
+    groups = [np.asarray(i) for i in groups]
+    columns = getattr(values, 'columns', None)
+    values = np.asarray(values, dtype = np.float64)
+
+    codes = pd.DataFrame(dict(enumerate(groups))).groupby(list(range(len(groups)))).ngroup().values
+    keep = ~np.isnan(codes) & (codes >= 0)
+    codes, values, groups = codes[keep].astype(np.int64), values[keep], [i[keep] for i in groups]
+
+    n_groups = codes.max() + 1 if len(codes) > 0 else 0
+    first_loc = np.unique(codes, return_index = True)[1]
+    if len(groups) == 1:
+        index = pd.Index(groups[0][first_loc], name = names[0])
+    else:
+        index = pd.MultiIndex.from_arrays([i[first_loc] for i in groups], names = names)
+
+    # code each (column, group) separately for 2D values
+    n_columns = 1
+    if values.ndim == 2:
+        n_columns = values.shape[1]
+        if columns is None:
+            columns = pd.RangeIndex(n_columns)
+        codes = (codes[None, :] + n_groups * np.arange(n_columns)[:, None]).ravel()
+        values = values.T.ravel()
+    n_bins = n_groups * n_columns
+
+    is_nan = np.isnan(values)
+    size = np.bincount(codes, minlength = n_bins)
+    n_valid = size - np.bincount(codes, weights = is_nan, minlength = n_bins).astype(np.int64)
+    has_nan = n_valid < size
+
+    results = {}
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        mean = np.bincount(codes, weights = np.where(is_nan, 0, values), minlength = n_bins) / n_valid
+        squares = np.bincount(codes, weights = np.where(is_nan, 0, (values - mean[codes])**2), minlength = n_bins)
+
+        if 'median' in statistics or 'nanmedian' in statistics:
+            # columns are sorted separately, their codes are offset by the column
+            n_values = len(values) // n_columns
+            sorted_values = np.concatenate([sort_groups(values[i*n_values:(i+1)*n_values], codes[i*n_values:(i+1)*n_values] - i*n_groups, n_groups) for i in range(n_columns)])
+            starts = np.cumsum(size) - size
+
+        for statistic in statistics:
+            if statistic == 'median':
+                # middle values of each sorted group
+                results[statistic] = np.where(has_nan, np.nan, (sorted_values[starts + (size - 1) // 2] + sorted_values[starts + size // 2]) / 2)
+            elif statistic == 'nanmedian':
+                # NaN are sorted last, middle values of the valid values of each group
+                results[statistic] = np.where(n_valid == 0, np.nan, (sorted_values[starts + np.maximum(n_valid - 1, 0) // 2] + sorted_values[starts + n_valid // 2]) / 2)
+            elif statistic == 'mean':
+                results[statistic] = mean
+            elif statistic == 'var':
+                results[statistic] = squares / n_valid
+            elif statistic == 'sem':
+                results[statistic] = np.where(has_nan, np.nan, np.sqrt(squares / (size - 1) / size))
+            elif statistic == 'size':
+                results[statistic] = size
+            else:
+                raise ValueError('Unknown statistic: ' + str(statistic))
+
+    if columns is not None:
+        return(pd.concat({statistic: pd.DataFrame(results[statistic].reshape(n_columns, n_groups).T, index = index, columns = columns) for statistic in statistics}, axis = 1))
+
+    return(pd.DataFrame(results, index = index))
+
 def sort_pairs_and_guides(curr_counts):
     # sort the genes and guides based on gene ordering
     print('Sorting gene pairs and guides based on ordering gene ordering...')
-    gene_pairs = []
-    gene_pair_guides = []
-    for i in range(curr_counts.shape[0]):
+    gene_pairs, swapped = sort_pair_keys(curr_counts['sgRNA_target_name_g1'].values, curr_counts['sgRNA_target_name_g2'].values)
 
-        guide_1 = curr_counts['sgRNA_guide_name_g1'].iloc[i]
-        guide_2 = curr_counts['sgRNA_guide_name_g2'].iloc[i]
+    # swap the guides accordingly
+    guide_1 = np.where(swapped, curr_counts['sgRNA_guide_name_g2'].values, curr_counts['sgRNA_guide_name_g1'].values)
+    guide_2 = np.where(swapped, curr_counts['sgRNA_guide_name_g1'].values, curr_counts['sgRNA_guide_name_g2'].values)
+    gene_pair_guides = join_pair_labels(guide_1, guide_2)
 
-        gene_1 = curr_counts['sgRNA_target_name_g1'].iloc[i]
-        gene_2 = curr_counts['sgRNA_target_name_g2'].iloc[i]
+    return(gene_pairs, gene_pair_guides)
 
-        t_gene_1, t_gene_2 = sorted([gene_1, gene_2])
+# adapted from Horlbeck et al., https://github.com/mhorlbeck/GImap_tools/blob/601cd22126432edadb30202e952859195c73a841/GImap_analysis.py
+def quadFitForceIntercept(query_codes, xdata, ydata, bdata):
+    '''
+    Helper function, fits y = m0 * x^2 + m1 * x + b for every query sgRNA at once and returns the expected phenotypes.
 
+    The fit is a linear least squares problem, so it is solved through the normal equations of each query group instead of an iterative optimizer.
+    '''
+    n_queries = query_codes.max() + 1 if len(query_codes) > 0 else 0
+    ydata = ydata - bdata
 
-        if (t_gene_1 == gene_1) and (t_gene_2 == gene_2):
-            gene_1 = t_gene_1
-            gene_2 = t_gene_2
-        else:
-            gene_1 = t_gene_1
-            gene_2 = t_gene_2
+    # normal equations of each query group
+    s_x2 = np.bincount(query_codes, weights = xdata**2, minlength = n_queries)
+    s_x3 = np.bincount(query_codes, weights = xdata**3, minlength = n_queries)
+    s_x4 = np.bincount(query_codes, weights = xdata**4, minlength = n_queries)
+    s_x2y = np.bincount(query_codes, weights = (xdata**2) * ydata, minlength = n_queries)
+    s_xy = np.bincount(query_codes, weights = xdata * ydata, minlength = n_queries)
 
-            # swap the guides accordingly
-            temp = guide_1
-            guide_1 = guide_2
-            guide_2 = temp
+    lhs = np.stack([np.stack([s_x4, s_x3], axis = -1), np.stack([s_x3, s_x2], axis = -1)], axis = -2)
+    rhs = np.stack([s_x2y, s_xy], axis = -1)[..., np.newaxis]
 
-        gene_pairs.append('|'.join([gene_1, gene_2]))
-        gene_pair_guides.append('|'.join([guide_1, guide_2]))
+    # pseudo inverse keeps queries with a single or constant single phenotype solvable
+    m = (np.linalg.pinv(lhs) @ rhs)[..., 0]
+    m = m[query_codes]
 
-    return(gene_pairs, gene_pair_guides)
+    return m[:, 0]*(xdata**2) + m[:, 1]*xdata + bdata
 
-# taken from Horlbeck et al., https://github.com/mhorlbeck/GImap_tools/blob/601cd22126432edadb30202e952859195c73a841/GImap_analysis.py
-def quadFitForceIntercept(xdata, ydata, bdata):
-    m1 = optimize.fmin(lambda m, x, y: ((m[0]*(x**2) + m[1]*x + bdata - y)**2).sum(), x0=[0.1,0.1], args=(xdata, ydata), disp=0)
-    
-    return lambda x1: m1[0]*(np.array(x1)**2) + m1[1]*np.array(x1) + bdata
+def calculate_gi_scores(curr_counts, query_col, paired_col, paired_target_col, paired_average, query_average):
+    '''
+    Helper function, calculates the sgRNA level GI scores of one orientation for all query sgRNAs in one pass. Returns the GI scores aligned to the rows of the counts.
+    '''
+    query_codes, query_sgRNAs = pd.factorize(curr_counts[query_col])
 
+    # x is the single phenotypes and y is the pair phenotypes
+    xs = paired_average.loc[curr_counts[paired_col].values].values.astype(np.float64)
+    ys = curr_counts['FC_Averaged_abbaAveraged'].values.astype(np.float64)
+    bs = query_average.loc[query_sgRNAs].values.astype(np.float64)[query_codes]
 
-def run_horlbeck_preprocessing(curr_counts, filterThreshold = 35, pseudocount = 10):
-        
-    T0_counts, TEnd_counts = get_raw_counts(curr_counts.copy())
+    # the difference is the GI score
+    GI_Score = ys - quadFitForceIntercept(query_codes, xs, ys, bs)
+
+    # scale each query by the spread of its pairs with control sgRNAs
+    if 'Control' in set(curr_counts['target_type']):
+        control_idx = (curr_counts[paired_target_col] == "CONTROL").values
+        control_codes = query_codes[control_idx]
+
+        n_controls = np.bincount(control_codes, minlength = len(query_sgRNAs))
+        control_mean = np.bincount(control_codes, weights = GI_Score[control_idx], minlength = len(query_sgRNAs)) / np.maximum(n_controls, 1)
+        control_std = np.sqrt(np.bincount(control_codes, weights = (GI_Score[control_idx] - control_mean[control_codes])**2, minlength = len(query_sgRNAs)) / np.maximum(n_controls, 1))
+
+        scale = np.where((n_controls > 0) & (control_std != 0), control_std, 1)
+        GI_Score = GI_Score / scale[query_codes]
+
+    return(GI_Score)
+
+
+def create_gi_matrix(GI_Score, query_loc, paired_loc, n_guides):
+    '''
+    Helper function, stores sgRNA level GI scores in a sparse query x paired sgRNA matrix. Repeated pairs keep the last score.
+    '''
+    # keep only the last score of the repeated pairs
+    pair_loc = query_loc.astype(np.int64) * n_guides + paired_loc
+    _, last_idx = np.unique(pair_loc[::-1], return_index = True)
+    last_idx = len(pair_loc) - 1 - last_idx
+
+    return(sparse.csr_matrix((GI_Score[last_idx], (query_loc[last_idx], paired_loc[last_idx])), shape = (n_guides, n_guides)))
+
+def get_gi_matrix_tables(GI_Score, all_guides):
+    '''
+    Helper function, stores a sparse GI matrix as tables of its scores and its sgRNA names.
+    '''
+    GI_Score = GI_Score.tocoo()
+
+    return({'scores': pd.DataFrame(data = {'row': GI_Score.row, 'col': GI_Score.col, 'data': GI_Score.data}),
+            'guides': pd.DataFrame(data = {'guide': np.array(all_guides, dtype = str)})})
+
+def load_gi_matrix(saved, all_guides):
+    '''
+    Helper function, loads a sparse GI matrix from its tables and aligns it to the given sgRNA names.
+    '''
+    guide_loc = pd.Index(all_guides).get_indexer(saved['guides']['guide'].values)
+    row = guide_loc[saved['scores']['row'].values]
+    col = guide_loc[saved['scores']['col'].values]
+    data = saved['scores']['data'].values
+
+    # sgRNAs that are no longer available are dropped
+    available = (row != -1) & (col != -1)
+
+    return(sparse.csr_matrix((data[available], (row[available], col[available])), shape = (len(all_guides), len(all_guides))))
+
+def run_horlbeck_preprocessing(curr_counts, filterThreshold = 35, pseudocount = 10, replicate_counts = None, preprocessed_counts = None):
+
+    if preprocessed_counts is None:
+        preprocessed_counts = preprocess_counts(curr_counts, replicate_counts = replicate_counts)
+
+    # raw counts and sorted targets are shared with the other scores
+    curr_counts = preprocessed_counts['counts'].copy()
+    T0_counts, TEnd_counts = preprocessed_counts['T0_counts'], preprocessed_counts['TEnd_counts']
     
     # horlbeck uses single x single as double, proceed to move them to dual instead
     replace_idx = (curr_counts['target_type'] == 'Single') & (curr_counts['sgRNA_target_name_g1'] == curr_counts['sgRNA_target_name_g2'])
@@ -696,74 +1892,62 @@ def run_horlbeck_preprocessing(curr_counts, filterThreshold = 35, pseudocount =
     if T0_counts.shape[1] != TEnd_counts.shape[1]:
         print("Mismatch times, averaging...")
 
-        T0_counts = pd.DataFrame(data = T0_counts.apply(lambda x: np.mean(x), axis = 1).values,
+        T0_counts = pd.DataFrame(data = T0_counts.mean(axis = 1).values,
                              index = T0_counts.index)
 
-        TEnd_counts = pd.DataFrame(data = TEnd_counts.apply(lambda x: np.mean(x), axis = 1).values,
+        TEnd_counts = pd.DataFrame(data = TEnd_counts.mean(axis = 1).values,
                  index = TEnd_counts.index)
 
-    T0_counts = pd.concat([T0_counts, curr_counts['sgRNA_guide_name_g1'], curr_counts['sgRNA_guide_name_g2']], axis = 1)
-    TEnd_counts = pd.concat([TEnd_counts, curr_counts['sgRNA_guide_name_g1'], curr_counts['sgRNA_guide_name_g2']], axis = 1)
-    all_sgRNAs = set(TEnd_counts['sgRNA_guide_name_g1']).union(set(TEnd_counts['sgRNA_guide_name_g2']))
-
-    # add sorted targets
-    sorted_gene_pairs, sorted_gene_guides = sort_pairs_and_guides(curr_counts.copy())
-    curr_counts['sgRNA_pair'] = sorted_gene_guides
-    curr_counts['gene_pair'] = sorted_gene_pairs
-    
-    replicate_list = []
-    for replicate_i in range(len(T0_counts.columns)-2):
-        print("For replicate " + str(replicate_i + 1))
-        meanCounts = pd.concat((TEnd_counts.iloc[:,replicate_i].groupby(TEnd_counts['sgRNA_guide_name_g1']).agg(np.median),TEnd_counts.iloc[:,replicate_i].groupby(TEnd_counts['sgRNA_guide_name_g2']).agg(np.median)),axis=1, keys=['sgRNA_guide_name_g1', 'sgRNA_guide_name_g2'])
-        sgsToFilter = set(meanCounts.loc[meanCounts.loc[:,'sgRNA_guide_name_g1'] < filterThreshold].index).union(set(meanCounts.loc[meanCounts.loc[:,'sgRNA_guide_name_g2'] < filterThreshold].index))
-        print(" ".join(["Total of", str(len(sgsToFilter)), 'sgRNAs were filtered out of', str(len(all_sgRNAs))]))
-
-        chosen_idx = np.array([True if i not in sgsToFilter else False for i in TEnd_counts['sgRNA_guide_name_g1']]) & np.array([True if i not in sgsToFilter else False for i in TEnd_counts['sgRNA_guide_name_g2']])
-        TEnd_counts_curr = TEnd_counts.iloc[chosen_idx, replicate_i]
-        T0_counts_curr = T0_counts.iloc[chosen_idx, replicate_i]
+    T0_counts = T0_counts.reindex(curr_counts.index).values + pseudocount
+    TEnd_counts = TEnd_counts.reindex(curr_counts.index)
+    n_replicates = TEnd_counts.shape[1]
 
-        counts_ratio = ((T0_counts_curr + pseudocount).sum()*1.0)/(TEnd_counts_curr + pseudocount).sum()
+    # code the sgRNAs of both positions together, missing sgRNAs are coded as -1
+    guide_codes, all_sgRNAs = pd.factorize(np.concatenate([curr_counts['sgRNA_guide_name_g1'].values, curr_counts['sgRNA_guide_name_g2'].values]))
+    guide_codes = guide_codes.reshape(2, -1)
 
-        # calculate FC like in horlbeck
-        replicate_FC = np.log2((TEnd_counts_curr + pseudocount)/(T0_counts_curr + pseudocount)/counts_ratio)
-        replicate_FC.columns = ['Replicate_' + str(replicate_i+1) + "_FC"]
-        replicate_FC.name = 'Replicate_' + str(replicate_i+1) + "_FC"
-
-        # get control
-        control_effect = 0
-        if 'Control' in set(curr_counts['target_type']):
-            control_index = curr_counts['target_type'] == 'Control'
-            if control_index.sum() != 0:
-                control_effect = replicate_FC.loc[control_index].median()
+    # filter sgRNAs with low median counts at either position, for all replicates at once
+    sgsToFilter = np.zeros((len(all_sgRNAs) + 1, n_replicates), dtype = bool)
+    for position_codes in guide_codes:
+        meanCounts = group_statistics(TEnd_counts.values, pd.Series(position_codes).where(position_codes != -1), ['nanmedian'])['nanmedian']
+        sgsToFilter[meanCounts.index.values.astype(np.int64)] |= meanCounts.values < filterThreshold
 
-        replicate_FC -= control_effect
+    for replicate_i in range(n_replicates):
+        print("For replicate " + str(replicate_i + 1))
+        print(" ".join(["Total of", str(sgsToFilter[:, replicate_i].sum()), 'sgRNAs were filtered out of', str(len(all_sgRNAs))]))
 
-        # doubling differences, taken from original code
-        replicate_FC /= 6.3
+    # missing sgRNAs index the last, never filtered, row
+    chosen_idx = ~sgsToFilter[guide_codes[0]] & ~sgsToFilter[guide_codes[1]]
+    TEnd_counts = TEnd_counts.values + pseudocount
 
-        curr_counts = curr_counts.join(replicate_FC)
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        counts_ratio = np.array([np.nansum(T0_counts[chosen_idx[:, i], i])*1.0/np.nansum(TEnd_counts[chosen_idx[:, i], i]) for i in range(n_replicates)])
 
-        replicate_list.append(replicate_FC)
+        # calculate FC like in horlbeck
+        replicate_FC = np.log2(TEnd_counts/T0_counts/counts_ratio)
+    replicate_FC[~chosen_idx] = np.nan
 
-    # save the results to original data
-    replicate_list = pd.concat(replicate_list, axis = 1)
-    replicate_list = replicate_list.dropna()
+    # get control
+    control_index = (curr_counts['target_type'] == 'Control').values
+    if control_index.sum() != 0:
+        replicate_FC -= pd.DataFrame(replicate_FC[control_index]).median().values
 
-    replicate_list = replicate_list.mean(axis = 1)
+    # doubling differences, taken from original code
+    replicate_FC /= 6.3
 
-    replicate_list.columns = ['FC_Averaged']
-    replicate_list.name = 'FC_Averaged'
+    replicate_FC = pd.DataFrame({'Replicate_' + str(i+1) + "_FC": replicate_FC[:, i] for i in range(n_replicates)}, index = curr_counts.index)
+    for column in replicate_FC.columns:
+        curr_counts[column] = replicate_FC[column].values
 
-    curr_counts = curr_counts.join(replicate_list)
+    # save the results to original data, for constructs kept in all replicates
+    curr_counts['FC_Averaged'] = replicate_FC.dropna().mean(axis = 1)
 
-    average_of_transpose = curr_counts.groupby('sgRNA_pair')['FC_Averaged'].apply(np.nanmean)
-    curr_counts = curr_counts.join(average_of_transpose,
-                             on = 'sgRNA_pair',
-                             rsuffix = "_abbaAveraged")
+    average_of_transpose = group_statistics(curr_counts['FC_Averaged'], curr_counts['sgRNA_pair'], ['mean'])['mean']
+    curr_counts['FC_Averaged_abbaAveraged'] = average_of_transpose.reindex(curr_counts['sgRNA_pair'].values).values
     
     return(curr_counts)
 
-def run_horlbeck_score(curr_counts, curr_study, curr_cl, do_preprocessing = True, store_loc = os.getcwd(), save_dir = 'HORLBECK_Files', re_run = False):
+def run_horlbeck_score(curr_counts, curr_study, curr_cl, do_preprocessing = True, store_loc = os.getcwd(), save_dir = 'HORLBECK_Files', re_run = False, replicate_counts = None, preprocessed_counts = None):
     '''
     
     Calculates Horlbeck score. Score files will created at the designated store location and save directory. 
@@ -775,7 +1959,9 @@ def run_horlbeck_score(curr_counts, curr_study, curr_cl, do_preprocessing = True
     * store_loc: String: Directory to store the MAGeCK files to. (Default: current working directory)
     * save_dir: String: Folder name to store the MAGeCK files to. (Default: 'Horlbeck_Files')
     * do_preprocessing: Boolean. Run Horlbeck preprocessing (Default: True)
-    * re_run: Boolean. Recreate and rerun the results instead of loading for subsequent analyses (Default: False)
+    * re_run: Boolean. Recompute the results even if a cached result matches the counts and parameters (Default: False)
+    * replicate_counts: Optional tuple of T0 and TEnd counts, obtained via ```get_replicate_counts```. Counts are parsed from curr_counts if not supplied. (Default: None)
+    * preprocessed_counts: Optional preprocessed counts, obtained via ```get_preprocessed_counts```. Obtained from curr_counts if not supplied. (Default: None)
 
     **Returns**:
 
@@ -789,7 +1975,9 @@ def run_horlbeck_score(curr_counts, curr_study, curr_cl, do_preprocessing = True
     print('Running preprocessing...')
 
     if do_preprocessing:
-        curr_counts = run_horlbeck_preprocessing(curr_counts)
+        if preprocessed_counts is None:
+            preprocessed_counts = get_preprocessed_counts(curr_counts, curr_study, curr_cl, replicate_counts = replicate_counts, store_loc = store_loc)
+        curr_counts = run_horlbeck_preprocessing(curr_counts, preprocessed_counts = preprocessed_counts)
 
 
     #########/ preprocessing
@@ -810,12 +1998,11 @@ def run_horlbeck_score(curr_counts, curr_study, curr_cl, do_preprocessing = True
     a_average = a_average[a_average['sgRNA_target_name_g2'] == "CONTROL"]
     b_average = b_average[b_average['sgRNA_target_name_g1'] == "CONTROL"]
 
-    a_average = a_average.groupby('sgRNA_guide_name_g1')['FC_Averaged_abbaAveraged'].apply(np.mean)
-    b_average = b_average.groupby('sgRNA_guide_name_g2')['FC_Averaged_abbaAveraged'].apply(np.mean)
+    a_average = group_statistics(a_average['FC_Averaged_abbaAveraged'], a_average['sgRNA_guide_name_g1'], ['mean'])['mean'].rename('FC_Averaged_abbaAveraged')
+    b_average = group_statistics(b_average['FC_Averaged_abbaAveraged'], b_average['sgRNA_guide_name_g2'], ['mean'])['mean'].rename('FC_Averaged_abbaAveraged')
 
     # single, control, and dual phenotypes are used in calculation
     all_pairs = set(curr_counts['sgRNA_guide_name_g1']).union(set(curr_counts['sgRNA_guide_name_g2']))
-    curr_counts['GI_Averaged'] = 0
 
     # for missing pairs, update a_average, b_average
     a_average_0s = list(all_pairs.difference(set(a_average.index)))
@@ -824,111 +2011,45 @@ def run_horlbeck_score(curr_counts, curr_study, curr_cl, do_preprocessing = True
     b_average_0s = list(all_pairs.difference(set(b_average.index)))
     b_average = pd.concat([b_average, pd.Series(data = np.zeros(len(b_average_0s)), index = b_average_0s)])
 
-    # store in a matrix
-    GI_Score_1 = pd.DataFrame(0, index = sorted(list(all_pairs)), columns = sorted(list(all_pairs)))
-    GI_Score_2 = pd.DataFrame(0, index = sorted(list(all_pairs)), columns = sorted(list(all_pairs)))
-    
+    # store in a sparse matrix, indexed by sgRNA codes
+    all_guides = pd.Index(sorted(list(all_pairs)))
+    guide_1_loc = all_guides.get_indexer(curr_counts['sgRNA_guide_name_g1'])
+    guide_2_loc = all_guides.get_indexer(curr_counts['sgRNA_guide_name_g2'])
     
+    # scores are cached by the hash of the phenotypes they are calculated from
+    gi_key = get_cache_key('GI_Score', hash_columns([curr_counts[i].values for i in ['sgRNA_guide_name_g1', 'sgRNA_guide_name_g2', 'sgRNA_target_name_g1', 'sgRNA_target_name_g2', 'target_type', 'FC_Averaged_abbaAveraged']]))
+    GI_Score_1_loc = get_cache_file(save_loc, 'GI_Score_1', gi_key)
+    GI_Score_2_loc = get_cache_file(save_loc, 'GI_Score_2', gi_key)
+
+    GI_Score_1 = load_from_cache(GI_Score_1_loc, lambda file_loc: load_gi_matrix(load_result(file_loc), all_guides)) if not re_run else None
+    GI_Score_2 = load_from_cache(GI_Score_2_loc, lambda file_loc: load_gi_matrix(load_result(file_loc), all_guides)) if not re_run else None
+
     # scores have already been computed
-    if os.path.exists(os.path.join(save_loc, "GI_Score_1.gzip")) and (not re_run):
+    if GI_Score_1 is not None:
         print('Scores exist For GI_Score_1! Loading...')
-        GI_Score_1 = pd.read_pickle(os.path.join(save_loc, "GI_Score_1.gzip"))
     else:
         print('Calculating GI_Score_1...')
         
-        ## A orientation ()
-
-        ## go through all query sgRNAs
-        for query_sgRNA in all_pairs:
-
-            ## get all the pairs with the given query
-            idx_loc = (curr_counts['sgRNA_guide_name_g2'] == query_sgRNA)
-
-            if len(idx_loc) == 0:
-                continue
-
-            ## all pairs 
-            curr_filtered_pairs = curr_counts.loc[idx_loc, :]
-
-            ## get sgRNAs assayed together with the query sgRNA
-            selected_sgRNAs = curr_filtered_pairs['sgRNA_guide_name_g1'].values
-
-            if 'Control' in set(curr_counts['target_type']):
-                control_sgRNAs = np.where(curr_filtered_pairs['sgRNA_target_name_g1'] == "CONTROL")[0]
-
-            # Fit to a quadratic formula, where the x is the single phenotypes and y is the pair phenotypes
+        ## A orientation (), query sgRNAs are at the second location
+        GI_Score = calculate_gi_scores(curr_counts, 'sgRNA_guide_name_g2', 'sgRNA_guide_name_g1', 'sgRNA_target_name_g1', a_average, b_average)
 
-            xs = a_average.loc[selected_sgRNAs].values # a -> b
-            ys = curr_filtered_pairs['FC_Averaged_abbaAveraged'].values
-            bs = b_average.loc[query_sgRNA] # b -> a
-
-            res_fn = quadFitForceIntercept(xs, ys, bs)
-
-            # get expected
-            expected_phenotype = res_fn(xs)
-
-            # the difference is the GI score
-            GI_Score = ys - expected_phenotype
-
-            if ('Control' in set(curr_counts['target_type'])) and len(control_sgRNAs) > 0:
-                if GI_Score[control_sgRNAs].std() != 0:
-                    GI_Score /= GI_Score[control_sgRNAs].std()
-
-            GI_Score_1.loc[query_sgRNA, selected_sgRNAs] = GI_Score
+        GI_Score_1 = create_gi_matrix(GI_Score, guide_2_loc, guide_1_loc, len(all_guides))
             
         # save scores for future loading
-        GI_Score_1.to_pickle(os.path.join(save_loc, "GI_Score_1.gzip"))
+        save_to_cache(GI_Score_1_loc, get_gi_matrix_tables(GI_Score_1, all_guides), os.path.join(store_loc, save_dir))
     
-    if os.path.exists(os.path.join(save_loc, "GI_Score_2.gzip")) and (not re_run):
+    if GI_Score_2 is not None:
         print('Scores exist For GI_Score_2! Loading...')
-        GI_Score_2 = pd.read_pickle(os.path.join(save_loc, "GI_Score_2.gzip"))
     else:
         print('Calculating GI_Score_2...')
 
-        ## B orientation ()
-        ## go through all query sgRNAs
-        for query_sgRNA in all_pairs:
-
-            ## get all the pairs with the given query
-            idx_loc = (curr_counts['sgRNA_guide_name_g1'] == query_sgRNA)
-
-            if len(idx_loc) == 0:
-                continue
-
-            ## all pairs 
-            curr_filtered_pairs = curr_counts.loc[idx_loc, :]
-
-            ## get sgRNAs assayed together with the query sgRNA
-            selected_sgRNAs = curr_filtered_pairs['sgRNA_guide_name_g2'].values
-
-            if 'Control' in set(curr_counts['target_type']):
-                control_sgRNAs = np.where(curr_filtered_pairs['sgRNA_target_name_g2'] == "CONTROL")[0]
-
-            # Fit to a quadratic formula, where the x is the single phenotypes and y is the pair phenotypes
-
-            xs = b_average.loc[selected_sgRNAs].values # b -> a
-            ys = curr_filtered_pairs['FC_Averaged_abbaAveraged'].values
-            bs = a_average.loc[query_sgRNA] # a -> b
-
-            res_fn = quadFitForceIntercept(xs, ys, bs)
-
-            # get expected
-            expected_phenotype = res_fn(xs)
-
-            # the difference is the GI score
-            GI_Score = ys - expected_phenotype
-
-            if ('Control' in set(curr_counts['target_type'])) and len(control_sgRNAs) > 0:
-                if GI_Score[control_sgRNAs].std() != 0:
-                    GI_Score /= GI_Score[control_sgRNAs].std()
-
-            # set the 
-            #curr_res['sgRNA_level']['dual'].loc[idx_loc, replicate_GI_name] += GI_Score
-            GI_Score_2.loc[query_sgRNA, selected_sgRNAs] = GI_Score
+        ## B orientation (), query sgRNAs are at the first location
+        GI_Score = calculate_gi_scores(curr_counts, 'sgRNA_guide_name_g1', 'sgRNA_guide_name_g2', 'sgRNA_target_name_g2', b_average, a_average)
 
+        GI_Score_2 = create_gi_matrix(GI_Score, guide_1_loc, guide_2_loc, len(all_guides))
 
         # save scores for future loading
-        GI_Score_2.to_pickle(os.path.join(save_loc, "GI_Score_2.gzip"))
+        save_to_cache(GI_Score_2_loc, get_gi_matrix_tables(GI_Score_2, all_guides), os.path.join(store_loc, save_dir))
     
     
     # average between A and B orientations
@@ -936,22 +2057,19 @@ def run_horlbeck_score(curr_counts, curr_study, curr_cl, do_preprocessing = True
     GI_Score_avg = (GI_Score_1 + GI_Score_2)/2
     GI_Score_avg = (GI_Score_avg + GI_Score_avg.T)/2
 
-    for i in range(len(curr_counts['GI_Averaged'])):
-        guide_1 = curr_counts['sgRNA_guide_name_g1'].iloc[i]
-        guide_2 = curr_counts['sgRNA_guide_name_g2'].iloc[i]
-
-        curr_counts['GI_Averaged'].iloc[i] = GI_Score_avg.loc[guide_1, guide_2]
+    # gather the averaged scores of each sgRNA pair
+    curr_counts['GI_Averaged'] = np.asarray(GI_Score_avg[guide_1_loc, guide_2_loc]).ravel()
 
     
     ######### /original horlbeck scoring
     
     
     # store results
-    SL_score = curr_counts.groupby('gene_pair')['GI_Averaged'].apply(lambda x: np.mean(x))
-    SE = curr_counts.groupby('gene_pair')['GI_Averaged'].apply(lambda x: sem(x, ddof=1))
+    gene_pair_stats = group_statistics(curr_counts['GI_Averaged'], curr_counts['gene_pair'], ['mean', 'sem'])
+    SL_score = gene_pair_stats['mean']
+    SE = gene_pair_stats['sem']
 
-    genes_1 = [i.split('|')[0] for i in SL_score.index]
-    genes_2 = [i.split('|')[1] for i in SL_score.index]
+    genes_1, genes_2 = split_pair_labels(SL_score.index)
     
     horlbeck_results = pd.DataFrame(data = {'SL_score' : SL_score.values,
                                              'standard_error' : SE.values,
@@ -960,7 +2078,7 @@ def run_horlbeck_score(curr_counts, curr_study, curr_cl, do_preprocessing = True
     
     
     # remove possible controls
-    control_idx = np.array([True if 'CONTROL' in i else False for i in horlbeck_results.index])
+    control_idx = np.asarray(horlbeck_results.index.str.contains('CONTROL', regex = False), dtype = bool)
     horlbeck_results = horlbeck_results.loc[~control_idx]
     
     results = {}
@@ -968,7 +2086,7 @@ def run_horlbeck_score(curr_counts, curr_study, curr_cl, do_preprocessing = True
 
     return(results)
 
-def run_median_scores(curr_counts, curr_study, curr_cl, full_normalization = False, re_run = False, store_loc = os.getcwd(), save_dir = 'MEDIAN_Files'):
+def run_median_scores(curr_counts, curr_study, curr_cl, full_normalization = False, re_run = False, store_loc = os.getcwd(), save_dir = 'MEDIAN_Files', replicate_counts = None, preprocessed_counts = None):
     '''
     Calculates Median B/NB Scores.
 
@@ -978,9 +2096,11 @@ def run_median_scores(curr_counts, curr_study, curr_cl, full_normalization = Fal
     * curr_study: String, name of study to analyze data for.
     * curr_cl: String, name of cell line to analyze data for.
     * full_normalization: Whether to normalize counts across the whole sample or according to target type (Default: False)
-    * re_run: Boolean. Recreate and rerun the results instead of loading for subsequent analyses (Default: False)
+    * re_run: Boolean. Recompute the results even if a cached result matches the counts and parameters (Default: False)
     * store_loc: String: Directory to store the Median files to. (Default: current working directory)
     * save_dir: String: Folder name to store the Median files to. (Default: 'MEDIAN_Files')
+    * replicate_counts: Optional tuple of T0 and TEnd counts, obtained via ```get_replicate_counts```. Counts are parsed from curr_counts if not supplied. (Default: None)
+    * preprocessed_counts: Optional preprocessed counts, obtained via ```get_preprocessed_counts```. Obtained from curr_counts if not supplied. (Default: None)
 
     **Returns**:
 
@@ -997,56 +2117,25 @@ def run_median_scores(curr_counts, curr_study, curr_cl, full_normalization = Fal
     os.makedirs(save_loc, exist_ok = True)
 
     
-    if os.path.exists(os.path.join(save_loc, "median_results.p")) and (not re_run):
+    # results are cached by the counts and the scoring parameters
+    cache_loc = get_cache_file(save_loc, 'median_results', get_score_cache_key('median_results', curr_counts, {'full_normalization': full_normalization}, replicate_counts = replicate_counts, preprocessed_counts = preprocessed_counts))
+    results = load_from_cache(cache_loc) if not re_run else None
+
+    if results is not None:
         print('Loading final results!')
-        #results =  pd.read_pickle(os.path.join(save_loc, "median_results.p"))
-        with open(os.path.join(save_loc, "median_results.p"), 'rb') as handle:
-            results = pickle.load(handle)
     else:
     
         ######### preprocessing
-        t_0_comb, t_end_comb = get_raw_counts(curr_counts)
-
-        # filter counts, only at T0
-        t_0_comb = filter_counts(t_0_comb, filtering_counts = 35)
-        print(' '.join(['Filtered a total of', str(t_end_comb.shape[0] - t_0_comb.shape[0]), "out of", str(t_end_comb.shape[0]), "sgRNAs."]))
-        print("\n---\n")
-
-        # add pseudocount of 10 after filtering
-        t_0_comb = t_0_comb + 10
-        t_end_comb = t_end_comb + 10
-
-        # some sgRNAs were filtered out
-        overlapping_sgRNAs = sorted(list(set(t_0_comb.index).intersection(set(t_end_comb.index))))
-
-        t_0_comb = t_0_comb.loc[overlapping_sgRNAs,:]
-        t_end_comb = t_end_comb.loc[overlapping_sgRNAs,:]
-        curr_counts = curr_counts.loc[overlapping_sgRNAs,:]
-
-        # normalize to the median of the all time points
-        if full_normalization:
-            print('Full normalization...')
-            normalization_value = np.median(pd.concat([t_0_comb, t_end_comb], axis = 1).sum(axis = 0))
-
-            t_0_comb = normalize_counts(t_0_comb, set_normalization = normalization_value)
-            t_end_comb = normalize_counts(t_end_comb, set_normalization = normalization_value)
-
-        else:
-            print('Not full normalization...')
-            for subset in set(curr_counts['target_type']):
-                idx = curr_counts.loc[curr_counts['target_type'] == subset,:].index
-
-                # normalize to the median of the all time points
-                normalization_value = np.median(pd.concat([t_0_comb.loc[idx,:], t_end_comb.loc[idx,:]], axis = 1).sum(axis = 0))
-
-                t_0_comb.loc[idx,:] = normalize_counts(t_0_comb.loc[idx,:], set_normalization = normalization_value)
-                t_end_comb.loc[idx,:] = normalize_counts(t_end_comb.loc[idx,:], set_normalization = normalization_value)
-
+        if preprocessed_counts is None:
+            preprocessed_counts = get_preprocessed_counts(curr_counts, curr_study, curr_cl, full_normalization = full_normalization, replicate_counts = replicate_counts, store_loc = store_loc)
 
+        t_0_comb = preprocessed_counts['T0_normalized']
+        t_end_comb = preprocessed_counts['TEnd_normalized']
+        curr_counts = preprocessed_counts['counts'].loc[t_0_comb.index].copy()
 
         # get median of counts 
-        t_0_comb = t_0_comb.apply(lambda x: np.median(x), axis = 1)
-        t_end_comb = t_end_comb.apply(lambda x: np.median(x), axis = 1)
+        t_0_comb = pd.Series(np.median(t_0_comb.values, axis = 1), index = t_0_comb.index)
+        t_end_comb = pd.Series(np.median(t_end_comb.values, axis = 1), index = t_end_comb.index)
 
         # get LFC
         FC = np.log2(t_end_comb) - np.log2(t_0_comb)
@@ -1054,11 +2143,6 @@ def run_median_scores(curr_counts, curr_study, curr_cl, full_normalization = Fal
         # set FC
         curr_counts['FC'] = FC
 
-        # add sorted targets
-        sorted_gene_pairs, sorted_gene_guides = sort_pairs_and_guides(curr_counts.copy())
-        curr_counts['sgRNA_pair'] = sorted_gene_guides
-        curr_counts['gene_pair'] = sorted_gene_pairs
-
         ######### /preprocessing
 
         # store results
@@ -1086,8 +2170,7 @@ def run_median_scores(curr_counts, curr_study, curr_cl, full_normalization = Fal
         single_repeat = pd.concat([single, temp_repeat])
 
         # get single sgRNA impact
-        EC_single = single_repeat.groupby("sgRNA_guide_name_g1")['FC'].apply(
-                lambda x: np.median(x))
+        EC_single = group_statistics(single_repeat['FC'], single_repeat["sgRNA_guide_name_g1"], ['median'])['median']
 
         # get control sgRNA impact
         EC_control = None
@@ -1097,9 +2180,8 @@ def run_median_scores(curr_counts, curr_study, curr_cl, full_normalization = Fal
             temp_repeat['sgRNA_guide_name_g1'] = control["sgRNA_guide_name_g2"]
             temp_repeat['sgRNA_guide_name_g2'] = control["sgRNA_guide_name_g1"]
 
-            EC_control = pd.concat([control, temp_repeat]).groupby("sgRNA_guide_name_g1")['FC'].apply(
-                lambda x: np.median(x)
-            )
+            control_repeat = pd.concat([control, temp_repeat])
+            EC_control = group_statistics(control_repeat['FC'], control_repeat["sgRNA_guide_name_g1"], ['median'])['median']
 
             EC_single = EC_single.drop(set(EC_control.index).intersection(set(EC_single.index)))
 
@@ -1126,17 +2208,16 @@ def run_median_scores(curr_counts, curr_study, curr_cl, full_normalization = Fal
         dual['Median-NB-dual-SL-sgRNA'] = dual['FC'].values - EC_1.values - EC_2.values
 
         ## calculate SL scores (sgRNA)
-        gene_pair_SL = dual.groupby('gene_pair')['Median-NB-dual-IS'].apply(lambda x: np.median(x))
-        gene_pair_SE = dual.groupby('gene_pair')['Median-NB-dual-IS'].apply(lambda x: np.var(x) / np.size(x))
+        gene_pair_stats = group_statistics(dual['Median-NB-dual-IS'], dual['gene_pair'], ['median', 'var', 'size'])
+        gene_pair_SL = gene_pair_stats['median']
+        gene_pair_SE = gene_pair_stats['var'] / gene_pair_stats['size']
 
         ## calculate SL scores (gene)
-        gene_SL = single_repeat.groupby("sgRNA_target_name_g1")['FC'].apply(
-        lambda x: np.median(x))
-        gene_SE = single_repeat.groupby("sgRNA_target_name_g1")['FC'].apply(
-            lambda x: np.var(x) / np.size(x))
+        gene_stats = group_statistics(single_repeat['FC'], single_repeat["sgRNA_target_name_g1"], ['median', 'var', 'size'])
+        gene_SL = gene_stats['median']
+        gene_SE = gene_stats['var'] / gene_stats['size']
 
-        genes_1 = np.array([i.split('|')[0] for i in gene_pair_SL.index])
-        genes_2 = np.array([i.split('|')[1] for i in gene_pair_SL.index])
+        genes_1, genes_2 = split_pair_labels(gene_pair_SL.index)
 
         all_genes = set(genes_1).union(set(genes_2))
         missing_genes = all_genes.difference(set(gene_SL.index))
@@ -1167,19 +2248,18 @@ def run_median_scores(curr_counts, curr_study, curr_cl, full_normalization = Fal
             dual['Median-B-dual-SL-sgRNA'] = (dual['FC'].values - control_median) - (EC_1.values - control_median) - (EC_2.values - control_median)
 
             ## calculate SL scores (sgRNA)
-            gene_pair_SL = dual.groupby('gene_pair')['Median-B-dual-IS'].apply(lambda x: np.median(x))
-            gene_pair_SE = dual.groupby('gene_pair')['Median-B-dual-IS'].apply(lambda x: np.var(x) / np.size(x))
+            gene_pair_stats = group_statistics(dual['Median-B-dual-IS'], dual['gene_pair'], ['median', 'var', 'size'])
+            gene_pair_SL = gene_pair_stats['median']
+            gene_pair_SE = gene_pair_stats['var'] / gene_pair_stats['size']
 
             # remove controls first
             single_repeat['FC'] = single_repeat['FC'] - control_median
             ## calculate SL scores (gene)
-            gene_SL = single_repeat.groupby("sgRNA_target_name_g1")['FC'].apply(
-            lambda x: np.median(x))
-            gene_SE = single_repeat.groupby("sgRNA_target_name_g1")['FC'].apply(
-                lambda x: np.var(x) / np.size(x))
+            gene_stats = group_statistics(single_repeat['FC'], single_repeat["sgRNA_target_name_g1"], ['median', 'var', 'size'])
+            gene_SL = gene_stats['median']
+            gene_SE = gene_stats['var'] / gene_stats['size']
 
-            genes_1 = np.array([i.split('|')[0] for i in gene_pair_SL.index])
-            genes_2 = np.array([i.split('|')[1] for i in gene_pair_SL.index])
+            genes_1, genes_2 = split_pair_labels(gene_pair_SL.index)
 
             all_genes = set(genes_1).union(set(genes_2))
             missing_genes = all_genes.difference(set(gene_SL.index))
@@ -1202,8 +2282,7 @@ def run_median_scores(curr_counts, curr_study, curr_cl, full_normalization = Fal
             results['MEDIAN_B_SCORE'] = median_b_results
             
         # save for easy loading
-        with open(os.path.join(save_loc, "median_results.p"), 'wb') as handle:
-            pickle.dump(results, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        save_to_cache(cache_loc, results, os.path.join(store_loc, save_dir))
     
     ######### /scoring
     
@@ -1211,7 +2290,7 @@ def run_median_scores(curr_counts, curr_study, curr_cl, full_normalization = Fal
     # return computed scores
     return(results)
 
-def run_sgrna_scores(curr_counts, curr_study, curr_cl, full_normalization = False, re_run = False, store_loc = os.getcwd(), save_dir = 'sgRNA-DERIVED_Files'):
+def run_sgrna_scores(curr_counts, curr_study, curr_cl, full_normalization = False, re_run = False, store_loc = os.getcwd(), save_dir = 'sgRNA-DERIVED_Files', replicate_counts = None, preprocessed_counts = None):
     '''
     Calculates sgRNA Derived N/NB scores.
 
@@ -1221,9 +2300,11 @@ def run_sgrna_scores(curr_counts, curr_study, curr_cl, full_normalization = Fals
     * curr_study: String, name of study to analyze data for.
     * curr_cl: String, name of cell line to analyze data for.
     * full_normalization: Whether to normalize counts across the whole sample or according to target type (Default: False)
-    * re_run: Boolean. Recreate and rerun the results instead of loading for subsequent analyses (Default: False)
+    * re_run: Boolean. Recompute the results even if a cached result matches the counts and parameters (Default: False)
     * store_loc: String: Directory to store the sgRNA-Derived files to. (Default: current working directory)
     * save_dir: String: Folder name to store the sgRNA-Derived files to. (Default: 'sgRNA-DERIVED_Files')
+    * replicate_counts: Optional tuple of T0 and TEnd counts, obtained via ```get_replicate_counts```. Counts are parsed from curr_counts if not supplied. (Default: None)
+    * preprocessed_counts: Optional preprocessed counts, obtained via ```get_preprocessed_counts```. Obtained from curr_counts if not supplied. (Default: None)
 
 
     **Returns**:
@@ -1240,59 +2321,28 @@ def run_sgrna_scores(curr_counts, curr_study, curr_cl, full_normalization = Fals
     os.makedirs(save_loc, exist_ok = True)
 
     
-    if os.path.exists(os.path.join(save_loc, "sgRNA_results.p")) and (not re_run):
+    # results are cached by the counts and the scoring parameters
+    cache_loc = get_cache_file(save_loc, 'sgRNA_results', get_score_cache_key('sgRNA_results', curr_counts, {'full_normalization': full_normalization}, replicate_counts = replicate_counts, preprocessed_counts = preprocessed_counts))
+    results = load_from_cache(cache_loc) if not re_run else None
+
+    if results is not None:
         print('Loading final results!')
-        #results =  pd.read_pickle(os.path.join(save_loc, "sgRNA_results.gzip"))
-        with open(os.path.join(save_loc, "sgRNA_results.p"), 'rb') as handle:
-            results = pickle.load(handle)
     else:
 
         ######### preprocessing
-        t_0_comb, t_end_comb = get_raw_counts(curr_counts)
-
-        # filter counts, only at T0
-        t_0_comb = filter_counts(t_0_comb, filtering_counts = 35)
-        print(' '.join(['Filtered a total of', str(t_end_comb.shape[0] - t_0_comb.shape[0]), "out of", str(t_end_comb.shape[0]), "sgRNAs."]))
-        print("\n---\n")
-
-        # add pseudocount of 10 after filtering
-        t_0_comb = t_0_comb + 10
-        t_end_comb = t_end_comb + 10
-
-        # some sgRNAs were filtered out
-        overlapping_sgRNAs = sorted(list(set(t_0_comb.index).intersection(set(t_end_comb.index))))
-
-        t_0_comb = t_0_comb.loc[overlapping_sgRNAs,:]
-        t_end_comb = t_end_comb.loc[overlapping_sgRNAs,:]
-        curr_counts = curr_counts.loc[overlapping_sgRNAs,:]
-
-        if full_normalization:
-            print('Full normalization...')
-
-            # normalize to the median of the all time points
-            normalization_value = np.median(pd.concat([t_0_comb, t_end_comb], axis = 1).sum(axis = 0))
+        if preprocessed_counts is None:
+            preprocessed_counts = get_preprocessed_counts(curr_counts, curr_study, curr_cl, full_normalization = full_normalization, replicate_counts = replicate_counts, store_loc = store_loc)
 
-            t_0_comb = normalize_counts(t_0_comb, set_normalization = normalization_value)
-            t_end_comb = normalize_counts(t_end_comb, set_normalization = normalization_value)
-
-        else:
-            print('Not full normalization...')
-
-            for subset in set(curr_counts['target_type']):
-                idx = curr_counts.loc[curr_counts['target_type'] == subset,:].index
-
-                # normalize to the median of the all time points
-                normalization_value = np.median(pd.concat([t_0_comb.loc[idx,:], t_end_comb.loc[idx,:]], axis = 1).sum(axis = 0))
-
-                t_0_comb.loc[idx,:] = normalize_counts(t_0_comb.loc[idx,:], set_normalization = normalization_value)
-                t_end_comb.loc[idx,:] = normalize_counts(t_end_comb.loc[idx,:], set_normalization = normalization_value)
+        t_0_comb = preprocessed_counts['T0_normalized']
+        t_end_comb = preprocessed_counts['TEnd_normalized']
+        curr_counts = preprocessed_counts['counts'].loc[t_0_comb.index].copy()
 
         # if mismatch, average
         if t_0_comb.shape[1] != t_end_comb.shape[1]:
             print("Mismatch times, averaging...")
-            t_0_comb = pd.DataFrame(data = t_0_comb.apply(lambda x: np.mean(x), axis = 1).values,
+            t_0_comb = pd.DataFrame(data = t_0_comb.mean(axis = 1).values,
                          index = t_0_comb.index)
-            t_end_comb = pd.DataFrame(data = t_end_comb.apply(lambda x: np.mean(x), axis = 1).values,
+            t_end_comb = pd.DataFrame(data = t_end_comb.mean(axis = 1).values,
                  index = t_end_comb.index)
 
         # set FC
@@ -1302,204 +2352,215 @@ def run_sgrna_scores(curr_counts, curr_study, curr_cl, full_normalization = Fals
     #     curr_counts['sgRNA_pair'] = ['|'.join(sorted([curr_counts['sgRNA_guide_name_g1'].iloc[i], curr_counts['sgRNA_guide_name_g2'].iloc[i]])) for i in range(curr_counts.shape[0])]
     #     curr_counts['gene_pair'] = ['|'.join(sorted([curr_counts['sgRNA_target_name_g1'].iloc[i], curr_counts['sgRNA_target_name_g2'].iloc[i]])) for i in range(curr_counts.shape[0])]
 
-        # add sorted targets
-        sorted_gene_pairs, sorted_gene_guides = sort_pairs_and_guides(curr_counts.copy())
-        curr_counts['sgRNA_pair'] = sorted_gene_guides
-        curr_counts['gene_pair'] = sorted_gene_pairs
-
         # get count annotations
-        count_annotations = curr_counts.loc[:,['sgRNA_guide_name_g1', 'sgRNA_guide_name_g2', 'sgRNA_target_name_g1', 'sgRNA_target_name_g2', 'target_type', 'sgRNA_pair', 'gene_pair']].copy()
+        count_annotations = curr_counts.loc[:, COUNT_ANNOTATIONS].copy()
 
 
         ######### /preprocessing
 
         print('Starting scoring..')
 
-        replicate_results = []
-        for i in range(t_0_comb.shape[1]):
-            print('calculating for replicate ' + str(i))
-
-            replicate_fc = pd.DataFrame(data = np.log2(t_end_comb.iloc[:, i]/t_0_comb.iloc[:, i]).values,
-                                        index = t_end_comb.index,
-                                        columns = ['FC'])
-
-            # merge
-            replicate_fc = replicate_fc.merge(count_annotations, left_index = True, right_index = True)
-
-            # get the three target categories
-            single = replicate_fc.loc[curr_counts['target_type'] == 'Single']
-            dual = replicate_fc.loc[curr_counts['target_type'] == 'Dual']
-            control = replicate_fc.loc[curr_counts['target_type'] == 'Control']
-
-            ## proceed with GI calculation
-            temp_repeat = single.copy()
-            temp_repeat['sgRNA_guide_name_g1'] = single["sgRNA_guide_name_g2"]
-            temp_repeat['sgRNA_target_name_g1'] = single["sgRNA_target_name_g2"]
-            temp_repeat['sgRNA_guide_name_g2'] = single["sgRNA_guide_name_g1"]
-            temp_repeat['sgRNA_target_name_g2'] = single["sgRNA_target_name_g1"]
-
-            single_repeat = pd.concat([single, temp_repeat])
-
-            # get single sgRNA impact
-            EC_single = single_repeat.groupby("sgRNA_guide_name_g1")['FC'].apply(
-                    lambda x: np.median(x))
-            sgRNA_SE = single_repeat.groupby("sgRNA_guide_name_g1")['FC'].apply(
-                lambda x: median_SE_constant * np.sqrt(np.var(x) / np.size(x)))
-
-
-            EC_control = None
-            if control.shape[0] != 0:# and (study != 'parrish_data')
-
-                temp_repeat = control.copy()
-                temp_repeat['sgRNA_guide_name_g1'] = control["sgRNA_guide_name_g2"]
-                temp_repeat['sgRNA_guide_name_g2'] = control["sgRNA_guide_name_g1"]
-
-                EC_control = np.median(pd.concat([control, temp_repeat])['FC'])
-
-            ## get all pairs
-            all_pairs = set(dual['sgRNA_guide_name_g1']).union(set(dual['sgRNA_guide_name_g2']))
-
-            missing_pairs = np.array(list(all_pairs.difference(set(EC_single.index))))
-
-            print(' '.join(["Filtered single sgRNA count:", str(len(set(missing_pairs)))]))
-
-            # add them as 0s
-
-            EC_single = pd.concat([EC_single, pd.Series(index = missing_pairs, data = np.zeros(len(missing_pairs)))])
-            sgRNA_SE = pd.concat([sgRNA_SE, pd.Series(index = missing_pairs, data = np.zeros(len(missing_pairs)))])
-
-            sgRNA_level_scores = dual.groupby(['gene_pair', 'sgRNA_pair'], as_index = False)['FC'].apply(lambda x: np.mean(x))
-            sgRNA_level_SE = dual.groupby(['gene_pair', 'sgRNA_pair'], as_index = False)['FC'].apply(lambda x: np.sqrt(np.var(x) / np.size(x)))
-
-            guide_1 = np.array([i.split('|')[0] for i in sgRNA_level_scores['sgRNA_pair']])
-            guide_2 = np.array([i.split('|')[1] for i in sgRNA_level_scores['sgRNA_pair']])
-            EC_1 = EC_single[guide_1]
-            EC_2 = EC_single[guide_2]
+        # fold changes of all replicates at once, constructs x replicates
+        n_replicates = t_0_comb.shape[1]
+        replicate_fc = pd.DataFrame(data = np.log2(t_end_comb.values/t_0_comb.values),
+                                    index = t_end_comb.index,
+                                    columns = ['NB_' + str(i) for i in range(n_replicates)])
 
-            SE_1 = sgRNA_SE[guide_1]
-            SE_2 = sgRNA_SE[guide_2]
+        target_type = count_annotations['target_type'].values
+        variants = ['NB']
 
-            sgRNA_level_scores['SL'] = sgRNA_level_scores['FC'].values - EC_1.values - EC_2.values
-            sgRNA_level_scores['SE'] = np.sqrt(np.square(sgRNA_level_SE['FC'].values) + np.square(SE_1.values) + np.square(SE_2.values))
-            sgRNA_level_scores['SE'].loc[sgRNA_level_scores['SE'].isna()] = 1
-            sgRNA_level_scores['SE'].loc[sgRNA_level_scores['SE'] == 0] = 1
-            sgRNA_level_scores['Z-Score'] = sgRNA_level_scores['SL'].values/sgRNA_level_scores['SE'].values
+        # background correct each replicate with its median control effect, scored alongside the NB replicates
+        control = replicate_fc.loc[target_type == 'Control']
+        if control.shape[0] != 0:# and (study != 'parrish_data')
+            EC_control = np.median(control.values, axis = 0)
 
-            gene_SL_scores_nobackground = sgRNA_level_scores.groupby('gene_pair')['Z-Score'].apply(lambda x: np.median(x))
-            gene_SL_scores_SE = sgRNA_level_scores.groupby('gene_pair')['Z-Score'].apply(lambda x:  median_SE_constant * np.sqrt(np.var(x) / np.size(x)))
-            gene_SL_scores_SE.loc[gene_SL_scores_SE.isna()] = 1
-            gene_SL_scores_SE.loc[gene_SL_scores_SE == 0] = 1
-            gene_SL_scores_nobackground_Z = gene_SL_scores_nobackground/gene_SL_scores_SE
+            background_fc = replicate_fc - EC_control
+            background_fc.columns = ['B_' + str(i) for i in range(n_replicates)]
+            replicate_fc = pd.concat([replicate_fc, background_fc], axis = 1)
+            variants.append('B')
 
-            results_nb = pd.concat([gene_SL_scores_nobackground, gene_SL_scores_SE, gene_SL_scores_nobackground_Z], axis = 1)
-            results_nb.columns = ['sgRNA-Score-NB_' + str(i), 'sgRNA-Score-NB SE_' + str(i), 'sgRNA-Score-NB SL_' + str(i)]
-
-            replicate_results.append(results_nb)
-
-            if EC_control is not None:
-
-                single['FC'] = single['FC'] - EC_control
-                dual['FC'] = dual['FC'] - EC_control
-
-                ## proceed with GI calculation
-                temp_repeat = single.copy()
-                temp_repeat['sgRNA_guide_name_g1'] = single["sgRNA_guide_name_g2"]
-                temp_repeat['sgRNA_target_name_g1'] = single["sgRNA_target_name_g2"]
-                temp_repeat['sgRNA_guide_name_g2'] = single["sgRNA_guide_name_g1"]
-                temp_repeat['sgRNA_target_name_g2'] = single["sgRNA_target_name_g1"]
+        # get the three target categories
+        single = replicate_fc.loc[target_type == 'Single']
+        dual = replicate_fc.loc[target_type == 'Dual']
+        single_annotations = count_annotations.loc[target_type == 'Single']
+        dual_annotations = count_annotations.loc[target_type == 'Dual']
 
-                single_repeat = pd.concat([single, temp_repeat])
+        ## proceed with GI calculation
+        single_repeat = pd.concat([single, single])
+        single_repeat_guides = pd.Series(np.concatenate([single_annotations['sgRNA_guide_name_g1'].values, single_annotations['sgRNA_guide_name_g2'].values]), name = 'sgRNA_guide_name_g1')
 
-                # get single sgRNA impact
-                EC_single = single_repeat.groupby("sgRNA_guide_name_g1")['FC'].apply(
-                        lambda x: np.median(x))
-                sgRNA_SE = single_repeat.groupby("sgRNA_guide_name_g1")['FC'].apply(
-                    lambda x: median_SE_constant * np.sqrt(np.var(x) / np.size(x)))
+        # get single sgRNA impact
+        sgRNA_stats = group_statistics(single_repeat, single_repeat_guides, ['median', 'var', 'size'])
+        EC_single = sgRNA_stats['median']
+        sgRNA_SE = median_SE_constant * np.sqrt(sgRNA_stats['var'] / sgRNA_stats['size'])
 
+        ## get all pairs
+        all_pairs = set(dual_annotations['sgRNA_guide_name_g1']).union(set(dual_annotations['sgRNA_guide_name_g2']))
 
-                EC_control = None
-                if control.shape[0] != 0:# and (study != 'parrish_data')
+        missing_pairs = np.array(list(all_pairs.difference(set(EC_single.index))))
 
-                    temp_repeat = control.copy()
-                    temp_repeat['sgRNA_guide_name_g1'] = control["sgRNA_guide_name_g2"]
-                    temp_repeat['sgRNA_guide_name_g2'] = control["sgRNA_guide_name_g1"]
+        print(' '.join(["Filtered single sgRNA count:", str(len(set(missing_pairs)))]))
 
-                    EC_control = np.median(pd.concat([control, temp_repeat])['FC'])
+        # add them as 0s
+        EC_single = pd.concat([EC_single, pd.DataFrame(index = missing_pairs, columns = EC_single.columns, data = np.zeros((len(missing_pairs), EC_single.shape[1])))])
+        sgRNA_SE = pd.concat([sgRNA_SE, pd.DataFrame(index = missing_pairs, columns = sgRNA_SE.columns, data = np.zeros((len(missing_pairs), sgRNA_SE.shape[1])))])
+
+        sgRNA_level_stats = group_statistics(dual, [dual_annotations['gene_pair'], dual_annotations['sgRNA_pair']], ['mean', 'var', 'size'])
+        sgRNA_level_SE = np.sqrt(sgRNA_level_stats['var'] / sgRNA_level_stats['size'])
+
+        guide_1, guide_2 = split_pair_labels(sgRNA_level_stats.index.get_level_values('sgRNA_pair'))
+        EC_1 = EC_single.loc[guide_1]
+        EC_2 = EC_single.loc[guide_2]
+
+        SE_1 = sgRNA_SE.loc[guide_1]
+        SE_2 = sgRNA_SE.loc[guide_2]
+
+        sgRNA_level_SL = sgRNA_level_stats['mean'].values - EC_1.values - EC_2.values
+        sgRNA_level_SL_SE = np.sqrt(np.square(sgRNA_level_SE.values) + np.square(SE_1.values) + np.square(SE_2.values))
+        sgRNA_level_SL_SE[np.isnan(sgRNA_level_SL_SE)] = 1
+        sgRNA_level_SL_SE[sgRNA_level_SL_SE == 0] = 1
+        sgRNA_level_Z = pd.DataFrame(data = sgRNA_level_SL/sgRNA_level_SL_SE, columns = replicate_fc.columns)
+
+        gene_SL_scores_stats = group_statistics(sgRNA_level_Z, pd.Series(sgRNA_level_stats.index.get_level_values('gene_pair'), name = 'gene_pair'), ['median', 'var', 'size'])
+        gene_SL_scores = gene_SL_scores_stats['median']
+        gene_SL_scores_SE = median_SE_constant * np.sqrt(gene_SL_scores_stats['var'] / gene_SL_scores_stats['size'])
+        gene_SL_scores_SE[gene_SL_scores_SE.isna()] = 1
+        gene_SL_scores_SE[gene_SL_scores_SE == 0] = 1
+        gene_SL_scores_Z = gene_SL_scores/gene_SL_scores_SE
+
+        replicate_results = {}
+        for i in range(n_replicates):
+            for variant in variants:
+                curr_col = variant + '_' + str(i)
+                replicate_results['sgRNA-Score-' + variant + '_' + str(i)] = gene_SL_scores[curr_col]
+                replicate_results['sgRNA-Score-' + variant + ' SE_' + str(i)] = gene_SL_scores_SE[curr_col]
+                replicate_results['sgRNA-Score-' + variant + ' SL_' + str(i)] = gene_SL_scores_Z[curr_col]
 
-                ## get all pairs
-                all_pairs = set(dual['sgRNA_guide_name_g1']).union(set(dual['sgRNA_guide_name_g2']))
+        # save results
+        results = {}
+        results['SGRNA_DERIVED_NB_SCORE'] = None
+        results['SGRNA_DERIVED_B_SCORE'] = None
 
-                missing_pairs = np.array(list(all_pairs.difference(set(EC_single.index))))
+        merged = pd.DataFrame(replicate_results)
 
-                print(' '.join(["Filtered single sgRNA count:", str(len(set(missing_pairs)))]))
+        # sort the names
+        merged.index = sort_pair_keys(*split_pair_labels(merged.index))[0]
 
-                # add them as 0s
+        merged['sgRNA-Score_Average_NB'] = merged.loc[:,['sgRNA-Score-NB SL_' + str(i) for i in range(t_end_comb.shape[1])]].mean(axis = 1)
+        results['SGRNA_DERIVED_NB_SCORE'] = pd.DataFrame(merged['sgRNA-Score_Average_NB'])
+        results['SGRNA_DERIVED_NB_SCORE'].columns = ['SL_score']
+        genes_1, genes_2 = split_pair_labels(results['SGRNA_DERIVED_NB_SCORE'].index)
+        results['SGRNA_DERIVED_NB_SCORE']['Gene 1'] = genes_1
+        results['SGRNA_DERIVED_NB_SCORE']['Gene 2'] = genes_2
 
-                EC_single = pd.concat([EC_single, pd.Series(index = missing_pairs, data = np.zeros(len(missing_pairs)))])
-                sgRNA_SE = pd.concat([sgRNA_SE, pd.Series(index = missing_pairs, data = np.zeros(len(missing_pairs)))])
+        if 'sgRNA-Score-B_0' in merged.columns:
+            merged['sgRNA-Score_Average_B'] = merged.loc[:,['sgRNA-Score-B SL_' + str(i) for i in range(t_end_comb.shape[1])]].mean(axis = 1)
+            results['SGRNA_DERIVED_B_SCORE'] = pd.DataFrame(merged['sgRNA-Score_Average_B'])
+            results['SGRNA_DERIVED_B_SCORE'].columns = ['SL_score']
+            genes_1, genes_2 = split_pair_labels(results['SGRNA_DERIVED_B_SCORE'].index)
+            results['SGRNA_DERIVED_B_SCORE']['Gene 1'] = genes_1
+            results['SGRNA_DERIVED_B_SCORE']['Gene 2'] = genes_2
+            
+        # save for easy loading
+        save_to_cache(cache_loc, results, os.path.join(store_loc, save_dir))
 
-                sgRNA_level_scores = dual.groupby(['gene_pair', 'sgRNA_pair'], as_index = False)['FC'].apply(lambda x: np.mean(x))
-                sgRNA_level_SE = dual.groupby(['gene_pair', 'sgRNA_pair'], as_index = False)['FC'].apply(lambda x: np.sqrt(np.var(x) / np.size(x)))
+    return(results)
 
-                guide_1 = np.array([i.split('|')[0] for i in sgRNA_level_scores['sgRNA_pair']])
-                guide_2 = np.array([i.split('|')[1] for i in sgRNA_level_scores['sgRNA_pair']])
-                EC_1 = EC_single[guide_1]
-                EC_2 = EC_single[guide_2]
 
-                SE_1 = sgRNA_SE[guide_1]
-                SE_2 = sgRNA_SE[guide_2]
 
-                sgRNA_level_scores['SL'] = sgRNA_level_scores['FC'].values - EC_1.values - EC_2.values
-                sgRNA_level_scores['SE'] = np.sqrt(np.square(sgRNA_level_SE['FC'].values) + np.square(SE_1.values) + np.square(SE_2.values))
-                sgRNA_level_scores['SE'].loc[sgRNA_level_scores['SE'].isna()] = 1
-                sgRNA_level_scores['SE'].loc[sgRNA_level_scores['SE'] == 0] = 1
-                sgRNA_level_scores['Z-Score'] = sgRNA_level_scores['SL'].values/sgRNA_level_scores['SE'].values
 
-                gene_SL_scores_w_background = sgRNA_level_scores.groupby('gene_pair')['Z-Score'].apply(lambda x: np.median(x))
-                gene_SL_scores_SE = sgRNA_level_scores.groupby('gene_pair')['Z-Score'].apply(lambda x:  median_SE_constant * np.sqrt(np.var(x) / np.size(x)))
-                gene_SL_scores_SE.loc[gene_SL_scores_SE.isna()] = 1
-                gene_SL_scores_SE.loc[gene_SL_scores_SE == 0] = 1
-                gene_SL_scores_w_background_Z = gene_SL_scores_w_background/gene_SL_scores_SE
+def calculate_mageck_lfc(T0_counts, TEnd_counts, control_idx = None, paired = False):
+    '''
+    Helper function, calculates the sgRNA fold changes of mageck test. The counts of all samples are median ratio normalized against the geometric mean counts (plus one) of the control sgRNAs, or of all sgRNAs without controls, leaving out sgRNAs without counts. As mageck, all samples are total count normalized instead once a sample has a median ratio of zero, or more than 45% zero counts (a sample without any counts keeps a size factor of 1, where mageck fails). Fold changes are the log2 ratios of the mean normalized TEnd and T0 counts, with a pseudo count of 1, where T0 means of zero are raised to the smallest T0 mean. Paired, mageck compares each T0 replicate with its TEnd replicate, so there is a fold change for each replicate pair, ordered by sgRNA and then by replicate.
+    '''
+    counts = np.hstack([T0_counts, TEnd_counts]).astype(np.float64)
+    n_T0 = np.shape(T0_counts)[1]
+
+    reference = counts if control_idx is None else counts[control_idx]
+    expressed = reference[reference.sum(axis = 1) > 0]
+
+    # upper median of the ratios to the geometric means, as mageck
+    size_factors = np.ones(counts.shape[1])
+    if expressed.shape[0] > 0:
+        ratios = np.sort(expressed / np.exp(np.log(expressed + 1).mean(axis = 1, keepdims = True)), axis = 0)
+        medians = ratios[expressed.shape[0] // 2]
+
+        # median normalization is unstable with too many zero counts, mageck then switches to the total counts
+        if (medians == 0).any() or ((reference == 0).mean(axis = 0) > 0.45).any():
+            totals = reference.sum(axis = 0)
+            size_factors = np.divide(totals.mean(), totals, out = size_factors, where = totals > 0)
+        else:
+            size_factors = 1 / medians
 
+    normalized = counts * size_factors
 
-                results_b = pd.concat([gene_SL_scores_w_background, gene_SL_scores_SE, gene_SL_scores_w_background_Z], axis = 1)
-                results_b.columns = ['sgRNA-Score-B_' + str(i), 'sgRNA-Score-B SE_' + str(i), 'sgRNA-Score-B SL_' + str(i)]
+    if paired:
+        T0_means, TEnd_means = normalized[:, :n_T0].ravel(), normalized[:, n_T0:].ravel()
+    else:
+        T0_means, TEnd_means = normalized[:, :n_T0].mean(axis = 1), normalized[:, n_T0:].mean(axis = 1)
 
-                replicate_results.append(results_b)
+    # mageck raises T0 means of zero to the smallest T0 mean
+    if (T0_means > 0).any():
+        T0_means = np.where(T0_means > 0, T0_means, T0_means[T0_means > 0].min())
 
-        # save results
-        results = {}
-        results['SGRNA_DERIVED_NB_SCORE'] = None
-        results['SGRNA_DERIVED_B_SCORE'] = None
+    return(np.log2((TEnd_means + 1) / (T0_means + 1)))
 
-        merged = pd.concat(replicate_results, axis = 1)
+def load_mageck_summary(file_loc):
+    '''
+    Helper function, loads the gene pairs and fold changes of a MAGeCK sgRNA summary, reading only the needed columns.
+    '''
+    return(pd.read_csv(file_loc, sep = "\t", usecols = ['Gene', 'LFC'], dtype = {'Gene': str, 'LFC': np.float64}))
 
-        # sort the names
-        merged.index = ['|'.join(sorted(i.split('|'))) for i in merged .index]
+def calculate_mageck_scores(res):
+    '''
+    Helper function, calculates the gene pair SL scores from the sgRNA pair fold changes of MAGeCK (Gene and LFC columns). The median fold change of each dual target gene pair is compared against the median fold changes of its genes when targeted alone (paired with controls or themselves), with standard errors combined from the fold change variances.
+    '''
+    # labels are only handled for the unique gene pairs, sgRNA pairs carry their codes
+    pair_codes, gene_pairs = pd.factorize(res['Gene'].values)
+    gene_1, gene_2 = split_pair_labels(gene_pairs)
+    gene_1, gene_2, _ = sort_pair_labels(gene_1.astype(str), gene_2.astype(str))
+    fold_changes = res['LFC'].values
+
+    # dual controls are removed, single targets are paired with controls or themselves
+    dual_controls_idx = (gene_1 == 'CONTROL') & (gene_2 == 'CONTROL')
+    singles_idx = ~dual_controls_idx & ((gene_1 == 'CONTROL') | (gene_2 == 'CONTROL') | (gene_1 == gene_2))
+    duals_idx = ~dual_controls_idx & ~singles_idx
+
+    # sorted codes, so the groups are ordered as their labels
+    key_codes, gene_pair_keys = pd.factorize(join_pair_labels(gene_1, gene_2), sort = True)
+    gene_codes, genes = pd.factorize(np.concatenate([gene_1, gene_2]), sort = True)
+    gene_1_codes, gene_2_codes = gene_codes[:len(gene_1)], gene_codes[len(gene_1):]
 
-        merged['sgRNA-Score_Average_NB'] = merged.loc[:,['sgRNA-Score-NB SL_' + str(i) for i in range(t_end_comb.shape[1])]].mean(axis = 1)
-        results['SGRNA_DERIVED_NB_SCORE'] = pd.DataFrame(merged['sgRNA-Score_Average_NB'])
-        results['SGRNA_DERIVED_NB_SCORE'].columns = ['SL_score']
-        results['SGRNA_DERIVED_NB_SCORE']['Gene 1'] = [i.split('|')[0] for i in results['SGRNA_DERIVED_NB_SCORE'].index]
-        results['SGRNA_DERIVED_NB_SCORE']['Gene 2'] = [i.split('|')[1] for i in results['SGRNA_DERIVED_NB_SCORE'].index]
+    ## calculate SL scores
+    duals_idx, singles_idx = duals_idx[pair_codes], singles_idx[pair_codes]
+    gene_pair_stats = group_statistics(fold_changes[duals_idx], key_codes[pair_codes[duals_idx]], ['median', 'var', 'size'])
+    gene_pair_stats.index = np.asarray(gene_pair_keys, dtype = object)[gene_pair_stats.index.values]
+    gene_pair_SL = gene_pair_stats['median']
+    gene_pair_SE = gene_pair_stats['var'] / gene_pair_stats['size']
 
-        if 'sgRNA-Score-B_0' in merged.columns:
-            merged['sgRNA-Score_Average_B'] = merged.loc[:,['sgRNA-Score-B SL_' + str(i) for i in range(t_end_comb.shape[1])]].mean(axis = 1)
-            results['SGRNA_DERIVED_B_SCORE'] = pd.DataFrame(merged['sgRNA-Score_Average_B'])
-            results['SGRNA_DERIVED_B_SCORE'].columns = ['SL_score']
-            results['SGRNA_DERIVED_B_SCORE']['Gene 1'] = [i.split('|')[0] for i in results['SGRNA_DERIVED_B_SCORE'].index]
-            results['SGRNA_DERIVED_B_SCORE']['Gene 2'] = [i.split('|')[1] for i in results['SGRNA_DERIVED_B_SCORE'].index]
-            
-        # save for easy loading
-        with open(os.path.join(save_loc, "sgRNA_results.p"), 'wb') as handle:
-            pickle.dump(results, handle, protocol=pickle.HIGHEST_PROTOCOL)
+    # single targets count for both of their genes
+    gene_stats = group_statistics(np.concatenate([fold_changes[singles_idx], fold_changes[singles_idx]]), np.concatenate([gene_1_codes[pair_codes[singles_idx]], gene_2_codes[pair_codes[singles_idx]]]), ['median', 'var', 'size'])
+    gene_stats.index = np.asarray(genes, dtype = object)[gene_stats.index.values]
+    gene_SL = gene_stats['median']
+    gene_SE = gene_stats['var'] / gene_stats['size']
 
-    return(results)
+    genes_1, genes_2 = split_pair_labels(gene_pair_SL.index)
 
+    missing_genes = pd.Index(np.concatenate([genes_1, genes_2])).unique().difference(gene_SL.index)
+    print(' '.join(["Filtered gene count:", str(len(missing_genes))]))
 
+    # add them as 0s
+    mageck_SL = gene_pair_SL.values - gene_SL.reindex(genes_1, fill_value = 0).values - gene_SL.reindex(genes_2, fill_value = 0).values
+    mageck_SE = np.sqrt(gene_pair_SE.values + gene_SE.reindex(genes_1, fill_value = 0).values + gene_SE.reindex(genes_2, fill_value = 0).values) * math.sqrt(2)
+    mageck_Z = mageck_SL/mageck_SE
 
+    return(pd.DataFrame(data = {'SL_score' : mageck_SL,
+                                'standard_error' : mageck_SE,
+                                'Z_SL_score' : mageck_Z,
+                                'Gene 1' : genes_1,
+                                'Gene 2' : genes_2}, index = sort_pair_keys(genes_1, genes_2)[0]))
 
-def run_mageck_score(curr_counts, curr_study, curr_cl, store_loc = os.getcwd(), save_dir = 'MAGECK_Files', command_line_params = [], re_run = False):
+def run_mageck_score(curr_counts, curr_study, curr_cl, store_loc = os.getcwd(), save_dir = 'MAGECK_Files', command_line_params = [], re_run = False, replicate_counts = None, timeout = None, engine = 'mageck'):
     '''
 
     Calculates MAGeCK Score. Score files will created at the designated store location and save directory. 
@@ -1511,25 +2572,31 @@ def run_mageck_score(curr_counts, curr_study, curr_cl, store_loc = os.getcwd(),
     * store_loc: String: Directory to store the MAGeCK files to. (Default: current working directory)
     * save_dir: String: Folder name to store the MAGeCK files to. (Default: 'MAGECK_Files')
     * command_line_params: Optional list to load programming environment(s) to be able to run mageck tool (i.e. loading path, activating python environment). 
-    * re_run: Boolean. Recreate and rerun the results instead of loading for subsequent analyses (Default: False)
+    * re_run: Boolean. Recompute the results even if a cached result matches the counts and parameters (Default: False)
+    * replicate_counts: Optional tuple of T0 and TEnd counts, obtained via ```get_replicate_counts```. Counts are parsed from curr_counts if not supplied. (Default: None)
+    * timeout: Optional time limit of mageck, in seconds. The output of mageck is logged to MAGECK.log, and the job is recorded in the jobs_manifest.jsonl of the save directory. (Default: None, no limit)
+    * engine: String, 'mageck' to run the mageck tool, or 'native' to calculate the sgRNA fold changes of mageck test in process, without writing the MAGeCK files or running mageck. (Default: 'mageck')
 
 
     **Returns**:
 
-    * mageck_res: A dict that contains a pandas dataframe for MAGeck Score.
+    * mageck_res: A dict that contains a pandas dataframe for MAGeck Score. If mageck fails, the lines of its log instead.
     '''
+    if engine not in ['mageck', 'native']:
+        raise ValueError('Unknown mageck engine: ' + str(engine) + ', must be mageck or native.')
+
     print('Running mageck score...')
 
     # !no preprocessing!
-    T0_counts, TEnd_counts = get_raw_counts(curr_counts)
+    T0_counts, TEnd_counts = get_raw_counts(curr_counts, replicate_counts = replicate_counts)
 
     # due to mageck, don't have any comma on columns
     T0_counts.columns = ['T0_' + str(i) for i in range(T0_counts.shape[1])]
     TEnd_counts.columns = ['TEnd_' + str(i) for i in range(TEnd_counts.shape[1])]
 
     # get the annotations
-    curr_counts['sgRNA_pair'] = ['|'.join([curr_counts['sgRNA_guide_name_g1'].iloc[i], curr_counts['sgRNA_guide_name_g2'].iloc[i]]) for i in range(curr_counts.shape[0])]
-    curr_counts['gene_pair'] = ['|'.join([curr_counts['sgRNA_target_name_g1'].iloc[i], curr_counts['sgRNA_target_name_g2'].iloc[i]]) for i in range(curr_counts.shape[0])]
+    curr_counts['sgRNA_pair'] = join_pair_labels(curr_counts['sgRNA_guide_name_g1'].values, curr_counts['sgRNA_guide_name_g2'].values)
+    curr_counts['gene_pair'] = join_pair_labels(curr_counts['sgRNA_target_name_g1'].values, curr_counts['sgRNA_target_name_g2'].values)
 
     curr_counts['sgRNA_pair_mageck_id'] = curr_counts['sgRNA_pair'].values + "|" + np.array(range(curr_counts.shape[0]), dtype = str)
 
@@ -1541,151 +2608,91 @@ def run_mageck_score(curr_counts, curr_study, curr_cl, store_loc = os.getcwd(),
     paired = True if len(T0_counts.columns) == len(TEnd_counts.columns) else False
     print('Paired Status = ' + str(paired))
 
-    ######### save
-
-    # get save location 
-    save_loc = os.path.join(store_loc, save_dir, curr_study, curr_cl)
-    os.makedirs(save_loc, exist_ok = True)
-
-    # save the counts
-    comb.to_csv(os.path.join(save_loc, "counts.csv"), sep = ',', index = False)
-
-    ######### /save
-
-    ######### create script and run
-
-    file_loc = os.path.join(save_loc, 'MAGECK_commands.sh')
-
-    fp = open(file_loc, '+w')
-    fp.write("#!/bin/sh\n")
-
-    for line in command_line_params:
-        fp.write(line + '\n')
-    # get index of last time point columns
-
-    t_end_col_locs = []
-    for i in range(comb.shape[1]):
-        if comb.columns[i] in TEnd_counts.columns:
-            t_end_col_locs.append(str(i-2))
-
-    fp.write("cd \"" + os.path.join(os.getcwd(), save_loc) + "\"\n")
-
     mageck_control_loc = os.path.join(PACKAGE_PATH, 'files', 'mageck_control.txt')
-    if 'Control' in set(curr_counts['target_type']):
-        if paired:
-            command = "mageck test -k counts.csv -t \"" + ','.join(t_end_col_locs) + "\" --paired --norm-method control --control-gene " + mageck_control_loc + " --normcounts-to-file -n out --pdf-report"
-        else:
-            command = "mageck test -k counts.csv -t \"" + ','.join(t_end_col_locs) + "\" --norm-method control --control-gene " + mageck_control_loc + " --normcounts-to-file -n out --pdf-report"
 
-    fp.write(command)
-    fp.close()
+    if engine == 'native':
+        # sgRNA fold changes of mageck test in process, fast enough to not be cached
+        print('Calculating mageck fold changes...')
+        control_idx = None
+        if 'Control' in set(curr_counts['target_type']):
+            with open(mageck_control_loc) as handle:
+                control_idx = curr_counts['gene_pair'].isin(handle.read().split()).values
 
-    # set chmod
-    os.chmod(file_loc, 0o0777)
-    
-    # scores have already been computed
-    if os.path.exists(os.path.join(save_loc, "out.sgrna_summary.txt")) and (not re_run):
-        print('Scores exist!')
+        # paired, there is a fold change for each replicate pair
+        res = pd.DataFrame({'Gene': np.repeat(curr_counts['gene_pair'].values, len(T0_counts.columns) if paired else 1),
+                            'LFC': calculate_mageck_lfc(comb[T0_counts.columns].values, comb[TEnd_counts.columns].values, control_idx = control_idx, paired = paired)})
     else:
-        print("Running mageck...")
-        process = subprocess.run([file_loc], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        if process.returncode == 1:
-            print("Error in mageck!!!")
-            return(process.stdout.splitlines())
-        else:
-            print("Finished running mageck!")
+        ######### save
 
+        # get save location 
+        save_loc = os.path.join(store_loc, save_dir, curr_study, curr_cl)
+        os.makedirs(save_loc, exist_ok = True)
 
-    ######### load results
+        # save the counts
+        comb.to_csv(os.path.join(save_loc, "counts.csv"), sep = ',', index = False)
 
-    print('Loading computed results...')
+        ######### /save
 
-    res = pd.read_csv(os.path.join(save_loc, "out.sgrna_summary.txt"), index_col = 0, sep = "\t")
-    res.index = ['|'.join(i.split('|')[:len(i.split('|'))-1]) for i in res.index]
+        ######### create script and run
 
-    gene1 = np.array([genes.split('|')[0] for genes in res['Gene']])
-    gene2 = np.array([genes.split('|')[1] for genes in res['Gene']])
+        file_loc = os.path.join(save_loc, 'MAGECK_commands.sh')
 
-    res_df = pd.DataFrame(data = {'Gene Pair': res['Gene'],
-                                  'Gene 1' : gene1,
-                                  'Gene 2' : gene2,
-                                  'MAGECK-FC': res['LFC']})
+        fp = open(file_loc, '+w')
+        fp.write("#!/bin/sh\n")
 
-    # add a column for gene pairs, but sorted
-    sorted_pairs = []
-    sorted_gene_1 = []
-    sorted_gene_2 = []
-    for i in range(res_df.shape[0]):
+        for line in command_line_params:
+            fp.write(line + '\n')
+        # get index of last time point columns
 
-        gene_1 = str(res_df["Gene 1"].iloc[i])
-        gene_2 = str(res_df["Gene 2"].iloc[i])
+        t_end_col_locs = []
+        for i in range(comb.shape[1]):
+            if comb.columns[i] in TEnd_counts.columns:
+                t_end_col_locs.append(str(i-2))
 
-        t_gene_1, t_gene_2 = sorted([gene_1, gene_2])
+        fp.write("cd \"" + os.path.join(os.getcwd(), save_loc) + "\"\n")
 
+        command = MAGECK_EXECUTABLE + " test -k counts.csv -t \"" + ','.join(t_end_col_locs) + "\""
+        if paired:
+            command += " --paired"
 
-        if (t_gene_1 == gene_1) and (t_gene_2 == gene_2):
-            gene_1 = t_gene_1
-            gene_2 = t_gene_2
+        # normalize by the control sgRNAs, or by the median if the study has none
+        if 'Control' in set(curr_counts['target_type']):
+            command += " --norm-method control --control-gene \"" + mageck_control_loc + "\""
         else:
-            gene_1 = t_gene_1
-            gene_2 = t_gene_2
-
-        pair = '|'.join([gene_1, gene_2])
-
-        sorted_gene_1.append(gene_1)
-        sorted_gene_2.append(gene_2)
-
-        sorted_pairs.append(pair)
-    res_df['Gene Pair'] = sorted_pairs
-    res_df['Gene 1'] = sorted_gene_1
-    res_df['Gene 2'] = sorted_gene_2
-
-    # get dual controls and remove them
-    dual_controls_idx = np.array([True if i == 'CONTROL|CONTROL' else False for i in res_df['Gene Pair']])
-    dual_controls = res_df.loc[dual_controls_idx]
-    res_df = res_df.loc[~dual_controls_idx]
+            command += " --norm-method median"
+        command += " --normcounts-to-file -n out --pdf-report"
 
-    # get single targets and remove them
-    singles_idx = np.array([True if i == 'CONTROL' else False for i in res_df['Gene 1']]) | np.array([True if i == 'CONTROL' else False for i in res_df['Gene 2']]) | (res_df['Gene 1'] == res_df['Gene 2'])
-    singles = res_df.loc[singles_idx]
-    res_df = res_df.loc[~singles_idx]
+        fp.write(command)
+        fp.close()
 
-    temp_repeat = singles.copy()
-    temp_repeat['Gene 1'] = singles["Gene 2"]
-    temp_repeat['Gene 2'] = singles["Gene 1"]
+        # set chmod
+        os.chmod(file_loc, 0o0777)
 
-    single_repeat = pd.concat([singles, temp_repeat])
+        # scores are cached by the hash of the mageck inputs
+        summary_key = get_cache_key('mageck', hash_files([os.path.join(save_loc, "counts.csv"), mageck_control_loc]), {'paired': paired, 'treatment': ','.join(t_end_col_locs)})
+        summary_loc = get_cache_file(save_loc, 'sgrna_summary', summary_key)
 
-    # now res_df contains strictly dual targets
-    ## calculate SL scores
-    gene_pair_SL = res_df.groupby('Gene Pair')['MAGECK-FC'].apply(lambda x: np.median(x))
-    gene_pair_SE = res_df.groupby('Gene Pair')['MAGECK-FC'].apply(lambda x: np.var(x) / np.size(x))
+        res = load_from_cache(summary_loc, lambda file_loc: load_result(file_loc, columns = ['Gene', 'LFC'])['sgrna_summary']) if not re_run else None
 
-    gene_SL = single_repeat.groupby("Gene 1")['MAGECK-FC'].apply(
-        lambda x: np.median(x))
-    gene_SE = single_repeat.groupby("Gene 1")['MAGECK-FC'].apply(
-        lambda x: np.var(x) / np.size(x))
+        # scores have already been computed
+        if res is not None:
+            print('Scores exist!')
+        else:
+            print("Running mageck...")
+            job = run_external_job(file_loc, os.path.join(save_loc, 'MAGECK.log'), name = 'mageck ' + curr_study + ', ' + curr_cl, timeout = timeout, manifest_loc = os.path.join(store_loc, save_dir, 'jobs_manifest.jsonl'))
+            if job['status'] != 'finished':
+                return(report_failed_job(job, 'mageck'))
+            print("Finished running mageck!")
 
-    genes_1 = np.array([i.split('|')[0] for i in gene_pair_SL.index])
-    genes_2 = np.array([i.split('|')[1] for i in gene_pair_SL.index])
+            res = load_mageck_summary(os.path.join(save_loc, "out.sgrna_summary.txt"))
+            save_to_cache(summary_loc, {'sgrna_summary': res}, os.path.join(store_loc, save_dir))
 
-    all_genes = set(genes_1).union(set(genes_2))
-    missing_genes = all_genes.difference(set(gene_SL.index))
-    print(' '.join(["Filtered gene count:", str(len(set(missing_genes)))]))
 
-    # add them as 0s
-    gene_SL = pd.concat([gene_SL, pd.Series(index = missing_genes, data = np.zeros(len(missing_genes)))])
-    gene_SE = pd.concat([gene_SE, pd.Series(index = missing_genes, data = np.zeros(len(missing_genes)))])
+    ######### load results
 
-    mageck_SL = gene_pair_SL.values - gene_SL[genes_1].values - gene_SL[genes_2].values
-    mageck_SE = np.sqrt(gene_pair_SE.values + gene_SE[genes_1].values + gene_SE[genes_2].values) * math.sqrt(2)
-    mageck_Z = mageck_SL/mageck_SE
+    print('Loading computed results...')
 
-    mageck_results = pd.DataFrame(data = {'SL_score' : mageck_SL,
-                                             'standard_error' : mageck_SE,
-                                             'Z_SL_score' : mageck_Z,
-                                             'Gene 1' : genes_1,
-                                             'Gene 2' : genes_2}, index = ['|'.join(sorted(i.split('|'))) for i in gene_pair_SL.index])
+    mageck_results = calculate_mageck_scores(res)
 
     ######### /load results
 
@@ -1694,35 +2701,16 @@ def run_mageck_score(curr_counts, curr_study, curr_cl, store_loc = os.getcwd(),
 
     return(results)
 
-def run_gemini_score(curr_counts, curr_study, curr_cl, store_loc = os.getcwd(), save_dir = 'GEMINI_Files', command_line_params = [], re_run = False):
+def write_gemini_inputs(curr_counts, save_loc, replicate_counts = None):
     '''
-    Calculates GEMINI Score. Score files will created at the designated store location and save directory. 
-
-    **Params**:
-    * curr_counts: Counts to calculate scores to.)
-    * curr_study: String, name of study to analyze data for.
-    * curr_cl: String, name of cell line to analyze data for.
-    * store_loc: String: Directory to store the GEMINI files to. (Default: current working directory)
-    * save_dir: String: Folder name to store the GEMINI files to. (Default: 'GEMINI_Files')
-    * command_line_params: Optional list to load programming environment(s) to be able to run GEMINI through R (i.e. loading path, activating R environment). 
-    * re_run: Boolean. Recreate and rerun the results instead of loading for subsequent analyses (Default: False)
-
-    **Returns**:
-
-    * gemini_res: A dict that contains a pandas dataframe for GEMINI Score.
+    Helper function, writes the sequences, guide annotations and counts of a study and cell line for GEMINI, and returns the cache key of their scores.
     '''
-    print('Running gemini score...')
-    
     # !no preprocessing!
-    T0_counts, TEnd_counts = get_raw_counts(curr_counts)
+    T0_counts, TEnd_counts = get_raw_counts(curr_counts, replicate_counts = replicate_counts)
 
     T0_counts.columns = ['T0_' + str(i) for i in range(T0_counts.shape[1])]
     TEnd_counts.columns = ['TEnd_' + str(i) for i in range(TEnd_counts.shape[1])]
     
-    # get save location 
-    save_loc = os.path.join(store_loc, save_dir, curr_study, curr_cl)
-    os.makedirs(save_loc, exist_ok = True)
-    
     # save the sequences
     study_sequences = pd.DataFrame({'Guide_ID' : curr_counts['sgRNA_guide_name_g1'].tolist() + curr_counts['sgRNA_guide_name_g2'].tolist(),
                                     'Sequence' : curr_counts['sgRNA_guide_seq_g1'].tolist() + curr_counts['sgRNA_guide_seq_g2'].tolist()})
@@ -1746,6 +2734,62 @@ def run_gemini_score(curr_counts, curr_study, curr_cl, store_loc = os.getcwd(),
     # save counts
     gemini_counts.reset_index(drop = True, inplace = True)
     gemini_counts.to_csv(os.path.join(save_loc, "counts.csv"), sep = ',', index = False)
+
+    # scores are cached by the hash of the GEMINI inputs
+    return(get_cache_key('gemini', hash_files([os.path.join(save_loc, i) for i in ["sequences.csv", "guide_gene_annotation.csv", "counts.csv"]] + [GEMINI_SCRIPT])))
+
+def format_gemini_scores(res):
+    '''
+    Helper function, formats the GEMINI Scores of a study and cell line to the dual gene pairs.
+    '''
+    genes_1, genes_2, _ = sort_pair_labels(*split_pair_labels(res.index, sep = ';'))
+    res.index = join_pair_labels(genes_1, genes_2)
+    res.columns = ['GEMINI Score Strong', 'GEMINI Sensitive Lethality', 'GEMINI Sensitive Recovery']
+
+    # # get only dual SL
+    only_dual_idx = ~np.asarray(res.index.str.contains('CONTROL', regex = False), dtype = bool)
+    res = res.loc[only_dual_idx]
+    genes_1, genes_2 = genes_1[only_dual_idx], genes_2[only_dual_idx]
+
+    # set results
+    gemini_results = pd.DataFrame(data = {'SL_score_Strong' : res['GEMINI Score Strong'].values,
+                                          'SL_score_SensitiveLethality' : res['GEMINI Sensitive Lethality'].values,
+                                          'SL_score_SensitiveRecovery' : res['GEMINI Sensitive Recovery'].values,
+                                             'Gene 1' : genes_1,
+                                             'Gene 2' : genes_2}, 
+                                  index = res.index)
+
+    results = {}
+    results['GEMINI_SCORE'] = gemini_results
+    
+    return(results)
+
+def run_gemini_score(curr_counts, curr_study, curr_cl, store_loc = os.getcwd(), save_dir = 'GEMINI_Files', command_line_params = [], re_run = False, replicate_counts = None, timeout = None):
+    '''
+    Calculates GEMINI Score. Score files will created at the designated store location and save directory. 
+
+    **Params**:
+    * curr_counts: Counts to calculate scores to.)
+    * curr_study: String, name of study to analyze data for.
+    * curr_cl: String, name of cell line to analyze data for.
+    * store_loc: String: Directory to store the GEMINI files to. (Default: current working directory)
+    * save_dir: String: Folder name to store the GEMINI files to. (Default: 'GEMINI_Files')
+    * command_line_params: Optional list to load programming environment(s) to be able to run GEMINI through R (i.e. loading path, activating R environment). 
+    * re_run: Boolean. Recompute the results even if a cached result matches the counts and parameters (Default: False)
+    * replicate_counts: Optional tuple of T0 and TEnd counts, obtained via ```get_replicate_counts```. Counts are parsed from curr_counts if not supplied. (Default: None)
+    * timeout: Optional time limit of GEMINI, in seconds. The output of GEMINI is logged to GEMINI.log, and the job is recorded in the jobs_manifest.jsonl of the save directory. (Default: None, no limit)
+
+    **Returns**:
+
+    * gemini_res: A dict that contains a pandas dataframe for GEMINI Score. If GEMINI fails, the lines of its log instead.
+    '''
+    print('Running gemini score...')
+    
+    # get save location 
+    save_loc = os.path.join(store_loc, save_dir, curr_study, curr_cl)
+    os.makedirs(save_loc, exist_ok = True)
+    
+    scores_key = write_gemini_inputs(curr_counts, save_loc, replicate_counts = replicate_counts)
     
     # write a gemini bash file
     file_loc = os.path.join(save_loc, 'GEMINI_commands.sh')
@@ -1753,7 +2797,7 @@ def run_gemini_score(curr_counts, curr_study, curr_cl, store_loc = os.getcwd(),
     fp.write("#!/bin/sh\n")
     for line in command_line_params:
         fp.write(line + '\n')
-    fp.write('Rscript --vanilla ' + os.path.join(PACKAGE_PATH, 'files', 'GEMINI.R') + ' --args ' + os.path.join(save_dir, curr_study, curr_cl) + '\n')
+    fp.write(RSCRIPT_EXECUTABLE + ' --vanilla ' + GEMINI_SCRIPT + ' --args ' + os.path.join(save_dir, curr_study, curr_cl) + '\n')
     fp.close()
 
     # set chmod
@@ -1762,50 +2806,301 @@ def run_gemini_score(curr_counts, curr_study, curr_cl, store_loc = os.getcwd(),
     
     #### scoring
     
+    scores_loc = get_cache_file(save_loc, 'GEMINI_Scores', scores_key)
+
+    res = load_from_cache(scores_loc, lambda file_loc: load_result(file_loc)['GEMINI_Scores']) if not re_run else None
+
     # scores have already been computed
-    if os.path.exists(os.path.join(save_loc, 'GEMINI_Scores.csv')) and (not re_run):
+    if res is not None:
         print('Scores exist!')
     else:
         print("Running GEMINI...")
-        process = subprocess.run([file_loc], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        if process.returncode == 1:
-            print("Error in GEMINI!!!")
-            return(process.stdout.splitlines())
-        else:
-            print("Finished running GEMINI!")
+        # GEMINI.R resolves the save directory relative to the store location, so the script is given by its absolute path
+        job = run_external_job(os.path.abspath(file_loc), os.path.abspath(os.path.join(save_loc, 'GEMINI.log')), name = 'gemini ' + curr_study + ', ' + curr_cl, cwd = os.path.abspath(store_loc), timeout = timeout, manifest_loc = os.path.join(store_loc, save_dir, 'jobs_manifest.jsonl'))
+        if job['status'] != 'finished':
+            return(report_failed_job(job, 'GEMINI'))
+        print("Finished running GEMINI!")
 
-        
-    ######### load results
-    
-    res = pd.read_csv(os.path.join(save_loc, 'GEMINI_Scores.csv'), index_col = 0)
+        res = pd.read_csv(os.path.join(save_loc, 'GEMINI_Scores.csv'), index_col = 0)
+        save_to_cache(scores_loc, {'GEMINI_Scores': res}, os.path.join(store_loc, save_dir))
 
-    res.index = ['|'.join(sorted(i.split(';'))) for i in res.index]
-    res.columns = ['GEMINI Score Strong', 'GEMINI Sensitive Lethality', 'GEMINI Sensitive Recovery']
+    return(format_gemini_scores(res))
 
-    # # get only dual SL
-    only_dual_idx = [False if 'CONTROL' in i else True for i in res.index]
-    res = res.loc[only_dual_idx]
+def run_gemini_batch(partitions, store_loc = os.getcwd(), save_dir = 'GEMINI_Files', command_line_params = [], re_run = False, n_workers = 1, timeout = None):
+    '''
+    Calculates GEMINI Scores of many studies and cell lines in a single R session, so that R starts and loads the GEMINI packages once rather than for each study and cell line. The studies and cell lines to score are written to a manifest, which GEMINI.R scores in sequence, or over parallel workers. Cached scores are loaded without running GEMINI. Score files will created at the designated store location and save directory.
 
-    # set results
-    gemini_results = pd.DataFrame(data = {'SL_score_Strong' : res['GEMINI Score Strong'].values,
-                                          'SL_score_SensitiveLethality' : res['GEMINI Sensitive Lethality'].values,
-                                          'SL_score_SensitiveRecovery' : res['GEMINI Sensitive Recovery'].values,
-                                             'Gene 1' : [i.split('|')[0] for i in res.index],
-                                             'Gene 2' : [i.split('|')[1] for i in res.index]}, 
-                                  index = ['|'.join(sorted(i.split('|'))) for i in res.index])
+    **Params**:
+    * partitions: Iterable of (curr_study, curr_cl, curr_counts) tuples to calculate scores to, e.g. obtained via ```load_counts_by_study```.
+    * store_loc: String: Directory to store the GEMINI files to. (Default: current working directory)
+    * save_dir: String: Folder name to store the GEMINI files to. (Default: 'GEMINI_Files')
+    * command_line_params: Optional list to load programming environment(s) to be able to run GEMINI through R (i.e. loading path, activating R environment). 
+    * re_run: Boolean. Recompute the results even if a cached result matches the counts and parameters (Default: False)
+    * n_workers: Number of studies and cell lines to score at once in the R session, the cores are divided between them. (Default: 1)
+    * timeout: Optional time limit of the R session, in seconds. Scores completed before the timeout are kept. (Default: None, no limit)
 
-    
-    
-    ######### /load results
+    **Returns**:
+
+    * gemini_res: A dictionary of the results of each (curr_study, curr_cl), as returned by ```run_gemini_score```. If GEMINI fails for a study and cell line, the lines of the log instead.
+    '''
+    print('Running gemini batch...')
+
+    batch_loc = os.path.join(store_loc, save_dir)
+    os.makedirs(batch_loc, exist_ok = True)
 
     results = {}
-    results['GEMINI_SCORE'] = gemini_results
-    
-    return(results)
+    to_run = {}
+    for curr_study, curr_cl, curr_counts in partitions:
+        save_loc = os.path.join(batch_loc, curr_study, curr_cl)
+        os.makedirs(save_loc, exist_ok = True)
+
+        scores_loc = get_cache_file(save_loc, 'GEMINI_Scores', write_gemini_inputs(curr_counts, save_loc))
+        res = load_from_cache(scores_loc, lambda file_loc: load_result(file_loc)['GEMINI_Scores']) if not re_run else None
+
+        if res is not None:
+            results[(curr_study, curr_cl)] = res
+        else:
+            # remove the scores of earlier runs, so that they are not collected if GEMINI fails
+            if os.path.exists(os.path.join(save_loc, 'GEMINI_Scores.csv')):
+                os.remove(os.path.join(save_loc, 'GEMINI_Scores.csv'))
+            results[(curr_study, curr_cl)] = None
+            to_run[(curr_study, curr_cl)] = scores_loc
+
+    print('Scores exist for ' + str(len(results) - len(to_run)) + ' of ' + str(len(results)) + ' studies and cell lines')
+
+    if len(to_run) > 0:
+        batch_name = 'GEMINI_batch_' + os.urandom(4).hex()
+
+        # write the manifest, the locations are relative to the store location as in run_gemini_score
+        manifest_loc = os.path.join(batch_loc, batch_name + '.txt')
+        with open(manifest_loc, 'w') as handle:
+            for curr_study, curr_cl in to_run:
+                handle.write(os.path.join(save_dir, curr_study, curr_cl) + '\n')
+
+        # write a gemini bash file
+        file_loc = os.path.join(batch_loc, batch_name + '.sh')
+        fp = open(file_loc, '+w')
+        fp.write("#!/bin/sh\n")
+        for line in command_line_params:
+            fp.write(line + '\n')
+        fp.write(RSCRIPT_EXECUTABLE + ' --vanilla ' + GEMINI_SCRIPT + ' --args --manifest ' + os.path.join(save_dir, batch_name + '.txt') + ' ' + str(n_workers) + '\n')
+        fp.close()
+
+        # set chmod
+        os.chmod(file_loc, 0o0777)
+
+        print("Running GEMINI for " + str(len(to_run)) + " studies and cell lines...")
+        job = run_external_job(os.path.abspath(file_loc), os.path.abspath(os.path.join(batch_loc, batch_name + '.log')), name = 'gemini batch of ' + str(len(to_run)), cwd = os.path.abspath(store_loc), timeout = timeout, manifest_loc = os.path.join(batch_loc, 'jobs_manifest.jsonl'))
+        if job['status'] != 'finished':
+            report_failed_job(job, 'GEMINI')
+        print("Finished running GEMINI!")
+
+        # collect the scores
+        for (curr_study, curr_cl), scores_loc in to_run.items():
+            scores_file = os.path.join(batch_loc, curr_study, curr_cl, 'GEMINI_Scores.csv')
+            if not os.path.exists(scores_file):
+                print('Error in GEMINI for: ' + curr_study + ', ' + curr_cl)
+                with open(job['log'], errors = 'replace') as handle:
+                    results[(curr_study, curr_cl)] = handle.read().splitlines()
+                continue
+
+            res = pd.read_csv(scores_file, index_col = 0)
+            save_to_cache(scores_loc, {'GEMINI_Scores': res}, batch_loc)
+            results[(curr_study, curr_cl)] = res
+
+    return({partition: format_gemini_scores(res) if isinstance(res, pd.DataFrame) else res for partition, res in results.items()})
+
+# priors of the native GEMINI model, as the defaults of gemini_initialize: guide and guide pair efficacies (x, xx), gene effects (y), interactions (s), and the shape and rate of the guide pair precisions (tau)
+GEMINI_PRIORS = {'mean_x': 1, 'sd_x': 1, 'mean_xx': 1, 'sd_xx': 1, 'mean_y': 0, 'sd_y': 10, 'mean_s': 0, 'sd_s': 10, 'shape': 0.5, 'rate': 0.5}
+
+def calculate_gemini_lfc(T0_counts, TEnd_counts, pseudo_count = 32, normalize = True):
+    '''
+    Helper function, calculates the fold changes of each TEnd replicate against the mean of the T0 replicates, from the log2 counts with a pseudo count, median normalized within each replicate, as gemini_calculate_lfc.
+    '''
+    T0_log = np.log2(np.asarray(T0_counts, dtype = np.float64) + pseudo_count)
+    TEnd_log = np.log2(np.asarray(TEnd_counts, dtype = np.float64) + pseudo_count)
+    if normalize:
+        T0_log = T0_log - np.median(T0_log, axis = 0)
+        TEnd_log = TEnd_log - np.median(TEnd_log, axis = 0)
+
+    return(TEnd_log - T0_log.mean(axis = 1, keepdims = True))
+
+def update_gemini_factor(means, codes_1, codes_2, partner_means, partner_moments, same_partner, target, weights, prior_mean, prior_sd):
+    '''
+    Helper function, variational update of the guide (x) or gene (y) effects of the native GEMINI model, which enter each guide pair at both positions, multiplied by their partner factor. Pairs with the same factor at both positions have a single term, multiplied by the sum of its partners. Returns the means and variances of the factors.
+    '''
+    (partner_1, partner_2), (moment_1, moment_2) = partner_means, partner_moments
+    same = codes_1 == codes_2
+    other = ~same
+
+    coef = np.where(same, partner_1 + partner_2, partner_1)
+    coef_moment = np.where(same, np.where(same_partner, 4 * moment_1, moment_1 + moment_2 + 2 * partner_1 * partner_2), moment_1)
+    target_1 = target - np.where(same, 0, means[codes_2] * partner_2)
+    target_2 = target[other] - means[codes_1[other]] * partner_1[other]
+
+    codes = np.concatenate([codes_1, codes_2[other]])
+    precision = 1 / prior_sd ** 2 + np.bincount(codes, weights = np.concatenate([weights * coef_moment, weights[other] * moment_2[other]]), minlength = len(means))
+    mean = prior_mean / prior_sd ** 2 + np.bincount(codes, weights = np.concatenate([weights * coef * target_1, weights[other] * partner_2[other] * target_2]), minlength = len(means))
+
+    return((mean / precision, 1 / precision))
+
+def calculate_gemini_scores(lfc, guides_1, guides_2, genes_1, genes_2, nc_gene = 'CONTROL', n_iterations = 20, lethality_threshold = -1, priors = None):
+    '''
+    Helper function, fits the GEMINI model to the fold changes of the guide pairs by coordinate ascent variational inference, vectorized over guides, genes and gene pairs, and scores the gene pairs as gemini_score.
+
+    Each guide pair fold change is modeled as x_1 * y_1 + x_2 * y_2 + xx * s, from the efficacies of its guides (x) and of the guide pair (xx), the effects of its genes (y) and their interaction (s), with a precision (tau) for each guide pair, shared by the replicates. The negative control gene has no effect, nor interactions. Gene pairs are scored by the strength of their combined effect over the individual effects (Strong), by the interaction of genes that are not lethal alone (SensitiveLethality, -s), and by the interaction of genes where one is lethal alone (SensitiveRecovery, s), with genes lethal alone below the lethality threshold.
+
+    Returns a dataframe of the gene pairs ('Gene 1;Gene 2'), with the Strong, SensitiveLethality and SensitiveRecovery scores, as the GEMINI_Scores.csv of GEMINI.R.
+    '''
+    priors = dict(GEMINI_PRIORS, **(priors if priors is not None else {}))
+    lfc = np.asarray(lfc, dtype = np.float64).reshape(len(guides_1), -1)
+    n_pairs, n_replicates = lfc.shape
+    lfc_mean = lfc.mean(axis = 1)
+    lfc_squares = (lfc ** 2).sum(axis = 1)
+
+    # guides and genes are coded once, the genes of each guide pair stay in the order of its guides
+    guide_codes = pd.factorize(np.concatenate([guides_1, guides_2]))[0]
+    guide_1, guide_2 = guide_codes[:n_pairs], guide_codes[n_pairs:]
+    gene_codes, genes = pd.factorize(np.concatenate([genes_1, genes_2]), sort = True)
+    gene_1, gene_2 = gene_codes[:n_pairs], gene_codes[n_pairs:]
+    n_guides, n_genes = guide_codes.max() + 1, len(genes)
+    same_guide, same_gene = guide_1 == guide_2, gene_1 == gene_2
+
+    # interactions of the unordered gene pairs, the pairs with the control gene share a last interaction fixed at 0
+    is_control = np.asarray(genes == nc_gene)
+    interacting = ~is_control[gene_1] & ~is_control[gene_2]
+    pair_codes, pair_keys = pd.factorize(np.minimum(gene_1, gene_2)[interacting] * n_genes + np.maximum(gene_1, gene_2)[interacting], sort = True)
+    n_gene_pairs = len(pair_keys)
+    gene_pair = np.full(n_pairs, n_gene_pairs)
+    gene_pair[interacting] = pair_codes
+
+    #### initialization
+
+    # gene effects from their pairs with the control gene, or half of their other pairs
+    single = is_control[gene_1] ^ is_control[gene_2]
+    y_init = group_statistics(np.concatenate([lfc_mean, lfc_mean]) / 2, np.concatenate([gene_1, gene_2]))['median']
+    y_init.update(group_statistics(lfc_mean[single], np.where(is_control[gene_1], gene_2, gene_1)[single])['median'])
+    y_mean = y_init.reindex(range(n_genes)).fillna(0).values
+    y_mean[is_control] = 0
+    y_var = np.zeros(n_genes)
+
+    # interactions from the residuals of the gene effects
+    s_mean = np.zeros(n_gene_pairs + 1)
+    s_mean[:n_gene_pairs] = group_statistics((lfc_mean - y_mean[gene_1] - y_mean[gene_2])[interacting], pair_codes)['median'].values
+    s_var = np.zeros(n_gene_pairs + 1)
+
+    x_mean, x_var = np.full(n_guides, float(priors['mean_x'])), np.zeros(n_guides)
+    xx_mean, xx_var = np.full(n_pairs, float(priors['mean_xx'])), np.zeros(n_pairs)
+
+    def update_tau():
+        # expected squared residuals, from the variance of each term and their covariance through shared guides or genes
+        x_1, x_2, y_1, y_2 = x_mean[guide_1], x_mean[guide_2], y_mean[gene_1], y_mean[gene_2]
+        term_1, term_2, term_s = x_1 * y_1, x_2 * y_2, xx_mean * s_mean[gene_pair]
+        var_1 = (x_1 ** 2 + x_var[guide_1]) * (y_1 ** 2 + y_var[gene_1]) - term_1 ** 2
+        var_2 = (x_2 ** 2 + x_var[guide_2]) * (y_2 ** 2 + y_var[gene_2]) - term_2 ** 2
+        var_s = (xx_mean ** 2 + xx_var) * (s_mean[gene_pair] ** 2 + s_var[gene_pair]) - term_s ** 2
+        covariance = np.where(same_guide & same_gene, var_1, np.where(same_gene, x_1 * x_2 * y_var[gene_1], np.where(same_guide, y_1 * y_2 * x_var[guide_1], 0)))
+
+        fit = term_1 + term_2 + term_s
+        squares = lfc_squares - 2 * fit * lfc_mean * n_replicates + n_replicates * (fit ** 2 + var_1 + var_2 + var_s + 2 * covariance)
+        return((priors['shape'] + n_replicates / 2) / (priors['rate'] + squares / 2))
+
+    #### inference
+
+    print('Running GEMINI inference...')
+    for iteration in range(n_iterations):
+        # expected precision of each guide pair, over its replicates
+        weights = update_tau() * n_replicates
+
+        # guide efficacies
+        target = lfc_mean - xx_mean * s_mean[gene_pair]
+        x_mean, x_var = update_gemini_factor(x_mean, guide_1, guide_2, (y_mean[gene_1], y_mean[gene_2]), (y_mean[gene_1] ** 2 + y_var[gene_1], y_mean[gene_2] ** 2 + y_var[gene_2]), same_gene, target, weights, priors['mean_x'], priors['sd_x'])
+
+        # gene effects, none for the control gene
+        y_mean, y_var = update_gemini_factor(y_mean, gene_1, gene_2, (x_mean[guide_1], x_mean[guide_2]), (x_mean[guide_1] ** 2 + x_var[guide_1], x_mean[guide_2] ** 2 + x_var[guide_2]), same_guide, target, weights, priors['mean_y'], priors['sd_y'])
+        y_mean[is_control], y_var[is_control] = 0, 0
+
+        # guide pair efficacies and interactions, from the residuals of the gene effects
+        target = lfc_mean - x_mean[guide_1] * y_mean[gene_1] - x_mean[guide_2] * y_mean[gene_2]
+        s_moment = s_mean[gene_pair] ** 2 + s_var[gene_pair]
+        xx_var = 1 / (1 / priors['sd_xx'] ** 2 + weights * s_moment)
+        xx_mean = (priors['mean_xx'] / priors['sd_xx'] ** 2 + weights * s_mean[gene_pair] * target) * xx_var
+
+        s_var = 1 / (1 / priors['sd_s'] ** 2 + np.bincount(gene_pair, weights = weights * (xx_mean ** 2 + xx_var), minlength = n_gene_pairs + 1))
+        s_mean = (priors['mean_s'] / priors['sd_s'] ** 2 + np.bincount(gene_pair, weights = weights * xx_mean * target, minlength = n_gene_pairs + 1)) * s_var
+        s_mean[n_gene_pairs], s_var[n_gene_pairs] = 0, 0
+
+        fit = x_mean[guide_1] * y_mean[gene_1] + x_mean[guide_2] * y_mean[gene_2] + xx_mean * s_mean[gene_pair]
+        print(' '.join(['Iteration', str(iteration + 1), 'of', str(n_iterations), '- MAE:', str(round(np.abs(lfc - fit[:, None]).mean(), 5))]))
+
+    #### scoring
+
+    gene_pair_1, gene_pair_2 = pair_keys // n_genes, pair_keys % n_genes
+    y_1, y_2, interaction = y_mean[gene_pair_1], y_mean[gene_pair_2], s_mean[:n_gene_pairs]
+    lethal = np.minimum(y_1, y_2) < lethality_threshold
+
+    scores = pd.DataFrame({'Strong': np.abs(y_1 + y_2 + interaction) - np.maximum(np.abs(y_1), np.abs(y_2)),
+                           'SensitiveLethality': np.where(lethal, 0, -interaction),
+                           'SensitiveRecovery': np.where(lethal, interaction, 0)},
+                          index = join_pair_labels(genes[gene_pair_1].astype(str), genes[gene_pair_2].astype(str), sep = ';'))
+
+    return(scores)
+
+def create_gemini_native_table(engine_link):
+    '''
+    Helper function, creates the native GEMINI score table (gemini_native_score) for databases created with an earlier schema.
+    '''
+    with engine_link.begin() as transaction:
+        transaction.execute(sqlalchemy.text('CREATE TABLE IF NOT EXISTS gemini_native_score (id INTEGER NOT NULL, gene_pair_id INTEGER, SL_score_Strong DOUBLE PRECISION, SL_score_SensitiveLethality DOUBLE PRECISION, SL_score_SensitiveRecovery DOUBLE PRECISION, PRIMARY KEY (id), FOREIGN KEY (gene_pair_id) REFERENCES cdko_sgrna_counts (gene_pair_id))'))
+
+def run_gemini_native_score(curr_counts, curr_study, curr_cl, store_loc = os.getcwd(), save_dir = 'GEMINI_Files', re_run = False, replicate_counts = None, n_iterations = 20, lethality_threshold = -1):
+    '''
+    Calculates GEMINI Score in Python, without R. The GEMINI model is fit in process by the same variational inference, vectorized over guides, genes and gene pairs, so no input files are written and no R session is started. Scores are cached at the designated store location and save directory.
+
+    **Params**:
+    * curr_counts: Counts to calculate scores to.)
+    * curr_study: String, name of study to analyze data for.
+    * curr_cl: String, name of cell line to analyze data for.
+    * store_loc: String: Directory to store the GEMINI files to. (Default: current working directory)
+    * save_dir: String: Folder name to store the GEMINI files to. (Default: 'GEMINI_Files')
+    * re_run: Boolean. Recompute the results even if a cached result matches the counts and parameters (Default: False)
+    * replicate_counts: Optional tuple of T0 and TEnd counts, obtained via ```get_replicate_counts```. Counts are parsed from curr_counts if not supplied. (Default: None)
+    * n_iterations: Number of iterations of the inference, as GEMINI.R. (Default: 20)
+    * lethality_threshold: Fold change under which a gene is lethal alone, separating the sensitive lethality and recovery scores. (Default: -1)
+
+    **Returns**:
+
+    * gemini_res: A dict that contains a pandas dataframe for GEMINI Score.
+    '''
+    print('Running native gemini score...')
+
+    # get save location
+    save_loc = os.path.join(store_loc, save_dir, curr_study, curr_cl)
+    os.makedirs(save_loc, exist_ok = True)
+
+    # scores are cached by the counts and the scoring parameters
+    scores_loc = get_cache_file(save_loc, 'GEMINI_native_Scores', get_score_cache_key('GEMINI_native_Scores', curr_counts, {'n_iterations': n_iterations, 'lethality_threshold': lethality_threshold}, replicate_counts = replicate_counts))
+    res = load_from_cache(scores_loc, lambda file_loc: load_result(file_loc)['GEMINI_Scores']) if not re_run else None
+
+    # scores have already been computed
+    if res is not None:
+        print('Scores exist!')
+    else:
+        # !no preprocessing!
+        T0_counts, TEnd_counts = get_raw_counts(curr_counts, replicate_counts = replicate_counts)
+
+        # guide pairs are identified by their sequences, duplicated sequence pairs are removed as in GEMINI.R
+        unique_idx = ~curr_counts[['sgRNA_guide_seq_g1', 'sgRNA_guide_seq_g2']].duplicated().values
+
+        lfc = calculate_gemini_lfc(T0_counts.values, TEnd_counts.values)[unique_idx]
+        res = calculate_gemini_scores(lfc, *[curr_counts[i].values[unique_idx] for i in ['sgRNA_guide_seq_g1', 'sgRNA_guide_seq_g2', 'sgRNA_target_name_g1', 'sgRNA_target_name_g2']], n_iterations = n_iterations, lethality_threshold = lethality_threshold)
+        save_to_cache(scores_loc, {'GEMINI_Scores': res}, os.path.join(store_loc, save_dir))
+
+    return(format_gemini_scores(res))
 
 ###### Adding Scores to Database Functions
 
-def add_table_to_db(curr_counts, curr_results, table_name, engine_link):
+def add_table_to_db(curr_counts, curr_results, table_name, engine_link, bulk_insert = False):
     
     print('---------ADDING-TO-DB---------')
     
@@ -1814,7 +3109,7 @@ def add_table_to_db(curr_counts, curr_results, table_name, engine_link):
     
     # add sorted targets
     # add a sorted gene pair column
-    curr_counts['gene_pair'] = ['|'.join(sorted([curr_counts['sgRNA_target_name_g1'].iloc[i], curr_counts['sgRNA_target_name_g2'].iloc[i]])) for i in range(curr_counts.shape[0])]
+    curr_counts['gene_pair'] = sort_pair_keys(curr_counts['sgRNA_target_name_g1'].values, curr_counts['sgRNA_target_name_g2'].values)[0]
 
     # remove the same ones
     curr_results = curr_results.loc[curr_results['Gene 1'] != curr_results['Gene 2'],:]
@@ -1828,35 +3123,22 @@ def add_table_to_db(curr_counts, curr_results, table_name, engine_link):
     # merge and get final table
     curr_results = curr_results.merge(curr_counts.drop_duplicates(subset = 'gene_pair'), how = 'left', left_index = True, right_on ='gene_pair').loc[:, ['gene_pair_id'] + list(curr_results.columns)]
 
-    # first, get the metadata
-    db_metadata = sqlalchemy.MetaData()
-    db_metadata.reflect(bind=engine_link)
-
-    # access the tables
-    curr_table = db_metadata.tables[table_name]
-
-    # then, start the session
-    engine_session = sessionmaker(bind=engine_link)
-    curr_session = engine_session()
-
-    # get number of records in each table
-    curr_records_num = curr_session.query(curr_table).count()
-
-    curr_results.reset_index(drop = True, inplace = True)
-    curr_results.index += curr_records_num
-    # set index
-    curr_results['id'] = curr_results.index
-    
     if curr_results['gene_pair_id'].isna().sum() > 0:
         print('NA found')
         return()
-        
-    with engine_link.begin() as transaction:
-        # insert sequence
+
+    create_id_allocation_table(engine_link, {table_name + '.id': [(table_name, 'id')]})
+    with begin_insert_transaction(engine_link, bulk_insert = bulk_insert) as transaction:
         print('Beginning transaction...')
 
+        # reserve the IDs of the new records within the transaction
+        curr_results.reset_index(drop = True, inplace = True)
+        curr_results.index += allocate_ids(transaction, table_name + '.id', curr_results.shape[0])
+        # set index
+        curr_results['id'] = curr_results.index
+
         # insert scores
-        curr_results.to_sql(name = table_name, con = transaction, if_exists = 'append', index = False, index_label = 'id')
+        write_table_to_db(curr_results, table_name, transaction, bulk_insert = bulk_insert)
 
         print('Successfully inserted!')
 
@@ -1865,6 +3147,19 @@ def add_table_to_db(curr_counts, curr_results, table_name, engine_link):
 
 
 
+def read_table_by_ids(engine_link, table_name, ids, select = '*', id_column = 'gene_pair_id', chunk_size = 500):
+    '''
+    Helper function, yields the rows of a table that match the given ids. The ids are queried in chunks to keep the number of bound parameters low.
+    '''
+    ids = sorted(set(int(i) for i in ids if not pd.isna(i)))
+
+    query = sqlalchemy.text('SELECT ' + select + ' FROM ' + table_name.lower() + ' WHERE ' + id_column + ' IN :ids')
+    query = query.bindparams(sqlalchemy.bindparam('ids', expanding = True))
+
+    with engine_link.connect() as connection:
+        for i in range(0, len(ids), chunk_size):
+            yield pd.read_sql_query(con = connection, sql = query, params = {'ids': ids[i:i+chunk_size]})
+
 def check_if_added_to_table(curr_counts, table_name, engine_link):
     '''
         
@@ -1873,11 +3168,12 @@ def check_if_added_to_table(curr_counts, table_name, engine_link):
     *Params**:
 
     * curr_counts: Counts to calculate the scores to.
-    * score_name: Table to insert the scores to. Must be any of the 7 scoring table names:
+    * score_name: Table to insert the scores to. Must be any of the 8 scoring table names:
         * HORLBECK_SCORE
         * MEDIAN_B_SCORE
         * MEDIAN_NB_SCORE
         * GEMINI_SCORE
+        * GEMINI_NATIVE_SCORE
         * MAGECK_SCORE
         * SGRA_DERIVED_B_SCORE
         * SGRA_DERIVED_NB_SCORE
@@ -1888,31 +3184,176 @@ def check_if_added_to_table(curr_counts, table_name, engine_link):
     '''
     print('Checking if score already computed: ' + table_name)
     
-    # get available results
-    res = pd.read_sql_query(con=engine_link.connect(), 
-                              sql=sqlalchemy.text('SELECT * from ' + table_name.lower()), index_col = 'id')
-    
-    if res.shape[0] == 0:
+    # count the gene pairs of the counts that are already in the table
+    inserted_num = 0
+    for res in read_table_by_ids(engine_link, table_name, curr_counts['gene_pair_id'], select = 'COUNT(DISTINCT gene_pair_id) AS inserted_num'):
+        inserted_num += int(res['inserted_num'].iloc[0])
+
+    if inserted_num == 0:
         # none added, so proceed
         return(False)
     else:
-        # get all IDs
-        available_ids = set(res['gene_pair_id']).difference(set(curr_counts['gene_pair_id']))
-        
-        # already added
-        if len(available_ids) == 0:
-            print('Scores already in database!')
-            print('Inserted scores: ' + str(len(set(curr_counts['gene_pair_id']))))
-            print('---------NOT-TO-DB---------')
-            return(True)
-        elif len(available_ids) == len(set(res['gene_pair_id'])):
-            # none added, so proceed
-            return(False)
-        else:
-            print('Scores already in database.')
-            print('Inserted scores: ' + str(res.shape[0]))
-            print('---------NOT-TO-DB---------')
-            return(True)
+        print('Scores already in database!')
+        print('Inserted scores: ' + str(inserted_num))
+        print('---------NOT-TO-DB---------')
+        return(True)
+
+###### Scoring Orchestration Functions
+
+# scoring functions and the tables their results are inserted to, the first table is checked before scoring
+SCORING_METHODS = {'median': (run_median_scores, {'MEDIAN_NB_SCORE': 'median_nb_score', 'MEDIAN_B_SCORE': 'median_b_score'}),
+                   'sgrna_derived': (run_sgrna_scores, {'SGRNA_DERIVED_NB_SCORE': 'sgrna_derived_nb_score', 'SGRNA_DERIVED_B_SCORE': 'sgrna_derived_b_score'}),
+                   'horlbeck': (run_horlbeck_score, {'HORLBECK_SCORE': 'horlbeck_score'}),
+                   'mageck': (run_mageck_score, {'MAGECK_SCORE': 'mageck_score'}),
+                   'gemini': (run_gemini_score, {'GEMINI_SCORE': 'gemini_score'})}
+
+# scoring methods that share the preprocessed counts, run together for each study and cell line
+PREPROCESSED_METHODS = ['median', 'sgrna_derived', 'horlbeck']
+
+# scoring methods that run an external tool, mostly waiting on its job rather than using a processor
+EXTERNAL_METHODS = ['mageck', 'gemini']
+
+def run_scoring_task(methods, curr_counts, curr_study, curr_cl, method_params):
+    '''
+    Helper function, runs scoring methods on one study and cell line in the same process, so that they share the preprocessed counts. Returns the results and the wall time of each method. A method that fails returns its traceback in place of the results, so that the other methods of the task are still inserted.
+    '''
+    task_results = []
+    preprocessed_counts = {}
+    for method in methods:
+        start_time = time.time()
+        curr_params = method_params.get(method, {}).copy()
+
+        try:
+            # preprocess once for all methods with the same normalization
+            if method in PREPROCESSED_METHODS and curr_params.get('do_preprocessing', True):
+                full_normalization = curr_params.get('full_normalization', False)
+                if full_normalization not in preprocessed_counts:
+                    preprocessed_counts[full_normalization] = get_preprocessed_counts(curr_counts, curr_study, curr_cl, full_normalization = full_normalization, replicate_counts = curr_params.get('replicate_counts'), store_loc = curr_params.get('store_loc', os.getcwd()))
+                curr_params['preprocessed_counts'] = preprocessed_counts[full_normalization]
+
+            results = SCORING_METHODS[method][0](curr_counts.copy(), curr_study = curr_study, curr_cl = curr_cl, **curr_params)
+        except Exception:
+            results = traceback.format_exc()
+        task_results.append((method, results, time.time() - start_time))
+
+    return(task_results)
+
+def run_gemini_batch_task(partitions, method_params):
+    '''
+    Helper function, runs GEMINI on a batch of studies and cell lines in one R session. Returns the results of each study and cell line as run_scoring_task, with the wall time of the batch divided between them. Parameters of run_gemini_score that do not apply to a batch (i.e. replicate_counts, which belong to a single study and cell line) are left out.
+    '''
+    start_time = time.time()
+    batch_params = inspect.signature(run_gemini_batch).parameters
+    curr_params = {param: value for param, value in method_params.get('gemini', {}).items() if param in batch_params}
+
+    try:
+        batch_results = run_gemini_batch(partitions, **curr_params)
+    except Exception:
+        batch_results = {(curr_study, curr_cl): traceback.format_exc() for curr_study, curr_cl, _ in partitions}
+    wall_time = (time.time() - start_time) / len(partitions)
+
+    return([[('gemini', batch_results[(curr_study, curr_cl)], wall_time)] for curr_study, curr_cl, _ in partitions])
+
+def run_all_scores(engine_link, methods = ['median', 'sgrna_derived', 'horlbeck', 'mageck', 'gemini'], studies = None, cell_lines = None, n_jobs = None, method_params = None, n_external_jobs = None, gemini_batch_size = None):
+    '''
+    Calculates the SL scores of all studies and cell lines in the database, and inserts them to their score tables. Scoring tasks (study, cell line, method) run in parallel over a process pool, while the scores are inserted to the database by a single writer. The Median, sgRNA-Derived and Horlbeck scores of a study and cell line run as a single task, sharing one preprocessing of the counts. The MAGeCK and GEMINI tasks run their external tools over a separate pool, so that the jobs of many studies and cell lines run at once. Scores that are already in the database are skipped.
+
+    **Params**:
+
+    * engine_link: SQLAlchemy connection for the database.
+    * methods: List of scoring methods to run, any of median, sgrna_derived, horlbeck, mageck and gemini. (Default: All methods)
+    * studies: Optional list of studies to score. (Default: None, all studies)
+    * cell_lines: Optional list of cell lines to score. (Default: None, all cell lines)
+    * n_jobs: Number of processes to use. (Default: None, number of processors)
+    * method_params: Optional dictionary of additional parameters for each method, e.g. {'mageck': {'command_line_params': cmd_params, 'timeout': 3600}}. (Default: None)
+    * n_external_jobs: Number of MAGeCK and GEMINI jobs to run at once. (Default: None, same as n_jobs)
+    * gemini_batch_size: Optional number of studies and cell lines to score in each GEMINI R session, see ```run_gemini_batch```. The method_params of gemini that ```run_gemini_batch``` takes are then passed to it, e.g. {'gemini': {'n_workers': 4}}, and the others (i.e. replicate_counts) are left out. (Default: None, one R session for each study and cell line)
+
+    **Returns**:
+
+    * A pandas dataframe of the scoring tasks, with their wall time and number of inserted scores.
+    '''
+    if method_params is None:
+        method_params = {}
+
+    unavailable = set(methods).difference(SCORING_METHODS)
+    if len(unavailable) > 0:
+        print('Unavailable scoring methods: ' + ', '.join(sorted(unavailable)))
+        return
+
+    task_stats = []
+    pending = {}
+
+    def insert_finished(finished):
+        # the single writer, inserts the finished tasks to the database
+        for future in finished:
+            partitions, batched = pending.pop(future)
+            partition_results = future.result() if batched else [future.result()]
+
+            for (curr_study, curr_cl, curr_counts), task_results in zip(partitions, partition_results):
+                for method, results, wall_time in task_results:
+                    inserted = 0
+                    if isinstance(results, dict):
+                        for result_name, table_name in SCORING_METHODS[method][1].items():
+                            if results.get(result_name) is not None:
+                                add_table_to_db(curr_counts.copy(), results[result_name].copy(), table_name, engine_link)
+                                inserted += results[result_name].shape[0]
+                    else:
+                        print('Error in ' + method + ' for: ' + curr_study + ', ' + curr_cl)
+                        if isinstance(results, str):
+                            print(results)
+
+                    print(' '.join(['Finished', method, 'for', curr_study + ',', curr_cl, 'in', str(round(wall_time, 2)), 'seconds']))
+                    task_stats.append({'study_origin': curr_study,
+                                       'cell_line_origin': curr_cl,
+                                       'method': method,
+                                       'wall_time': wall_time,
+                                       'inserted': inserted})
+
+    n_jobs = n_jobs if n_jobs is not None else os.cpu_count()
+    n_external_jobs = n_external_jobs if n_external_jobs is not None else n_jobs
+    gemini_batch = []
+    with ProcessPoolExecutor(max_workers = n_jobs) as executor, ProcessPoolExecutor(max_workers = n_external_jobs) as external_executor:
+        def submit_task(task_executor, partitions, batched, task_function, *args):
+            # limit the number of partitions held in memory
+            while len(pending) >= 2 * (n_jobs + n_external_jobs):
+                finished, _ = wait(pending, return_when = FIRST_COMPLETED)
+                insert_finished(finished)
+
+            future = task_executor.submit(task_function, *args)
+            pending[future] = (partitions, batched)
+
+        for curr_study, curr_cl, curr_counts in load_counts_by_study(engine_link, studies = studies, cell_lines = cell_lines):
+            curr_methods = [method for method in methods if not check_if_added_to_table(curr_counts, list(SCORING_METHODS[method][1].values())[0], engine_link)]
+
+            # GEMINI runs over batches of studies and cell lines, sharing one R session
+            if gemini_batch_size is not None and 'gemini' in curr_methods:
+                curr_methods.remove('gemini')
+                gemini_batch.append((curr_study, curr_cl, curr_counts))
+
+            # methods that share the preprocessed counts run as a single task
+            tasks = [[method for method in curr_methods if method in PREPROCESSED_METHODS]]
+            tasks += [[method] for method in curr_methods if method not in PREPROCESSED_METHODS]
+
+            for task_methods in tasks:
+                if len(task_methods) == 0:
+                    continue
+
+                task_executor = external_executor if task_methods[0] in EXTERNAL_METHODS else executor
+                submit_task(task_executor, [(curr_study, curr_cl, curr_counts)], False, run_scoring_task, task_methods, curr_counts, curr_study, curr_cl, method_params)
+
+            if len(gemini_batch) > 0 and len(gemini_batch) >= gemini_batch_size:
+                submit_task(external_executor, gemini_batch, True, run_gemini_batch_task, gemini_batch, method_params)
+                gemini_batch = []
+
+        if len(gemini_batch) > 0:
+            submit_task(external_executor, gemini_batch, True, run_gemini_batch_task, gemini_batch, method_params)
+
+        while len(pending) > 0:
+            finished, _ = wait(pending, return_when = FIRST_COMPLETED)
+            insert_finished(finished)
+
+    return(pd.DataFrame(task_stats, columns = ['study_origin', 'cell_line_origin', 'method', 'wall_time', 'inserted']))
 
 ###### Score Query Functions
 
@@ -1924,11 +3365,12 @@ def query_result_table(curr_counts, table_name, curr_study, curr_cl, engine_link
     **Params**:
 
     * curr_counts: Counts to obtain the scores from.
-    * table_name: Must be any of the 7 scoring table names, unless customly added:
+    * table_name: Must be any of the 8 scoring table names, unless customly added:
         * horlbeck_score
         * median_b_score
         * median_nb_score
         * gemini_score
+        * gemini_native_score
         * mageck_score
         * sgrna_derived_b_score
         * sgrna_derived_nb_score
@@ -1943,15 +3385,17 @@ def query_result_table(curr_counts, table_name, curr_study, curr_cl, engine_link
     '''
     print('Accessing table: ' + table_name)
     
-    # get available results
-    res = pd.read_sql_query(con=engine_link.connect(), 
-                              sql=sqlalchemy.text('SELECT * from ' + table_name.lower()), index_col = 'id')
-    
     # possible gene pairs
-    curr_counts['gene_pair'] = ['|'.join(sorted([curr_counts['sgRNA_target_name_g1'].iloc[i], curr_counts['sgRNA_target_name_g2'].iloc[i]])) for i in range(curr_counts.shape[0])]
+    curr_counts['gene_pair'] = sort_pair_keys(curr_counts['sgRNA_target_name_g1'].values, curr_counts['sgRNA_target_name_g2'].values)[0]
 
     # get results
     query_res = curr_counts.loc[curr_counts['target_type'] == 'Dual', ['gene_pair', 'gene_pair_id']].drop_duplicates(subset = ['gene_pair_id'])
+
+    # get available results, only for the gene pairs of the counts
+    res = list(read_table_by_ids(engine_link, table_name, query_res['gene_pair_id']))
+    res = pd.concat(res, axis = 0) if len(res) > 0 else pd.DataFrame(columns = ['id', 'gene_pair_id'])
+    res = res.set_index('id')
+
     query_res = query_res.merge(res, left_on = 'gene_pair_id', right_on = 'gene_pair_id').drop('gene_pair_id', axis = 1)
     
     # add column names to the front
@@ -91,6 +91,37 @@ CREATE TABLE `cdko_sgrna_counts` (
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
 /*!40101 SET character_set_client = @saved_cs_client */;
 
+--
+-- Table structure for table `cdko_sgrna_replicate_counts`
+--
+
+DROP TABLE IF EXISTS `cdko_sgrna_replicate_counts`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `cdko_sgrna_replicate_counts` (
+  `sgRNA_pair_id` int NOT NULL,
+  `timepoint` varchar(8) COLLATE utf8mb4_general_ci NOT NULL,
+  `replicate_index` int NOT NULL,
+  `replicate_count` double DEFAULT NULL,
+  PRIMARY KEY (`sgRNA_pair_id`,`timepoint`,`replicate_index`),
+  CONSTRAINT FOREIGN KEY (`sgRNA_pair_id`) REFERENCES `cdko_sgrna_counts` (`sgRNA_pair_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Table structure for table `slkb_id_allocation`
+--
+
+DROP TABLE IF EXISTS `slkb_id_allocation`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `slkb_id_allocation` (
+  `id_name` varchar(64) COLLATE utf8mb4_general_ci NOT NULL,
+  `next_id` bigint NOT NULL,
+  PRIMARY KEY (`id_name`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
 --
 -- Table structure for table `gemini_score`
 --
@@ -109,6 +140,24 @@ CREATE TABLE `gemini_score` (
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
 /*!40101 SET character_set_client = @saved_cs_client */;
 
+--
+-- Table structure for table `gemini_native_score`
+--
+
+DROP TABLE IF EXISTS `gemini_native_score`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `gemini_native_score` (
+  `id` int NOT NULL AUTO_INCREMENT,
+  `gene_pair_id` int DEFAULT NULL,
+  `SL_score_Strong` double DEFAULT NULL,
+  `SL_score_SensitiveLethality` double DEFAULT NULL,
+  `SL_score_SensitiveRecovery` double DEFAULT NULL,
+  PRIMARY KEY (`id`),
+  FOREIGN KEY (`gene_pair_id`) REFERENCES `cdko_sgrna_counts` (`gene_pair_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
 --
 -- Table structure for table `horlbeck_score`
 --
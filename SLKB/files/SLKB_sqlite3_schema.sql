@@ -25,6 +25,21 @@ CREATE TABLE cdko_sgrna_counts
           FOREIGN KEY(guide_1_id) REFERENCES cdko_experiment_design(sgRNA_id),
           FOREIGN KEY(guide_2_id) REFERENCES cdko_experiment_design(sgRNA_id)
           
+          );
+DROP TABLE IF EXISTS cdko_sgrna_replicate_counts;
+CREATE TABLE cdko_sgrna_replicate_counts
+          ([sgRNA_pair_id] INTEGER, 
+          [timepoint] TEXT NOT NULL,
+          [replicate_index] INTEGER NOT NULL,
+          [replicate_count] REAL,
+          PRIMARY KEY (sgRNA_pair_id, timepoint, replicate_index),
+          FOREIGN KEY(sgRNA_pair_id) REFERENCES cdko_sgrna_counts(sgRNA_pair_id)
+          );
+DROP TABLE IF EXISTS slkb_id_allocation;
+CREATE TABLE slkb_id_allocation
+          ([id_name] TEXT,
+          [next_id] INTEGER NOT NULL,
+          PRIMARY KEY (id_name)
           );
 DROP TABLE IF EXISTS cdko_original_sl_results;
 CREATE TABLE cdko_original_sl_results
@@ -82,6 +97,16 @@ CREATE TABLE gemini_score
           PRIMARY KEY (id),
           FOREIGN KEY(gene_pair_id) REFERENCES cdko_sgrna_counts(gene_pair_id)
           );
+DROP TABLE IF EXISTS gemini_native_score;
+CREATE TABLE gemini_native_score
+          ([id] INTEGER,
+          [gene_pair_id] INTEGER, 
+          [SL_score_Strong] REAL,
+          [SL_score_SensitiveLethality] REAL,
+          [SL_score_SensitiveRecovery] REAL,
+          PRIMARY KEY (id),
+          FOREIGN KEY(gene_pair_id) REFERENCES cdko_sgrna_counts(gene_pair_id)
+          );
 DROP TABLE IF EXISTS mageck_score;
 CREATE TABLE mageck_score
           ([id] INTEGER,
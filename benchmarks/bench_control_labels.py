@@ -0,0 +1,86 @@
+'''
+Benchmark of the target type classification and control matching (user-012): is_control_label and
+match_control_labels against the per row list comprehensions and the nested substring scan of the
+earlier prepare_study_for_export, on a synthetic counts table of 1M rows.
+
+    python benchmarks/bench_control_labels.py [--n_rows 1000000] [--n_genes 2000] [--n_controls 50]
+'''
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import SLKB
+
+
+def synthetic_counts(n_rows, n_genes, n_controls, seed = 0):
+    # gene pairs of a library with safe targeting controls, 10% of the targets are controls
+    rng = np.random.default_rng(seed)
+    genes = np.array(['GENE' + str(i) for i in range(n_genes)], dtype = object)
+    controls = np.array(['0SAFE-SAFE-' + str(i) for i in range(n_controls)], dtype = object)
+    labels = np.where(rng.random((n_rows, 2)) < 0.1, rng.choice(controls, (n_rows, 2)), rng.choice(genes, (n_rows, 2)))
+    return(pd.DataFrame({'gene_1': labels[:, 0], 'gene_2': labels[:, 1]}), list(controls))
+
+
+def old_target_types(counts_ref, study_controls):
+    # target type labelling of prepare_study_for_export, before user-012
+    sgRNA_true_pair_index = np.array([i for i in range(counts_ref.shape[0]) if (str(counts_ref["gene_1"].iloc[i]) not in study_controls) and (str(counts_ref["gene_2"].iloc[i]) not in study_controls) and (str(counts_ref["gene_1"].iloc[i]) != str(counts_ref["gene_2"].iloc[i]))])
+    sgRNA_control_pair_index = np.array([i for i in range(counts_ref.shape[0]) if (str(counts_ref["gene_1"].iloc[i]) in study_controls) and (str(counts_ref["gene_2"].iloc[i]) in study_controls)])
+    target_type = np.full(counts_ref.shape[0], 'Single', dtype = object)
+    target_type[sgRNA_true_pair_index] = 'Dual'
+    target_type[sgRNA_control_pair_index] = 'Control'
+    return(target_type)
+
+
+def new_target_types(counts_ref, study_controls):
+    gene_1_control = SLKB.is_control_label(counts_ref["gene_1"].values, study_controls)
+    gene_2_control = SLKB.is_control_label(counts_ref["gene_2"].values, study_controls)
+    sgRNA_true_pair_idx = (~gene_1_control) & (~gene_2_control) & (counts_ref["gene_1"].astype(str).values != counts_ref["gene_2"].astype(str).values)
+    sgRNA_control_pair_idx = gene_1_control & gene_2_control
+    return(np.select([sgRNA_true_pair_idx, sgRNA_control_pair_idx], ['Dual', 'Control'], 'Single').astype(object))
+
+
+def old_control_idx(score_ref, study_controls, can_control_be_substring):
+    # control removal of the scores in prepare_study_for_export, before user-012
+    control_idx = np.array([False] * score_ref.shape[0])
+    for curr_control in study_controls:
+        if can_control_be_substring:
+            control_idx = control_idx | np.array([True if curr_control in i else False for i in score_ref["gene_1"]]) | np.array([True if curr_control in i else False for i in score_ref["gene_2"]])
+        control_idx = control_idx | np.array([True if i in curr_control else False for i in score_ref["gene_1"]]) | np.array([True if i in curr_control else False for i in score_ref["gene_2"]])
+    return(control_idx)
+
+
+def new_control_idx(score_ref, study_controls, can_control_be_substring):
+    return(SLKB.match_control_labels(score_ref["gene_1"].values, study_controls, can_control_be_substring) | SLKB.match_control_labels(score_ref["gene_2"].values, study_controls, can_control_be_substring))
+
+
+def timed(function, *args):
+    start_time = time.perf_counter()
+    res = function(*args)
+    return(res, time.perf_counter() - start_time)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Benchmark of the control labelling.')
+    parser.add_argument('--n_rows', type = int, default = 1000000)
+    parser.add_argument('--n_genes', type = int, default = 2000)
+    parser.add_argument('--n_controls', type = int, default = 50)
+    args = parser.parse_args()
+
+    counts_ref, study_controls = synthetic_counts(args.n_rows, args.n_genes, args.n_controls)
+    print('Rows: ' + str(args.n_rows) + ', genes: ' + str(args.n_genes) + ', controls: ' + str(args.n_controls))
+
+    old_res, old_time = timed(old_target_types, counts_ref, study_controls)
+    new_res, new_time = timed(new_target_types, counts_ref, study_controls)
+    assert (old_res == new_res).all()
+    print('Target types: {:.2f}s -> {:.2f}s ({:.0f}x)'.format(old_time, new_time, old_time / new_time))
+
+    for can_control_be_substring in [True, False]:
+        old_res, old_time = timed(old_control_idx, counts_ref, study_controls, can_control_be_substring)
+        new_res, new_time = timed(new_control_idx, counts_ref, study_controls, can_control_be_substring)
+        assert (old_res == new_res).all()
+        print('Control removal (can_control_be_substring = {}): {:.2f}s -> {:.2f}s ({:.0f}x)'.format(can_control_be_substring, old_time, new_time, old_time / new_time))
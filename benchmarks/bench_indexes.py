@@ -0,0 +1,122 @@
+'''
+Benchmark of the secondary indexes (user-006): queries of the joined_counts and calculated_sl_table
+views on a sqlite3 database holding the demo study several times, without and with the indexes
+of create_SLKB_indexes.
+
+    python benchmarks/bench_indexes.py [--n_studies 10] [--repeat 3] [--db_loc bench_indexes.sqlite]
+'''
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import sqlalchemy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import SLKB
+
+pd.set_option('mode.chained_assignment', None)
+
+# controls and conditions of the demo study, as used in the pipeline notebook
+DEMO_CONTROLS = ['0SAFE', '0SAFE-SAFE-GE', '0SAFE-SAFE-SP', '0SAFE-SAFE-MP', '0SAFE-SAFE-U2',
+                 '0SAFE-SAFE-DTKP', '0SAFE-SAFE-ACOC', '0SAFE-SAFE-TMM', '0SAFE-SAFE-U1', '0SAFE-SAFE-U3']
+DEMO_CONDITIONS = [['T0_1', 'T0_2'], ['T12_1', 'T12_2']]
+
+# score tables of the calculated_sl_table view
+VIEW_SCORE_TABLES = ['gemini_score', 'median_b_score', 'median_nb_score', 'sgrna_derived_b_score',
+                     'sgrna_derived_nb_score', 'horlbeck_score', 'mageck_score']
+
+
+def create_benchmark_db(db_loc, n_studies):
+    # the demo study, inserted once for each study name, with random scores for every gene pair
+    if os.path.exists(db_loc):
+        os.remove(db_loc)
+    engine = sqlalchemy.create_engine('sqlite:///' + db_loc)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        SLKB.create_SLKB(engine)
+        demo = SLKB.load_demo_data()
+        db_inserts = SLKB.prepare_study_for_export(sequence_ref = demo['sequence_ref'].copy(), counts_ref = demo['counts_ref'].copy(),
+                                                   score_ref = demo['score_ref'].copy(), study_controls = DEMO_CONTROLS, study_conditions = DEMO_CONDITIONS)
+        for i in range(n_studies):
+            study_inserts = {key: value.copy() for key, value in db_inserts.items()}
+            for table in study_inserts.values():
+                table['study_origin'] = 'STUDY_' + str(i)
+            SLKB.insert_study_to_db(engine, study_inserts, bulk_insert = True)
+
+    rng = np.random.default_rng(0)
+    with engine.begin() as transaction:
+        gene_pair_ids = pd.read_sql_query(con = transaction, sql = sqlalchemy.text('SELECT DISTINCT gene_pair_id FROM cdko_original_sl_results WHERE gene_pair_id IS NOT NULL'))['gene_pair_id'].values
+        for table in VIEW_SCORE_TABLES:
+            columns = [i['name'] for i in sqlalchemy.inspect(transaction).get_columns(table) if i['name'] not in ('id', 'gene_pair_id')]
+            scores = pd.DataFrame(rng.normal(size = (len(gene_pair_ids), len(columns))), columns = columns)
+            scores.insert(0, 'gene_pair_id', gene_pair_ids)
+            scores.insert(0, 'id', np.arange(len(gene_pair_ids)))
+            SLKB.write_table_to_db(scores, table, transaction, bulk_insert = True)
+
+    return(engine)
+
+
+def drop_SLKB_indexes(engine):
+    with engine.begin() as transaction:
+        for table, columns in SLKB.SLKB_INDEXES:
+            transaction.execute(sqlalchemy.text('DROP INDEX IF EXISTS ' + '_'.join(['ix', table] + columns)))
+
+
+def benchmark_queries(engine, repeat):
+    # best of the repeats, as the queries are read from a warm cache
+    with engine.connect() as connection:
+        gene_pair_ids = pd.read_sql_query(con = connection, sql = sqlalchemy.text("SELECT DISTINCT gene_pair_id FROM cdko_sgrna_counts WHERE study_origin = 'STUDY_0'"))['gene_pair_id']
+
+    queries = {'joined_counts, all studies': ('SELECT * FROM joined_counts', {}),
+               'joined_counts, one study (load_study_counts)': ('SELECT * FROM joined_counts WHERE study_origin = :curr_study AND cell_line_origin = :curr_cl', {'curr_study': 'STUDY_0', 'curr_cl': '22RV1'}),
+               'calculated_sl_table, all studies': ('SELECT * FROM calculated_sl_table', {}),
+               'calculated_sl_table, one study': ('SELECT * FROM calculated_sl_table WHERE study_origin = :curr_study', {'curr_study': 'STUDY_0'})}
+
+    timings = {}
+    for name, (query, params) in queries.items():
+        curr_timings = []
+        for _ in range(repeat):
+            start_time = time.perf_counter()
+            with engine.connect() as connection:
+                n_rows = connection.execute(sqlalchemy.text(query), params).fetchall().__len__()
+            curr_timings.append(time.perf_counter() - start_time)
+        timings[name] = (min(curr_timings), n_rows)
+
+    curr_timings = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            SLKB.check_if_added_to_table(pd.DataFrame({'gene_pair_id': gene_pair_ids}), 'mageck_score', engine)
+        curr_timings.append(time.perf_counter() - start_time)
+    timings['check_if_added_to_table, one study'] = (min(curr_timings), len(gene_pair_ids))
+
+    return(timings)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Benchmark of the SLKB secondary indexes.')
+    parser.add_argument('--n_studies', type = int, default = 10)
+    parser.add_argument('--repeat', type = int, default = 3)
+    parser.add_argument('--db_loc', default = 'bench_indexes.sqlite')
+    args = parser.parse_args()
+
+    print('Creating the database with ' + str(args.n_studies) + ' copies of the demo study...')
+    engine = create_benchmark_db(args.db_loc, args.n_studies)
+
+    drop_SLKB_indexes(engine)
+    before = benchmark_queries(engine, args.repeat)
+    with contextlib.redirect_stdout(io.StringIO()):
+        SLKB.create_SLKB_indexes(engine)
+    after = benchmark_queries(engine, args.repeat)
+
+    for name in before:
+        assert before[name][1] == after[name][1]
+        print('{}: {:.3f}s -> {:.3f}s ({:.1f}x, {} rows)'.format(name, before[name][0], after[name][0], before[name][0] / after[name][0], before[name][1]))
+
+    engine.dispose()
+    os.remove(args.db_loc)
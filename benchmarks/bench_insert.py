@@ -0,0 +1,76 @@
+'''
+Benchmark of the bulk insert mode (user-010): insert_study_to_db with the default insert and with
+bulk_insert = True, on sqlite3 databases that receive the demo study 100 times (under 100 study names).
+
+    python benchmarks/bench_insert.py [--n_copies 100] [--save_loc .]
+'''
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+import pandas as pd
+import sqlalchemy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import SLKB
+
+pd.set_option('mode.chained_assignment', None)
+
+# controls and conditions of the demo study, as used in the pipeline notebook
+DEMO_CONTROLS = ['0SAFE', '0SAFE-SAFE-GE', '0SAFE-SAFE-SP', '0SAFE-SAFE-MP', '0SAFE-SAFE-U2',
+                 '0SAFE-SAFE-DTKP', '0SAFE-SAFE-ACOC', '0SAFE-SAFE-TMM', '0SAFE-SAFE-U1', '0SAFE-SAFE-U3']
+DEMO_CONDITIONS = [['T0_1', 'T0_2'], ['T12_1', 'T12_2']]
+
+
+def insert_copies(db_loc, db_inserts, n_copies, bulk_insert):
+    # the time spent in insert_study_to_db, for all copies
+    if os.path.exists(db_loc):
+        os.remove(db_loc)
+    engine = sqlalchemy.create_engine('sqlite:///' + db_loc)
+    with contextlib.redirect_stdout(io.StringIO()):
+        SLKB.create_SLKB(engine)
+
+    insert_time = 0
+    for i in range(n_copies):
+        study_inserts = {key: value.copy() for key, value in db_inserts.items()}
+        for table in study_inserts.values():
+            table['study_origin'] = 'STUDY_' + str(i)
+
+        start_time = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            SLKB.insert_study_to_db(engine, study_inserts, bulk_insert = bulk_insert)
+        insert_time += time.perf_counter() - start_time
+
+    return(engine, insert_time)
+
+
+def table_sizes(engine):
+    with engine.connect() as connection:
+        return({table: connection.execute(sqlalchemy.text('SELECT COUNT(*) FROM ' + table)).scalar()
+                for table in ['cdko_experiment_design', 'cdko_sgrna_counts', 'cdko_sgrna_replicate_counts', 'cdko_original_sl_results']})
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Benchmark of the bulk insert mode.')
+    parser.add_argument('--n_copies', type = int, default = 100)
+    parser.add_argument('--save_loc', default = '.')
+    args = parser.parse_args()
+
+    demo = SLKB.load_demo_data()
+    with contextlib.redirect_stdout(io.StringIO()):
+        db_inserts = SLKB.prepare_study_for_export(sequence_ref = demo['sequence_ref'].copy(), counts_ref = demo['counts_ref'].copy(),
+                                                   score_ref = demo['score_ref'].copy(), study_controls = DEMO_CONTROLS, study_conditions = DEMO_CONDITIONS)
+
+    timings = {}
+    for bulk_insert in [False, True]:
+        db_loc = os.path.join(args.save_loc, 'bench_insert_' + ('bulk' if bulk_insert else 'default') + '.sqlite')
+        engine, timings[bulk_insert] = insert_copies(db_loc, db_inserts, args.n_copies, bulk_insert)
+        print(('Bulk' if bulk_insert else 'Default') + ' insert of ' + str(args.n_copies) + ' copies: {:.1f}s'.format(timings[bulk_insert]))
+        print(table_sizes(engine))
+        engine.dispose()
+        os.remove(db_loc)
+
+    print('Speedup: {:.1f}x'.format(timings[False] / timings[True]))
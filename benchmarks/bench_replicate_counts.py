@@ -0,0 +1,82 @@
+'''
+Benchmark of the replicate count parsing (user-004): the columnar parser and joiner against the
+row by row split/join of the earlier get_raw_counts and prepare_study_for_export, on a synthetic
+library of 500k constructs.
+
+    python benchmarks/bench_replicate_counts.py [--n_constructs 500000] [--n_replicates 6]
+'''
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import SLKB
+
+
+def synthetic_counts(n_constructs, n_replicates, seed = 0):
+    # ';' joined counts, as in the count_replicates column of the counts template
+    rng = np.random.default_rng(seed)
+    counts = rng.negative_binomial(5, 0.02, size = (n_constructs, n_replicates)).astype(np.float64)
+    return(pd.Series(SLKB.join_replicate_counts(counts)))
+
+
+def old_check_repeated_constructs(x, index_loc):
+    # per row version of check_repeated_constructs, before user-004
+    if len(x) < max(index_loc):
+        sub = index_loc[index_loc < len(x)]
+        return(x[sub])
+    else:
+        return(x[index_loc])
+
+
+def old_split_timepoints(count_replicates, t_0_index, t_end_index):
+    # prepare_study_for_export, before user-004
+    replicate_sep = count_replicates.apply(lambda x: np.array(x.split(";"), dtype = np.float64))
+    t_0_comb = replicate_sep.apply(lambda x: old_check_repeated_constructs(x, t_0_index)).apply(lambda x: ';'.join(x.astype(np.str_)))
+    t_end_comb = replicate_sep.apply(lambda x: old_check_repeated_constructs(x, t_end_index)).apply(lambda x: ';'.join(x.astype(np.str_)))
+    return(t_0_comb, t_end_comb)
+
+
+def new_split_timepoints(count_replicates, t_0_index, t_end_index):
+    replicate_sep = SLKB.parse_replicate_counts(count_replicates)
+    t_0_comb = SLKB.join_replicate_counts(SLKB.check_repeated_constructs(replicate_sep, t_0_index))
+    t_end_comb = SLKB.join_replicate_counts(SLKB.check_repeated_constructs(replicate_sep, t_end_index))
+    return(t_0_comb, t_end_comb)
+
+
+def old_parse(timepoint_counts):
+    # get_raw_counts, before user-004
+    parsed = timepoint_counts.apply(lambda x: np.array(x.split(";"), dtype = np.float64))
+    return(pd.DataFrame(data = parsed.tolist(), index = parsed.index).values)
+
+
+def timed(function, *args):
+    start_time = time.perf_counter()
+    res = function(*args)
+    return(res, time.perf_counter() - start_time)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Benchmark of the replicate count parsing.')
+    parser.add_argument('--n_constructs', type = int, default = 500000)
+    parser.add_argument('--n_replicates', type = int, default = 6)
+    args = parser.parse_args()
+
+    count_replicates = synthetic_counts(args.n_constructs, args.n_replicates)
+    t_0_index = np.arange(args.n_replicates // 2)
+    t_end_index = np.arange(args.n_replicates // 2, args.n_replicates)
+    print('Constructs: ' + str(args.n_constructs) + ', replicates: ' + str(args.n_replicates))
+
+    (old_t_0, old_t_end), old_time = timed(old_split_timepoints, count_replicates, t_0_index, t_end_index)
+    (new_t_0, new_t_end), new_time = timed(new_split_timepoints, count_replicates, t_0_index, t_end_index)
+    assert (old_t_0.values == new_t_0).all() and (old_t_end.values == new_t_end).all()
+    print('Split T0 and TEnd counts (prepare_study_for_export): {:.2f}s -> {:.2f}s ({:.1f}x)'.format(old_time, new_time, old_time / new_time))
+
+    old_counts, old_time = timed(old_parse, pd.Series(new_t_0))
+    new_counts, new_time = timed(SLKB.parse_replicate_counts, pd.Series(new_t_0))
+    assert np.array_equal(old_counts, new_counts)
+    print('Parse timepoint counts (get_raw_counts): {:.2f}s -> {:.2f}s ({:.1f}x)'.format(old_time, new_time, old_time / new_time))
@@ -14,7 +14,8 @@ DEPENDENCIES = ['pandas==1.5.3',
 'ipython-genutils==0.2.0',
 'ipywidgets==7.6.5',
 'jupyterlab==3.3.2',
-'mysql-connector-python==8.0.29']
+'mysql-connector-python==8.0.29',
+'pyarrow==11.0.0']
 
 CURDIR = os.path.abspath(os.path.dirname(__file__))
 
@@ -0,0 +1,83 @@
+import contextlib
+import io
+import os
+import shutil
+
+import pandas as pd
+import pytest
+import sqlalchemy
+
+import SLKB
+
+pd.set_option('mode.chained_assignment', None)
+
+# controls and conditions of the demo study, as used in the pipeline notebook
+DEMO_STUDY = '36060092'
+DEMO_CELL_LINE = '22RV1'
+DEMO_CONTROLS = ['0SAFE', '0SAFE-SAFE-GE', '0SAFE-SAFE-SP', '0SAFE-SAFE-MP', '0SAFE-SAFE-U2',
+                 '0SAFE-SAFE-DTKP', '0SAFE-SAFE-ACOC', '0SAFE-SAFE-TMM', '0SAFE-SAFE-U1', '0SAFE-SAFE-U3']
+DEMO_CONDITIONS = [['T0_1', 'T0_2'], ['T12_1', 'T12_2']]
+
+FIXTURE_PATH = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def quiet(function, *args, **kwargs):
+    '''
+    Helper function, runs an SLKB function without its progress messages.
+    '''
+    with contextlib.redirect_stdout(io.StringIO()):
+        return(function(*args, **kwargs))
+
+
+def new_sqlite_db(save_loc, name='db.sqlite'):
+    '''
+    Helper function, creates an empty SLKB sqlite database.
+    '''
+    engine = sqlalchemy.create_engine('sqlite:///' + os.path.join(str(save_loc), name))
+    quiet(SLKB.create_SLKB, engine=engine, db_type='sqlite3')
+    return(engine)
+
+
+def prepare_demo_study():
+    '''
+    Helper function, prepares the demo study for insertion.
+    '''
+    demo = SLKB.load_demo_data()
+    return(quiet(SLKB.prepare_study_for_export,
+                 sequence_ref=demo['sequence_ref'].copy(),
+                 counts_ref=demo['counts_ref'].copy(),
+                 score_ref=demo['score_ref'].copy(),
+                 study_controls=DEMO_CONTROLS,
+                 study_conditions=DEMO_CONDITIONS))
+
+
+def read_table(engine, table):
+    with engine.connect() as conn:
+        return(pd.read_sql_query(con=conn, sql=sqlalchemy.text('SELECT * FROM ' + table)))
+
+
+@pytest.fixture(scope='session')
+def demo_insert():
+    return(prepare_demo_study())
+
+
+@pytest.fixture(scope='session')
+def demo_db(tmp_path_factory, demo_insert):
+    save_loc = tmp_path_factory.mktemp('demo_db')
+    engine = new_sqlite_db(save_loc)
+    quiet(SLKB.insert_study_to_db, engine, {key: value.copy() for key, value in demo_insert.items()})
+    return(engine)
+
+
+@pytest.fixture(scope='session')
+def demo_counts(demo_db):
+    with demo_db.connect() as conn:
+        return(pd.read_sql_query(con=conn, sql=sqlalchemy.text('SELECT * from joined_counts'), index_col='sgRNA_pair_id'))
+
+
+@pytest.fixture
+def scratch_db(demo_db, tmp_path):
+    # a writable copy of the demo database
+    db_loc = os.path.join(str(tmp_path), 'scratch.sqlite')
+    shutil.copyfile(demo_db.url.database, db_loc)
+    return(sqlalchemy.create_engine('sqlite:///' + db_loc))
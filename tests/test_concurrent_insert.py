@@ -0,0 +1,92 @@
+import contextlib
+import io
+import multiprocessing
+
+import pandas as pd
+import pytest
+import sqlalchemy
+
+import SLKB
+
+from conftest import new_sqlite_db, read_table
+
+# tables with their primary key, and the prepared table inserted to them
+ID_TABLES = [('cdko_experiment_design', 'sgRNA_id', 'sequence_ref'),
+             ('cdko_sgrna_counts', 'sgRNA_pair_id', 'counts_ref'),
+             ('cdko_original_sl_results', 'id', 'score_ref')]
+
+
+def insert_renamed_study(db_loc, db_inserts, study_origin, start_event):
+    # a copy of the demo study under another study name
+    db_inserts = {key: value.copy() for key, value in db_inserts.items()}
+    for table in db_inserts.values():
+        table['study_origin'] = study_origin
+
+    # concurrent writers wait on the sqlite lock rather than failing
+    engine = sqlalchemy.create_engine('sqlite:///' + db_loc, connect_args = {'timeout': 300})
+    start_event.wait()
+    with contextlib.redirect_stdout(io.StringIO()):
+        SLKB.insert_study_to_db(engine, db_inserts)
+
+
+def test_concurrent_inserts_have_unique_ids(demo_insert, tmp_path):
+    engine = new_sqlite_db(tmp_path)
+    db_loc = engine.url.database
+
+    context = multiprocessing.get_context('spawn')
+    start_event = context.Event()
+    processes = [context.Process(target = insert_renamed_study, args = (db_loc, demo_insert, study_origin, start_event)) for study_origin in ['STUDY_A', 'STUDY_B']]
+    for process in processes:
+        process.start()
+    start_event.set()
+    for process in processes:
+        process.join(timeout = 600)
+        assert process.exitcode == 0
+
+    for table, key, source in ID_TABLES:
+        records = read_table(engine, table)
+        assert set(records['study_origin']) == {'STUDY_A', 'STUDY_B'}
+        assert records.shape[0] == 2 * demo_insert[source].shape[0]
+        assert records[key].is_unique
+
+    # gene pairs of the two studies do not share IDs
+    counts = read_table(engine, 'cdko_sgrna_counts')
+    assert counts.groupby('gene_pair_id')['study_origin'].nunique().max() == 1
+    scores = read_table(engine, 'cdko_original_sl_results').dropna(subset = ['gene_pair_id'])
+    pairs = pd.concat([counts[['gene_pair_id', 'study_origin']], scores[['gene_pair_id', 'study_origin']]]).drop_duplicates()
+    assert pairs['gene_pair_id'].is_unique
+
+    # the counts reference the guides of their own study
+    guides = read_table(engine, 'cdko_experiment_design').set_index('sgRNA_id')['study_origin']
+    assert (counts['guide_1_id'].map(guides) == counts['study_origin']).all()
+
+
+def test_id_counters_are_started_before_the_inserts(scratch_db, demo_insert, tmp_path):
+    engine = new_sqlite_db(tmp_path)
+    SLKB.create_id_allocation_table(engine)
+
+    # counters start after the IDs in the database, and are not started again
+    counters = read_table(engine, 'slkb_id_allocation').set_index('id_name')['next_id']
+    assert set(counters.index) == set(SLKB.STUDY_ID_COUNTERS)
+    assert (counters == 0).all()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        SLKB.insert_study_to_db(engine, {key: value.copy() for key, value in demo_insert.items()})
+    counters = read_table(engine, 'slkb_id_allocation').set_index('id_name')['next_id']
+    SLKB.create_id_allocation_table(engine)
+    assert read_table(engine, 'slkb_id_allocation').set_index('id_name')['next_id'].equals(counters)
+    assert counters['cdko_sgrna_counts.sgRNA_pair_id'] == read_table(engine, 'cdko_sgrna_counts')['sgRNA_pair_id'].max() + 1
+
+    # a database filled before the allocation table existed
+    with scratch_db.begin() as transaction:
+        transaction.execute(sqlalchemy.text('DELETE FROM slkb_id_allocation'))
+    SLKB.create_id_allocation_table(scratch_db)
+    counters = read_table(scratch_db, 'slkb_id_allocation').set_index('id_name')['next_id']
+    assert counters['gene_pair_id'] == read_table(scratch_db, 'cdko_sgrna_counts')['gene_pair_id'].max() + 1
+
+
+def test_allocate_ids_needs_a_started_counter(tmp_path):
+    engine = new_sqlite_db(tmp_path)
+    with engine.begin() as transaction:
+        with pytest.raises(ValueError):
+            SLKB.allocate_ids(transaction, 'mageck_score.id', 10)
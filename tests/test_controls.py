@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+import SLKB
+
+# controls with overlapping names and regex metacharacters
+STUDY_CONTROLS = ['0SAFE', '0SAFE-SAFE-GE', 'NONTARGETING', 'CTRL.1', 'A+B', '(NEG)', 'AAVS1']
+LABELS = ['0SAFE', '0SAFE-SAFE-GE', 'SAFE', '0SAFE-SAFE', '-SAFE-', 'GE', '', 'S',
+          'NONTARGETING_12', 'XNONTARGETING', 'NONTARGET', 'TARGETING',
+          'CTRL.1', 'CTRLX1', 'CTRL', 'PRE_CTRL.1_POST',
+          'A+B', 'AB', 'AAB', 'A+BC', '(NEG)', 'NEG', '(NEG', 'X(NEG)Y',
+          'AAVS1', 'AAVS', 'AAVS12', 'KRAS', 'TP53', 'BRCA1', 'AKT3']
+
+
+def old_control_idx(labels, study_controls, can_control_be_substring):
+    # control removal of prepare_study_for_export, before user-012
+    control_idx = np.array([False] * len(labels))
+    for curr_control in study_controls:
+        if can_control_be_substring:
+            control_idx = control_idx | np.array([True if curr_control in i else False for i in labels])
+        control_idx = control_idx | np.array([True if i in curr_control else False for i in labels])
+    return(control_idx)
+
+
+@pytest.mark.parametrize('can_control_be_substring', [True, False])
+def test_match_control_labels_matches_old_scan(can_control_be_substring):
+    rng = np.random.default_rng(0)
+    labels = np.array(LABELS + list(rng.choice(LABELS, 500)), dtype = object)
+
+    expected = old_control_idx(labels, STUDY_CONTROLS, can_control_be_substring)
+    observed = SLKB.match_control_labels(labels, STUDY_CONTROLS, can_control_be_substring)
+
+    assert observed.dtype == bool
+    assert (observed == expected).all()
+
+
+def test_match_control_labels_without_controls():
+    assert not SLKB.match_control_labels(np.array(LABELS, dtype = object), None).any()
+    assert not SLKB.match_control_labels(np.array(LABELS, dtype = object), []).any()
+
+
+def test_is_control_label_matches_old_membership():
+    # target type and sequence control labelling of prepare_study_for_export, before user-012
+    labels = np.array(LABELS + [None, 12, np.nan], dtype = object)
+    expected = np.array([True if str(i) in STUDY_CONTROLS else False for i in labels])
+
+    assert (SLKB.is_control_label(labels, STUDY_CONTROLS) == expected).all()
+    assert not SLKB.is_control_label(labels, None).any()
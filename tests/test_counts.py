@@ -0,0 +1,23 @@
+import numpy as np
+
+import SLKB
+
+
+def test_join_replicate_counts_matches_str():
+    counts = np.array([[1.0, 25.0, np.nan],
+                       [0.5, 1e20, 3.0],
+                       [np.nan, np.nan, np.nan],
+                       [7.0, 7.0, 7.0]])
+
+    joined = SLKB.join_replicate_counts(counts)
+
+    assert list(joined) == ['1.0;25.0', '0.5;1e+20;3.0', '', '7.0;7.0;7.0']
+
+
+def test_join_replicate_counts_round_trip():
+    joined = np.array(['12.0;3.0', '4.0', '0.0;1.5;2.0'], dtype = object)
+
+    counts = SLKB.parse_replicate_counts(joined)
+
+    assert list(SLKB.join_replicate_counts(counts)) == list(joined)
+    assert list(SLKB.join_replicate_counts(counts[:, :0])) == ['', '', '']
@@ -0,0 +1,70 @@
+import json
+import os
+import stat
+import time
+
+import SLKB
+
+from conftest import DEMO_CELL_LINE, DEMO_STUDY, quiet
+
+
+def write_executable(file_loc, script):
+    with open(file_loc, 'w') as handle:
+        handle.write(script)
+    os.chmod(file_loc, os.stat(file_loc).st_mode | stat.S_IEXEC)
+    return(file_loc)
+
+
+def is_running(pid):
+    # killed children of the job may be left as zombies, if nothing reaps them
+    try:
+        with open('/proc/' + str(pid) + '/stat') as handle:
+            return(handle.read().split(')')[-1].split()[0] != 'Z')
+    except FileNotFoundError:
+        return(False)
+
+
+def test_mageck_timeout_stops_the_job(demo_counts, tmp_path, monkeypatch):
+    # a stand-in for mageck that starts a child and never finishes
+    pid_loc = str(tmp_path / 'child.pid')
+    mageck = write_executable(str(tmp_path / 'mageck'), '#!/bin/sh\necho "mageck started"\nsleep 60 &\necho $! > "' + pid_loc + '"\nwait\n')
+    monkeypatch.setattr(SLKB, 'MAGECK_EXECUTABLE', mageck)
+
+    start_time = time.time()
+    res = quiet(SLKB.run_mageck_score, demo_counts.copy(), curr_study = DEMO_STUDY, curr_cl = DEMO_CELL_LINE, store_loc = str(tmp_path), timeout = 2)
+    wall_time = time.time() - start_time
+
+    # the log lines are returned in place of the scores
+    assert isinstance(res, list)
+    assert 'mageck started' in res
+    assert wall_time < 30
+
+    with open(str(tmp_path / 'MAGECK_Files' / 'jobs_manifest.jsonl')) as handle:
+        jobs = [json.loads(i) for i in handle]
+    assert [job['status'] for job in jobs] == ['timeout']
+    assert jobs[0]['name'] == 'mageck ' + DEMO_STUDY + ', ' + DEMO_CELL_LINE
+
+    # the child of the job is stopped with it
+    if os.name == 'posix':
+        with open(pid_loc) as handle:
+            child_pid = int(handle.read())
+        assert not is_running(child_pid)
+
+
+class StubProcess:
+    pid = -1
+
+    def __init__(self):
+        self.killed = False
+
+    def kill(self):
+        self.killed = True
+
+
+def test_stop_external_job_without_process_groups(monkeypatch):
+    monkeypatch.setattr(SLKB.os, 'name', 'nt')
+    process = StubProcess()
+
+    SLKB.stop_external_job(process)
+
+    assert process.killed
@@ -0,0 +1,78 @@
+import os
+import stat
+import sys
+
+import SLKB
+
+from conftest import DEMO_CELL_LINE, DEMO_STUDY, quiet
+
+# a stand-in for Rscript GEMINI.R: scores its directory, or in batch mode the directories of the manifest, except the failing ones
+RSCRIPT_STUB = '''#!{python}
+import os, sys
+import pandas as pd
+args = sys.argv[sys.argv.index('--args') + 1:]
+save_locs = args[:1]
+if args[0] == '--manifest':
+    print('workers ' + args[2], flush = True)
+    save_locs = open(args[1]).read().split()
+for save_loc in save_locs:
+    if 'FAILING' in save_loc:
+        print('GEMINI failed for ' + save_loc, flush = True)
+        continue
+    annotation = pd.read_csv(os.path.join(save_loc, 'guide_gene_annotation.csv'))
+    pairs = sorted(set(annotation['Gene 1'] + ';' + annotation['Gene 2']))
+    pd.DataFrame({{'strong': 1.0, 'sl': 2.0, 'sr': 3.0}}, index = pairs).to_csv(os.path.join(save_loc, 'GEMINI_Scores.csv'))
+    print('GEMINI scored ' + save_loc, flush = True)
+'''
+
+
+def write_stub_rscript(tmp_path, monkeypatch):
+    rscript = str(tmp_path / 'Rscript')
+    with open(rscript, 'w') as handle:
+        handle.write(RSCRIPT_STUB.format(python = sys.executable))
+    os.chmod(rscript, os.stat(rscript).st_mode | stat.S_IEXEC)
+    monkeypatch.setattr(SLKB, 'RSCRIPT_EXECUTABLE', rscript)
+
+
+def test_gemini_batch_partial_failure(demo_counts, tmp_path, monkeypatch):
+    write_stub_rscript(tmp_path, monkeypatch)
+
+    store_loc = str(tmp_path / 'store')
+    partitions = [(DEMO_STUDY, DEMO_CELL_LINE, demo_counts.copy()),
+                  ('FAILING', DEMO_CELL_LINE, demo_counts.copy())]
+    # replicate_counts is a parameter of run_gemini_score, not of the batch
+    method_params = {'gemini': {'store_loc': store_loc, 'n_workers': 2, 'replicate_counts': None}}
+
+    task_results = quiet(SLKB.run_gemini_batch_task, partitions, method_params)
+
+    (method, scored, _), = task_results[0]
+    assert method == 'gemini'
+    assert isinstance(scored, dict)
+    assert scored['GEMINI_SCORE'].shape[0] > 0
+    assert (scored['GEMINI_SCORE']['SL_score_SensitiveLethality'] == 2.0).all()
+
+    # the failing study gets the log of the batch
+    (method, failed, _), = task_results[1]
+    assert isinstance(failed, list)
+    assert 'workers 2' in failed
+    assert 'GEMINI failed for ' + os.path.join('GEMINI_Files', 'FAILING', DEMO_CELL_LINE) in failed
+    assert 'GEMINI scored ' + os.path.join('GEMINI_Files', DEMO_STUDY, DEMO_CELL_LINE) in failed
+
+    # the scored study is cached, the failing one is run again
+    batch_results = quiet(SLKB.run_gemini_batch, partitions[:1], store_loc = store_loc)
+    assert isinstance(batch_results[(DEMO_STUDY, DEMO_CELL_LINE)], dict)
+    logs = [i for i in os.listdir(os.path.join(store_loc, 'GEMINI_Files')) if i.endswith('.log')]
+    assert len(logs) == 1
+
+
+def test_gemini_relative_store_loc(demo_counts, tmp_path, monkeypatch):
+    write_stub_rscript(tmp_path, monkeypatch)
+    monkeypatch.chdir(tmp_path)
+
+    res = quiet(SLKB.run_gemini_score, demo_counts.copy(), curr_study = DEMO_STUDY, curr_cl = DEMO_CELL_LINE, store_loc = 'single')
+    assert isinstance(res, dict)
+    assert res['GEMINI_SCORE'].shape[0] > 0
+
+    batch_results = quiet(SLKB.run_gemini_batch, [(DEMO_STUDY, DEMO_CELL_LINE, demo_counts.copy())], store_loc = 'batch')
+    assert isinstance(batch_results[(DEMO_STUDY, DEMO_CELL_LINE)], dict)
+    assert os.path.exists(os.path.join('batch', 'GEMINI_Files', DEMO_STUDY, DEMO_CELL_LINE, 'GEMINI_Scores.csv'))
@@ -0,0 +1,98 @@
+import filecmp
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+import sqlalchemy
+
+import SLKB
+
+from conftest import DEMO_CELL_LINE, DEMO_STUDY, FIXTURE_PATH, quiet, read_table
+
+# GEMINI.R inputs of a subset of the demo study, six genes and the controls. To store the GEMINI.R
+# scores of the subset, run from the repository root (writes GEMINI_Scores.csv next to the inputs):
+#   Rscript --vanilla SLKB/files/GEMINI.R --args tests/fixtures/gemini_demo_subset
+GEMINI_FIXTURE = os.path.join(FIXTURE_PATH, 'gemini_demo_subset')
+GEMINI_SUBSET_GENES = ['AKT3', 'AR', 'PARP1', 'PIK3CA', 'PSMB5', 'TOP2A', 'CONTROL']
+
+# largest difference allowed between the native and the stored GEMINI.R scores
+GEMINI_TOLERANCE = 0.05
+
+
+def gemini_subset(demo_counts):
+    subset = demo_counts['sgRNA_target_name_g1'].isin(GEMINI_SUBSET_GENES) & demo_counts['sgRNA_target_name_g2'].isin(GEMINI_SUBSET_GENES)
+    return(demo_counts.loc[subset].copy())
+
+
+def test_gemini_fixture_matches_subset(demo_counts, tmp_path):
+    # the stored inputs are those of the subset, so stored GEMINI.R scores belong to it
+    SLKB.write_gemini_inputs(gemini_subset(demo_counts), str(tmp_path))
+
+    for file_name in ['sequences.csv', 'guide_gene_annotation.csv', 'counts.csv']:
+        assert filecmp.cmp(os.path.join(str(tmp_path), file_name), os.path.join(GEMINI_FIXTURE, file_name), shallow = False)
+
+
+def test_gemini_native_matches_gemini_r(demo_counts, tmp_path):
+    scores_loc = os.path.join(GEMINI_FIXTURE, 'GEMINI_Scores.csv')
+    if not os.path.exists(scores_loc):
+        pytest.skip('no stored GEMINI.R scores for the fixture, see the comment above GEMINI_FIXTURE')
+
+    expected = SLKB.format_gemini_scores(pd.read_csv(scores_loc, index_col = 0))['GEMINI_SCORE']
+    observed = quiet(SLKB.run_gemini_native_score, gemini_subset(demo_counts), curr_study = DEMO_STUDY, curr_cl = DEMO_CELL_LINE, store_loc = str(tmp_path))['GEMINI_SCORE']
+
+    assert sorted(observed.index) == sorted(expected.index)
+    observed = observed.loc[expected.index]
+    for col in ['SL_score_Strong', 'SL_score_SensitiveLethality', 'SL_score_SensitiveRecovery']:
+        assert observed[col].values == pytest.approx(expected[col].values, abs = GEMINI_TOLERANCE)
+
+
+def test_gemini_native_recovers_planted_interactions():
+    # a screen of 30 genes and a control, three guides each, with planted interactions between a few gene pairs
+    rng = np.random.default_rng(0)
+    genes = ['G' + str(i).zfill(2) for i in range(30)] + ['CONTROL']
+    guides = [(gene, gene + '_' + str(i)) for gene in genes for i in range(3)]
+    efficacy = {guide: 1.0 if rng.random() < 0.8 else 0.2 for _, guide in guides}
+    effect = {gene: rng.normal(0, 1) if rng.random() < 0.3 else rng.normal(0, 0.1) for gene in genes}
+    effect['CONTROL'] = 0
+
+    pairs = [(a, b) for a in range(len(guides)) for b in range(a + 1, len(guides))]
+    genes_1, genes_2 = np.array([guides[a][0] for a, _ in pairs]), np.array([guides[b][0] for _, b in pairs])
+    guides_1, guides_2 = np.array([guides[a][1] for a, _ in pairs]), np.array([guides[b][1] for _, b in pairs])
+
+    gene_pairs = sorted(set(zip(genes_1, genes_2)))
+    planted = {pair: rng.choice([-2, 2]) for pair in gene_pairs if 'CONTROL' not in pair and pair[0] != pair[1] and rng.random() < 0.05}
+    interaction = np.array([planted.get(pair, 0) for pair in zip(genes_1, genes_2)])
+
+    fit = np.array([efficacy[i] for i in guides_1]) * np.array([effect[i] for i in genes_1]) + np.array([efficacy[i] for i in guides_2]) * np.array([effect[i] for i in genes_2]) + interaction
+    lfc = fit[:, None] + rng.normal(0, 0.3, (len(fit), 3))
+
+    scores = quiet(SLKB.calculate_gemini_scores, lfc, guides_1, guides_2, genes_1, genes_2)
+
+    # the interactions are recovered by either score, as -s or s
+    estimated = (scores['SensitiveRecovery'] - scores['SensitiveLethality']).abs()
+    top_pairs = set(estimated.sort_values(ascending = False).index[:len(planted)])
+    recovered = len(top_pairs.intersection([a + ';' + b for a, b in planted]))
+    assert len(planted) > 5
+    assert recovered >= 0.9 * len(planted)
+
+
+def test_gemini_native_has_its_own_table(scratch_db, tmp_path):
+    # not a method of run_all_scores until it is validated against GEMINI.R
+    assert 'gemini_native' not in SLKB.SCORING_METHODS
+    assert quiet(SLKB.run_all_scores, scratch_db, methods = ['gemini_native'], n_jobs = 1) is None
+
+    # as a database created with an earlier schema
+    with scratch_db.begin() as transaction:
+        transaction.execute(sqlalchemy.text('DROP TABLE gemini_native_score'))
+    SLKB.create_gemini_native_table(scratch_db)
+
+    curr_counts = read_table(scratch_db, 'joined_counts').set_index('sgRNA_pair_id')
+    res = quiet(SLKB.run_gemini_native_score, curr_counts.copy(), curr_study = DEMO_STUDY, curr_cl = DEMO_CELL_LINE, store_loc = str(tmp_path))
+    quiet(SLKB.add_table_to_db, curr_counts.copy(), res['GEMINI_SCORE'].copy(), 'gemini_native_score', scratch_db)
+
+    assert read_table(scratch_db, 'gemini_native_score').shape[0] > 0
+    assert read_table(scratch_db, 'gemini_score').shape[0] == 0
+
+    # the GEMINI.R scores of the study are not taken as done
+    assert not SLKB.check_if_added_to_table(curr_counts, 'gemini_score', scratch_db)
@@ -0,0 +1,31 @@
+import os
+
+import pandas as pd
+import pytest
+
+import SLKB
+
+from conftest import DEMO_CELL_LINE, DEMO_STUDY, FIXTURE_PATH, quiet
+
+# GI scores of the demo study produced by the original fmin based Horlbeck fit.
+# The closed-form quadratic fit reaches the same optimum; the remaining drift is
+# the fmin convergence tolerance (~1e-5 in SL_score, ~2e-6 in standard_error).
+HORLBECK_BASELINE = os.path.join(FIXTURE_PATH, 'horlbeck_demo_baseline.csv')
+HORLBECK_TOLERANCE = 5e-5
+
+
+def test_horlbeck_demo_matches_baseline(demo_counts, tmp_path):
+    expected = pd.read_csv(HORLBECK_BASELINE, index_col=0)
+
+    res = quiet(SLKB.run_horlbeck_score, demo_counts.copy(), curr_study=DEMO_STUDY,
+                curr_cl=DEMO_CELL_LINE, store_loc=str(tmp_path))
+    observed = res['HORLBECK_SCORE']
+
+    assert observed.shape == expected.shape
+    assert list(observed.columns) == list(expected.columns)
+    observed = observed.loc[expected.index]
+
+    for col in ['Gene 1', 'Gene 2']:
+        assert (observed[col].values == expected[col].values).all()
+    for col in ['SL_score', 'standard_error']:
+        assert observed[col].values == pytest.approx(expected[col].values, abs=HORLBECK_TOLERANCE, nan_ok=True)
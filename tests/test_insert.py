@@ -0,0 +1,50 @@
+import shutil
+
+import pandas as pd
+import sqlalchemy
+
+import SLKB
+
+from conftest import DEMO_CELL_LINE, DEMO_STUDY, new_sqlite_db, quiet, read_table
+
+
+def list_tables(engine):
+    with engine.connect() as conn:
+        return(sorted(conn.execute(sqlalchemy.text("SELECT name FROM sqlite_master WHERE type = 'table'")).scalars()))
+
+
+def assert_same_tables(engine_1, engine_2):
+    tables = list_tables(engine_1)
+    assert tables == list_tables(engine_2)
+
+    for table in tables:
+        table_1 = read_table(engine_1, table)
+        table_2 = read_table(engine_2, table)
+        pd.testing.assert_frame_equal(table_1, table_2, check_dtype = False)
+
+
+def test_bulk_insert_matches_default_insert(demo_db, demo_insert, tmp_path):
+    engine = new_sqlite_db(tmp_path)
+    quiet(SLKB.insert_study_to_db, engine, {key: value.copy() for key, value in demo_insert.items()}, bulk_insert = True)
+
+    assert read_table(engine, 'cdko_sgrna_counts').shape[0] > 0
+    assert_same_tables(demo_db, engine)
+
+    # the bulk transaction sets the journal back for the following transactions
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql('PRAGMA synchronous').scalar() != 0
+
+
+def test_bulk_score_insert_matches_default_insert(demo_db, demo_counts, tmp_path):
+    results = quiet(SLKB.run_horlbeck_score, demo_counts.copy(), curr_study = DEMO_STUDY, curr_cl = DEMO_CELL_LINE, store_loc = str(tmp_path))
+
+    engines = []
+    for bulk_insert in [False, True]:
+        db_loc = str(tmp_path / ('bulk.sqlite' if bulk_insert else 'default.sqlite'))
+        shutil.copyfile(demo_db.url.database, db_loc)
+        engine = sqlalchemy.create_engine('sqlite:///' + db_loc)
+        quiet(SLKB.add_table_to_db, demo_counts.copy(), results['HORLBECK_SCORE'].copy(), 'horlbeck_score', engine, bulk_insert = bulk_insert)
+        engines.append(engine)
+
+    assert read_table(engines[0], 'horlbeck_score').shape[0] > 0
+    assert_same_tables(*engines)
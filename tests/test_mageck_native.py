@@ -0,0 +1,116 @@
+import hashlib
+import os
+import stat
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import SLKB
+
+from conftest import DEMO_CELL_LINE, DEMO_STUDY, FIXTURE_PATH, quiet
+
+# sgRNA summaries (sgrna, Gene and LFC columns) of mageck test, run as the mageck engine does
+# (paired, --norm-method control). Legacy MAGeCK was not installable, so they are from mageck2 0.3.0,
+# its compatible successor:
+#   mageck2 test -k counts.csv -t "2,3" --paired --norm-method control --control-gene SLKB/files/mageck_control.txt -n out
+MAGECK_DEMO_SUMMARY = os.path.join(FIXTURE_PATH, 'mageck_demo', 'out.sgrna_summary.txt.gz')
+# sha1 of the counts.csv of the demo study the summary was calculated from
+MAGECK_DEMO_COUNTS_SHA1 = 'd91582552cccdcb247b03004c7605e8800aa1b40'
+
+# synthetic counts whose second TEnd replicate has no counts for most control sgRNAs, so its median ratio is zero
+MAGECK_ZERO_MEDIAN = os.path.join(FIXTURE_PATH, 'mageck_zero_median')
+
+# mageck writes 5 significant digits
+LFC_TOLERANCE = {'rel': 1e-4, 'abs': 1e-4}
+
+
+def write_stub_mageck(file_loc, summary_loc):
+    # a stand-in for mageck that writes the stored sgRNA summary
+    with open(file_loc, 'w') as handle:
+        handle.write('#!' + sys.executable + '\nimport shutil, gzip\n'
+                     'with gzip.open(' + repr(summary_loc) + ', "rb") as src, open("out.sgrna_summary.txt", "wb") as dst:\n'
+                     '    shutil.copyfileobj(src, dst)\n')
+    os.chmod(file_loc, os.stat(file_loc).st_mode | stat.S_IEXEC)
+    return(file_loc)
+
+
+def mageck_lfc(counts, paired):
+    # native fold changes, labelled by the sgRNA ids of mageck (suffixed by the replicate when paired)
+    T0_cols = [i for i in counts.columns if i.startswith('T0_')]
+    TEnd_cols = [i for i in counts.columns if i.startswith('TEnd_')]
+    lfc = SLKB.calculate_mageck_lfc(counts[T0_cols].values, counts[TEnd_cols].values, control_idx = (counts['gene_pair'] == 'CONTROL|CONTROL').values, paired = paired)
+
+    sgrnas = counts['sgRNA_pair_mageck_id'].values
+    if paired:
+        sgrnas = np.repeat(sgrnas, len(T0_cols)) + np.tile(['_r' + str(i) for i in range(len(T0_cols))], len(counts))
+    return(pd.Series(lfc, index = sgrnas))
+
+
+@pytest.fixture(scope = 'module')
+def mageck_demo_run(demo_counts, tmp_path_factory):
+    # the mageck engine, with the stored summary in place of running mageck
+    store_loc = str(tmp_path_factory.mktemp('mageck'))
+    mageck = write_stub_mageck(os.path.join(store_loc, 'mageck'), MAGECK_DEMO_SUMMARY)
+
+    default_mageck = SLKB.MAGECK_EXECUTABLE
+    SLKB.MAGECK_EXECUTABLE = mageck
+    try:
+        res = quiet(SLKB.run_mageck_score, demo_counts.copy(), curr_study = DEMO_STUDY, curr_cl = DEMO_CELL_LINE, store_loc = store_loc)
+    finally:
+        SLKB.MAGECK_EXECUTABLE = default_mageck
+
+    return(res, os.path.join(store_loc, 'MAGECK_Files', DEMO_STUDY, DEMO_CELL_LINE))
+
+
+def test_mageck_demo_fixture_matches_inputs(mageck_demo_run):
+    _, save_loc = mageck_demo_run
+
+    with open(os.path.join(save_loc, 'counts.csv'), 'rb') as handle:
+        assert hashlib.sha1(handle.read()).hexdigest() == MAGECK_DEMO_COUNTS_SHA1
+    with open(os.path.join(save_loc, 'MAGECK_commands.sh')) as handle:
+        assert '-t "2,3" --paired --norm-method control' in handle.read()
+
+
+def test_native_lfc_matches_mageck_demo(mageck_demo_run):
+    _, save_loc = mageck_demo_run
+    summary = pd.read_csv(MAGECK_DEMO_SUMMARY, sep = '\t', index_col = 'sgrna')
+    lfc = mageck_lfc(pd.read_csv(os.path.join(save_loc, 'counts.csv')), paired = True)
+
+    assert len(lfc) == len(summary)
+    assert lfc.values == pytest.approx(summary['LFC'].reindex(lfc.index).values, **LFC_TOLERANCE)
+
+
+def test_native_scores_match_mageck_demo(mageck_demo_run, demo_counts, tmp_path):
+    mageck_res, _ = mageck_demo_run
+    native_res = quiet(SLKB.run_mageck_score, demo_counts.copy(), curr_study = DEMO_STUDY, curr_cl = DEMO_CELL_LINE, store_loc = str(tmp_path), engine = 'native')
+
+    # nothing is written by the native engine
+    assert not os.path.exists(str(tmp_path / 'MAGECK_Files'))
+
+    expected, observed = mageck_res['MAGECK_SCORE'], native_res['MAGECK_SCORE']
+    assert list(observed.index) == list(expected.index)
+    for column in ['SL_score', 'standard_error']:
+        assert observed[column].values == pytest.approx(expected[column].values, abs = 1e-3)
+
+
+def test_native_lfc_matches_mageck_zero_median():
+    counts = pd.read_csv(os.path.join(MAGECK_ZERO_MEDIAN, 'counts.csv'))
+    summary = pd.read_csv(os.path.join(MAGECK_ZERO_MEDIAN, 'out.sgrna_summary.txt'), sep = '\t', index_col = 'sgrna')
+
+    # the median ratio of the second TEnd replicate is zero, mageck then switches to total count normalization
+    controls = counts.loc[counts['gene_pair'] == 'CONTROL|CONTROL', 'TEnd_1']
+    assert (controls == 0).sum() > len(controls) // 2
+
+    lfc = mageck_lfc(counts, paired = True)
+    assert len(lfc) == len(summary)
+    assert lfc.values == pytest.approx(summary['LFC'].reindex(lfc.index).values, **LFC_TOLERANCE)
+
+
+def test_unknown_engine_is_rejected(demo_counts, tmp_path):
+    with pytest.raises(ValueError):
+        SLKB.run_mageck_score(demo_counts.copy(), curr_study = DEMO_STUDY, curr_cl = DEMO_CELL_LINE, store_loc = str(tmp_path), engine = 'Native')
+
+    # nothing is run or written
+    assert os.listdir(str(tmp_path)) == []
@@ -0,0 +1,110 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow.feather
+
+import SLKB
+
+
+def example_result():
+    return({'scores': pd.DataFrame({'SL_score': [0.5, -1.0], 'standard_error': [0.1, 0.2]}, index = pd.Index(['A|B', 'A|C'], name = 'gene_pair')),
+            'missing': None,
+            'parameters': {'full_normalization': True}})
+
+
+def test_result_is_standard_feather(tmp_path):
+    file_loc = SLKB.get_cache_file(str(tmp_path), 'median_results', 'a' * 40)
+    SLKB.write_cache_file(file_loc, example_result())
+
+    # one Feather file for each table, readable without SLKB
+    assert sorted(os.listdir(file_loc)) == [SLKB.RESULT_CONTENTS, 'scores.feather']
+    scores = pd.read_feather(os.path.join(file_loc, 'scores.feather'))
+    assert list(scores['SL_score']) == [0.5, -1.0]
+    assert pyarrow.feather.read_table(os.path.join(file_loc, 'scores.feather')).num_rows == 2
+
+    result = SLKB.load_result(file_loc)
+    pd.testing.assert_frame_equal(result['scores'], example_result()['scores'])
+    assert result['missing'] is None
+    assert result['parameters'] == {'full_normalization': True}
+
+    # projected columns keep the index
+    projected = SLKB.load_result(file_loc, tables = ['scores'], columns = ['standard_error'])
+    assert list(projected) == ['scores']
+    assert list(projected['scores'].columns) == ['standard_error']
+    assert list(projected['scores'].index) == ['A|B', 'A|C']
+
+
+def test_write_cache_file_replaces_result(tmp_path):
+    file_loc = SLKB.get_cache_file(str(tmp_path), 'median_results', 'b' * 40)
+    SLKB.write_cache_file(file_loc, example_result())
+
+    result = example_result()
+    result['scores']['SL_score'] = [2.0, 3.0]
+    SLKB.write_cache_file(file_loc, result)
+
+    assert list(SLKB.load_result(file_loc)['scores']['SL_score']) == [2.0, 3.0]
+    assert os.listdir(str(tmp_path)) == [os.path.basename(file_loc)]
+
+
+def test_evict_cache_removes_result_directories(tmp_path):
+    old_loc = SLKB.get_cache_file(str(tmp_path), 'median_results', 'c' * 40)
+    new_loc = SLKB.get_cache_file(str(tmp_path), 'median_results', 'd' * 40)
+    SLKB.write_cache_file(old_loc, example_result())
+    SLKB.write_cache_file(new_loc, example_result())
+    os.utime(old_loc, (time.time() - 100, time.time() - 100))
+
+    # room for one result, the least recently used one is removed
+    result_size = sum([os.path.getsize(os.path.join(new_loc, i)) for i in os.listdir(new_loc)])
+    SLKB.evict_cache(str(tmp_path), cache_size = result_size)
+
+    assert not os.path.exists(old_loc)
+    assert SLKB.load_from_cache(old_loc) is None
+    assert SLKB.load_from_cache(new_loc) is not None
+
+
+def test_save_to_cache_walks_only_beyond_the_size_limit(tmp_path, monkeypatch):
+    walks = []
+    evict_cache = SLKB.evict_cache
+    monkeypatch.setattr(SLKB, 'evict_cache', lambda *args, **kwargs: walks.append(args) or evict_cache(*args, **kwargs))
+    monkeypatch.setattr(SLKB, 'CACHE_SIZE_ESTIMATES', {})
+
+    file_locs = [SLKB.get_cache_file(str(tmp_path), 'median_results', str(i) * 40) for i in range(4)]
+    SLKB.write_cache_file(file_locs[0], example_result())
+    result_size = SLKB.get_cache_file_size(file_locs[0])
+    # room for three results
+    monkeypatch.setattr(SLKB, 'CACHE_SIZE', 3 * result_size)
+
+    # walked on the first write only, while the estimate fits
+    for file_loc in file_locs[1:3]:
+        SLKB.save_to_cache(file_loc, example_result(), str(tmp_path))
+    assert len(walks) == 1
+    assert SLKB.CACHE_SIZE_ESTIMATES[str(tmp_path)] == 3 * result_size
+
+    # beyond the limit, the least recently used result is removed
+    for i, file_loc in enumerate(file_locs[:3]):
+        os.utime(file_loc, (time.time() - 100 + i, time.time() - 100 + i))
+    SLKB.save_to_cache(file_locs[3], example_result(), str(tmp_path))
+    assert len(walks) == 2
+    assert not os.path.exists(file_locs[0])
+    assert SLKB.CACHE_SIZE_ESTIMATES[str(tmp_path)] == 3 * result_size
+
+
+def test_migrate_pickled_result(tmp_path):
+    file_loc = SLKB.get_cache_file(str(tmp_path), 'median_results', 'e' * 40, extension = '.p')
+    pd.to_pickle(example_result(), file_loc)
+
+    migrated = SLKB.migrate_result_cache(str(tmp_path))
+
+    assert migrated == [file_loc[:-len('.p')]]
+    assert not os.path.exists(file_loc)
+    pd.testing.assert_frame_equal(SLKB.load_result(migrated[0])['scores'], example_result()['scores'])
+
+
+def test_demo_data_is_feather():
+    demo = SLKB.load_demo_data()
+
+    assert sorted(demo) == ['counts_ref', 'score_ref', 'sequence_ref']
+    assert demo['counts_ref'].shape == (48931, 8)
+    assert np.issubdtype(demo['score_ref']['SL_score'].dtype, np.number)
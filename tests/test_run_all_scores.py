@@ -0,0 +1,32 @@
+import contextlib
+import io
+
+import SLKB
+
+from conftest import DEMO_CELL_LINE, DEMO_STUDY, read_table
+
+
+def test_failing_method_does_not_stop_others(scratch_db, tmp_path):
+    method_params = {'median': {'store_loc': str(tmp_path), 'not_a_parameter': True},
+                     'horlbeck': {'store_loc': str(tmp_path)}}
+
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        stats = SLKB.run_all_scores(scratch_db, methods = ['median', 'horlbeck'], n_jobs = 1, method_params = method_params)
+
+    assert 'Error in median for: ' + DEMO_STUDY + ', ' + DEMO_CELL_LINE in output.getvalue()
+    assert 'not_a_parameter' in output.getvalue()
+
+    inserted = stats.set_index('method')['inserted']
+    assert inserted['median'] == 0
+    assert inserted['horlbeck'] > 0
+    assert read_table(scratch_db, 'median_nb_score').shape[0] == 0
+    assert read_table(scratch_db, 'horlbeck_score').shape[0] > 0
+
+
+def test_run_scoring_task_returns_traceback(demo_counts, tmp_path):
+    task_results = SLKB.run_scoring_task(['median'], demo_counts.copy(), DEMO_STUDY, DEMO_CELL_LINE, {'median': {'store_loc': str(tmp_path), 'not_a_parameter': True}})
+
+    method, results, _ = task_results[0]
+    assert method == 'median'
+    assert isinstance(results, str) and 'TypeError' in results
@@ -0,0 +1,97 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import SLKB
+
+from conftest import DEMO_CELL_LINE, DEMO_STUDY, FIXTURE_PATH, quiet
+
+# Median and sgRNA-Derived scores of the demo study produced by the original per group
+# scorers (before group_statistics), with and without full normalization.
+SCORES_BASELINE = os.path.join(FIXTURE_PATH, 'median_sgrna_demo_baseline.csv')
+SCORES_TOLERANCE = 1e-9
+
+
+@pytest.mark.parametrize('full_normalization', [False, True])
+def test_median_and_sgrna_scores_match_baseline(demo_counts, tmp_path, full_normalization):
+    baseline = pd.read_csv(SCORES_BASELINE)
+    baseline = baseline.loc[baseline['full_normalization'] == full_normalization]
+
+    res = quiet(SLKB.run_median_scores, demo_counts.copy(), curr_study = DEMO_STUDY, curr_cl = DEMO_CELL_LINE,
+                full_normalization = full_normalization, store_loc = str(tmp_path))
+    res.update(quiet(SLKB.run_sgrna_scores, demo_counts.copy(), curr_study = DEMO_STUDY, curr_cl = DEMO_CELL_LINE,
+                     full_normalization = full_normalization, store_loc = str(tmp_path)))
+    assert set(res) == set(baseline['result'])
+
+    for result, expected in baseline.groupby('result'):
+        expected = expected.set_index('gene_pair').dropna(axis = 1, how = 'all').drop(columns = ['result', 'full_normalization'])
+        observed = res[result]
+
+        assert observed.shape == expected.shape
+        assert list(observed.columns) == list(expected.columns)
+        observed = observed.loc[expected.index]
+
+        for col in ['Gene 1', 'Gene 2']:
+            assert (observed[col].values == expected[col].values).all()
+        for col in observed.columns.difference(['Gene 1', 'Gene 2']):
+            assert observed[col].values == pytest.approx(expected[col].values, abs = SCORES_TOLERANCE, nan_ok = True)
+
+
+def pandas_statistics(values, groups):
+    # the per group calls replaced by group_statistics
+    grouped = pd.DataFrame(values).groupby(groups)
+    return({'median': grouped.agg(lambda x: np.median(x.values)),
+            'nanmedian': grouped.median(),
+            'mean': grouped.mean(),
+            'var': grouped.var(ddof = 0),
+            'sem': grouped.agg(lambda x: np.std(x.values, ddof = 1) / np.sqrt(len(x))),
+            'size': grouped.agg(len)})
+
+
+# the reference sem of single value groups warns
+@pytest.mark.filterwarnings('ignore::RuntimeWarning')
+def test_group_statistics_matches_groupby():
+    rng = np.random.default_rng(0)
+    values = pd.DataFrame(rng.normal(size = (500, 3)), columns = ['rep_1', 'rep_2', 'rep_3'])
+    values.iloc[rng.choice(500, 60, replace = False), 0] = np.nan
+    values.iloc[rng.choice(500, 5, replace = False), 2] = np.nan
+    # groups with one value, groups of NaN only, and missing groups
+    groups = pd.Series(rng.choice(['a', 'b', 'c', 'd', 'e'], 500).astype(object), name = 'group')
+    groups.iloc[:3] = 'single'
+    groups.iloc[3:5] = 'nan_only'
+    values.iloc[3:5, 0] = np.nan
+    groups.iloc[5:20] = None
+    groups.iloc[0:2] = ['single_1', 'single_2']
+
+    statistics = ['median', 'nanmedian', 'mean', 'var', 'sem', 'size']
+    expected = pandas_statistics(values, groups)
+
+    # 2D values, every column in one pass
+    observed = SLKB.group_statistics(values, groups, statistics)
+    for statistic in statistics:
+        assert list(observed[statistic].index) == list(expected[statistic].index)
+        assert observed[statistic].values == pytest.approx(expected[statistic].values, nan_ok = True)
+
+    # a single column
+    observed = SLKB.group_statistics(values['rep_1'], groups, statistics)
+    assert observed.index.name == 'group'
+    for statistic in statistics:
+        assert observed[statistic].values == pytest.approx(expected[statistic]['rep_1'].values, nan_ok = True)
+
+
+def test_group_statistics_multiple_groups():
+    values = np.array([1.0, 2.0, np.nan, 4.0, 5.0, 6.0])
+    groups = [pd.Series(['x', 'x', 'y', 'y', 'x', None], name = 'g1'), pd.Series([1, 1, 2, 2, 2, 2], name = 'g2')]
+
+    observed = SLKB.group_statistics(values, groups, ['nanmedian', 'size'])
+    expected = pd.Series(values).groupby(groups).agg(['median', 'size'])
+
+    assert list(observed.index) == list(expected.index)
+    assert list(observed.index.names) == ['g1', 'g2']
+    assert observed['nanmedian'].values == pytest.approx(expected['median'].values)
+    assert (observed['size'].values == expected['size'].values).all()
+
+    with pytest.raises(ValueError):
+        SLKB.group_statistics(values, groups, ['mode'])
@@ -0,0 +1,69 @@
+import os
+
+import pandas as pd
+import pytest
+import sqlalchemy
+
+import SLKB
+
+from conftest import DEMO_CONDITIONS, DEMO_CONTROLS, new_sqlite_db, quiet
+
+SEQUENCE_QUERY = 'SELECT sgRNA_guide_name, sgRNA_guide_seq, sgRNA_target_name, study_origin FROM cdko_experiment_design ORDER BY sgRNA_guide_name, sgRNA_guide_seq'
+
+# counts with the guides by name, since the sequences are given IDs in file order when streamed
+COUNTS_QUERY = '''SELECT c.sgRNA_pair_id, g1.sgRNA_guide_name AS guide_1, g2.sgRNA_guide_name AS guide_2, c.gene_pair_orientation, c.T0_counts, c.T0_replicate_names,
+                  c.TEnd_counts, c.TEnd_replicate_names, c.target_type, c.study_origin, c.cell_line_origin, c.gene_pair_id
+                  FROM cdko_sgrna_counts c
+                  LEFT JOIN cdko_experiment_design g1 ON g1.sgRNA_id = c.guide_1_id
+                  LEFT JOIN cdko_experiment_design g2 ON g2.sgRNA_id = c.guide_2_id
+                  ORDER BY c.sgRNA_pair_id'''
+
+SCORE_QUERY = 'SELECT * FROM cdko_original_sl_results ORDER BY id'
+
+REPLICATE_QUERY = 'SELECT * FROM cdko_sgrna_replicate_counts ORDER BY sgRNA_pair_id, timepoint, replicate_index'
+
+
+def query(engine, sql):
+    with engine.connect() as conn:
+        return(pd.read_sql_query(con = conn, sql = sqlalchemy.text(sql)))
+
+
+@pytest.mark.parametrize('with_scores', [True, False])
+def test_stream_matches_insert(tmp_path, with_scores):
+    demo = SLKB.load_demo_data()
+    for table in ['sequence_ref', 'counts_ref', 'score_ref']:
+        demo[table].to_csv(os.path.join(str(tmp_path), table + '.csv'), index = False)
+
+    inserted = new_sqlite_db(tmp_path, 'inserted.sqlite')
+    db_inserts = quiet(SLKB.prepare_study_for_export,
+                       sequence_ref = demo['sequence_ref'].copy(),
+                       counts_ref = demo['counts_ref'].copy(),
+                       score_ref = demo['score_ref'].copy() if with_scores else None,
+                       study_controls = DEMO_CONTROLS,
+                       study_conditions = DEMO_CONDITIONS)
+    quiet(SLKB.insert_study_to_db, inserted, db_inserts)
+
+    # small chunks, so that gene pairs and placeholder scores span many chunks
+    streamed = new_sqlite_db(tmp_path, 'streamed.sqlite')
+    quiet(SLKB.stream_study_to_db, streamed,
+          os.path.join(str(tmp_path), 'sequence_ref.csv'),
+          os.path.join(str(tmp_path), 'counts_ref.csv'),
+          os.path.join(str(tmp_path), 'score_ref.csv') if with_scores else None,
+          study_controls = DEMO_CONTROLS, study_conditions = DEMO_CONDITIONS, chunksize = 5000)
+
+    pd.testing.assert_frame_equal(query(inserted, SEQUENCE_QUERY), query(streamed, SEQUENCE_QUERY))
+    pd.testing.assert_frame_equal(query(inserted, REPLICATE_QUERY), query(streamed, REPLICATE_QUERY))
+
+    counts_1, counts_2 = query(inserted, COUNTS_QUERY), query(streamed, COUNTS_QUERY)
+    assert counts_1.shape[0] == demo['counts_ref'].shape[0]
+    pd.testing.assert_frame_equal(counts_1.drop(columns = 'gene_pair_id'), counts_2.drop(columns = 'gene_pair_id'))
+
+    # gene pair IDs are allocated per chunk, they must map one to one
+    gene_pair_map = counts_1[['gene_pair_id']].assign(streamed_id = counts_2['gene_pair_id']).drop_duplicates()
+    assert gene_pair_map['gene_pair_id'].is_unique and gene_pair_map['streamed_id'].is_unique
+
+    scores_1, scores_2 = query(inserted, SCORE_QUERY), query(streamed, SCORE_QUERY)
+    assert scores_1.shape[0] > 0
+    pd.testing.assert_frame_equal(scores_1.drop(columns = 'gene_pair_id'), scores_2.drop(columns = 'gene_pair_id'))
+    gene_pair_map = dict(zip(gene_pair_map['gene_pair_id'], gene_pair_map['streamed_id']))
+    assert (scores_1['gene_pair_id'].map(gene_pair_map).fillna(-1) == scores_2['gene_pair_id'].fillna(-1)).all()